@@ -4,14 +4,13 @@ EcoSaver — Student Resource Dashboard (Eco Nature theme)
 
 """
 # app.py (top of file) - REPLACE your current imports with this block
+# A thin front end over the ecosaver package. pandas, numpy and scipy
+# are loaded by the package only on the paths that need them, and plotly
+# only when a chart is built (ecosaver.charts).
 import os
+import tempfile
+from contextlib import ExitStack
 import streamlit as st
-import pandas as pd
-import numpy as np
-import sqlite3
-from datetime import date, timedelta, datetime
-import plotly.express as px
-import statsmodels.api as sm
 
 custom_css = """
 <style>
@@ -105,197 +104,156 @@ tbody, thead {
 # ---------------------------
 # Config & constants
 # ---------------------------
-APP_NAME = "EcoSaver"
-DB_DIR = "data"
-DB_FILE = os.path.join(DB_DIR, "techforge_eco.db")
-CO2_PER_KWH = 0.82          # kg CO2 per kWh (example factor)
-CO2_PER_LITER_WATER = 0.00035  # kg CO2 per liter (1000 L -> 0.35 kg)
-DATE_FMT = "%Y-%m-%d"
-DEFAULT_HISTORY_DAYS = 30 # For default filtering after date range removal
+from ecosaver.config import APP_NAME, CO2_PER_KWH, CO2_PER_LITER_WATER, DATA_SOURCES
+from ecosaver.storage import ensure_db, get_user_list, populate_demo_if_empty, get_data_version
+from ecosaver.pool import Database
+from ecosaver.sources import source_db_file, get_source_conn, compare_sources, detach_source
+from ecosaver.scoring import eco_score
+from ecosaver.suggestions import detect_patterns, generate_suggestions
+from ecosaver.carbon import co2_kg
+from ecosaver.appliances import whatif_lookup
+from ecosaver import charts, dashboard, export, forecast, perf
+from ecosaver.leaderboard import refresh_leaderboard, start_refresher, user_rank
 
 # Streamlit page config (eco-nature vibe)
 st.set_page_config(page_title=f"{APP_NAME} — Eco Dashboard", layout="wide",
                     initial_sidebar_state="expanded")
 
+# Timing spans for this rerun: always with ECOSAVER_PERF=1, otherwise only
+# while the admin performance panel is open.
+perf_on = perf.enabled_by_env() or st.session_state.get("perf_panel", False)
+if perf_on:
+    perf.start_run("dashboard")
+perf.section("setup")
+
 # Apply the custom dark CSS theme
 st.markdown(custom_css, unsafe_allow_html=True)
 
 
 # ---------------------------
-# Database helpers
-# ---------------------------
-def ensure_db():
-    os.makedirs(DB_DIR, exist_ok=True)
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        created_at TEXT
-    )""")
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS usage (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        date TEXT NOT NULL,
-        electricity_units REAL NOT NULL,
-        water_liters INTEGER NOT NULL,
-        household_size INTEGER NOT NULL,
-        created_at TEXT,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )""")
-    conn.commit()
-    conn.close()
-
-def get_conn():
-    ensure_db()
-    return sqlite3.connect(DB_FILE, check_same_thread=False)
-
-def add_user_if_not_exists(conn, username: str):
-    username = username.strip().lower()
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM users WHERE username = ?", (username,))
-    row = cur.fetchone()
-    if row:
-        return row[0]
-    cur.execute("INSERT INTO users (username, created_at) VALUES (?, ?)", (username, datetime.utcnow().isoformat()))
-    conn.commit()
-    return cur.lastrowid
-
-def add_usage(conn, user_id: int, date_str: str, elec: float, water: int, hh_size: int):
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO usage (user_id, date, electricity_units, water_liters, household_size, created_at)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (user_id, date_str, elec, water, hh_size, datetime.utcnow().isoformat()))
-    conn.commit()
-
-def load_usage_df(conn, start_date=None, end_date=None):
-    q = "SELECT u.id as usage_id, us.username, us.id as user_id, u.date, u.electricity_units, u.water_liters, u.household_size FROM usage u JOIN users us ON u.user_id = us.id"
-    params = []
-    
-    # If a specific date range is provided, use it. Otherwise, load all data.
-    if start_date and end_date:
-        q += " WHERE date(u.date) BETWEEN date(?) AND date(?)"
-        params = [start_date, end_date]
-        
-    q += " ORDER BY date(u.date) ASC"
-    df = pd.read_sql_query(q, conn, params=params, parse_dates=["date"])
-    
-    if not df.empty:
-        df["username"] = df["username"].str.strip().str.lower()
-        
-        # Apply default history filter if no dates were provided to load_usage_df
-        if not start_date and not end_date:
-            latest_date = df['date'].max()
-            start_date_limit = latest_date - timedelta(days=DEFAULT_HISTORY_DAYS)
-            df = df[df['date'] >= start_date_limit]
-            
-    return df
-
-def get_user_list(conn):
-    df = pd.read_sql_query("SELECT username FROM users ORDER BY username", conn)
-    return df["username"].tolist()
-
-# ---------------------------
-# Demo data on first run
-# ---------------------------
-def populate_demo_if_empty(conn):
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM users")
-    count = cur.fetchone()[0]
-    if count > 0:
-        return
-    # create demo users and 10 days of data
-    demo_users = ["arya", "dev", "mira"]
-    start = date.today() - timedelta(days=9)
-    np.random.seed(1)
-    for u in demo_users:
-        uid = add_user_if_not_exists(conn, u)
-        hh = 3 if u != "mira" else 1
-        for i in range(10):
-            d = (start + timedelta(days=i)).strftime(DATE_FMT)
-            # sample values (vary per user)
-            base_elec = 2.5 if u=="mira" else 3.5 if u=="arya" else 5.0
-            elec = max(0.5, float(np.round(np.random.normal(base_elec, 0.8),2)))
-            water = int(max(40, np.random.normal(120 if u=="arya" else 180 if u=="dev" else 80, 25)))
-            add_usage(conn, uid, d, elec, water, hh)
-
-# ---------------------------
-# Prediction & scoring (Statsmodels)
+# Cache layer
 # ---------------------------
-def fit_linear_trend(df_user, value_col="electricity_units"):
-    if df_user.shape[0] < 3:
-        return None, None
-    df_user = df_user.sort_values("date").copy()
-    df_user["day_index"] = (df_user["date"] - df_user["date"].min()).dt.days.astype(int)
-    X = sm.add_constant(df_user["day_index"].values)
-    y = df_user[value_col].values
+# Every cached result is keyed on (data source, data_version); add_usage /
+# add_user_if_not_exists bump the version on write. Reruns that only read hit
+# the cache and skip SQLite and model fitting; a write changes the key.
+# Leading-underscore args (the database) are not hashed by Streamlit.
+#
+# Each data source has its own SQLite file and one Database shared by all
+# sessions: each read checks out a pooled WAL reader connection, and writes
+# go through its single group-committing writer.
+CACHE_MAX_ENTRIES = 32
+CACHE_TTL_SECONDS = 600
+
+@st.cache_resource
+def get_db(source):
+    conn = get_source_conn(source)
     try:
-        model = sm.OLS(y, X).fit()
-        next_index = df_user["day_index"].max() + 1
-        pred = model.predict(sm.add_constant([next_index]))[0]
-        return float(pred), model
-    except Exception:
-        return None, None
-
-def global_trend_predict(df_all, value_col="electricity_units"):
-    if df_all.shape[0] < 3:
-        return float(df_all[value_col].mean()) if df_all.shape[0] > 0 else None
-    df2 = df_all.sort_values("date").copy()
-    df2["day_index"] = (df2["date"] - df2["date"].min()).dt.days.astype(int)
-    X = sm.add_constant(df2["day_index"].values)
-    y = df2[value_col].values
+        # auto-populate demo rows for quick demo (different numbers per source)
+        populate_demo_if_empty(conn, seed=1 + list(DATA_SOURCES).index(source))
+    finally:
+        conn.close()
+    return Database(source_db_file(source))
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_user_frame(_db, version, username):
+    with _db.reader() as conn:
+        return dashboard.user_frame(conn, username)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_user_list(_db, version):
+    with _db.reader() as conn:
+        return get_user_list(conn)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_user_prediction(_db, version, username):
+    """(prediction, used_global_fallback) for the default history window."""
+    with _db.reader() as conn:
+        pred, used_global = dashboard.user_prediction(conn, username, lambda: None)
+    # The global estimate takes its own reader, so fetch it after returning ours.
+    return (cached_aggregate(_db, version)[1], True) if used_global else (pred, False)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_aggregate(_db, version):
+    """Per-day averages over all users plus the global next-day estimate, from the daily rollup."""
+    with _db.reader() as conn:
+        return dashboard.aggregate_view(conn)
+
+# One leaderboard refresher per source and server process, shared by all
+# sessions; the leaderboard itself is read straight from its ranked table.
+@st.cache_resource
+def get_leaderboard_refresher(source):
+    conn = get_source_conn(source)
     try:
-        model = sm.OLS(y, X).fit()
-        next_index = df2["day_index"].max() + 1
-        pred = model.predict(sm.add_constant([next_index]))[0]
-        return float(pred)
-    except Exception:
-        return float(df2[value_col].mean())
-
-def eco_score(latest, predicted):
-    if predicted is None or predicted == 0:
-        return 50
-    diff = predicted - latest
-    pct = diff / predicted
-    s = 50 + (pct * 50)
-    return int(round(max(0, min(100, s))))
-
-# ---------------------------
-# Patterns & Suggestions
-# ---------------------------
-# Removed the body of this function as "Detected Patterns" is being removed
-def detect_patterns(df_user):
-    # Function kept but returns empty list since "Detected Patterns" section is removed
-    return []
-
-def generate_suggestions(latest, predicted, df_user):
-    suggestions = []
-    if predicted is None:
-        suggestions.append("Insufficient history to predict — add more daily records.")
-    else:
-        if latest > predicted:
-            excess = latest - predicted
-            suggestions.append(f"You used {excess:.2f} kWh more than predicted. Try reducing AC/heavy loads by 30 min to save approx {excess*0.15:.2f} kWh.")
-        else:
-            suggestions.append(f"Good work — you're {(predicted-latest):.2f} kWh under prediction. Keep that habit!")
-    hh = int(df_user.iloc[-1].get("household_size", 1) or 1)
-    per_person = df_user.iloc[-1]["water_liters"] / hh
-    if per_person > 150:
-        suggestions.append("Shorten showers by 2-3 mins or install a low-flow head — saves 20-40 L/day per person.")
-    elif per_person > 100:
-        suggestions.append("Fix small leaks and try one short shower a day to cut water use.")
-    suggestions.append("Unplug chargers at night. Replace bulbs with LEDs. Use natural light where possible.")
-    return suggestions
+        refresh_leaderboard(conn)  # the first page load sees a filled table
+    finally:
+        conn.close()
+    return start_refresher(source_db_file(source))
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_quick_stats(_db, version):
+    """[(username, records, avg kWh, avg water L)] over the default history window."""
+    with _db.reader() as conn:
+        return dashboard.quick_stats(conn)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_source_comparison(_db, version, other, other_version):
+    """Per-student averages here vs in `other`, joined over the attached file."""
+    with _db.reader() as conn:
+        return compare_sources(conn, other)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_user_patterns(_db, version, username):
+    return detect_patterns(cached_user_frame(_db, version, username))
+
+# Stored forecast fits are reused until the user's readings change; a refit
+# made on a read-only reader is handed to the writer thread to store.
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_user_forecast(_db, version, username):
+    with _db.reader() as conn:
+        frame, pending = dashboard.forecast_view(conn, username)
+    if pending:
+        _db.submit(forecast.save_params, *pending)
+    return frame
+
+# Every What-If slider combination for the user, so a submit is a lookup.
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_whatif_grid(_db, version, username):
+    return dashboard.whatif_view(cached_user_frame(_db, version, username))
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_cohort_alerts(_db, version):
+    """Pattern alerts for all users in the history window, one vectorized pass."""
+    with _db.reader() as conn:
+        return dashboard.cohort_alerts(conn)
+
+# Chart figures are cached as serialized plotly JSON, already decimated to
+# charts.CHART_POINT_BUDGET points, so a rerun neither rebuilds nor re-sends
+# a full-resolution figure.
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_user_charts(_db, version, username):
+    return charts.user_charts(cached_user_frame(_db, version, username))
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_meter_charts(_db, version, username):
+    """Last-7-days chart per interval meter of the user, from the rollup buckets (never raw readings)."""
+    with _db.reader() as conn:
+        return [charts.line_json(frame, "ts", "total",
+                                 f"Metered {kind} per hour ({'kWh' if kind == 'electricity' else 'L'})")
+                for kind, frame in dashboard.meter_view(conn, username)]
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def cached_aggregate_charts(_db, version):
+    return charts.aggregate_charts(cached_aggregate(_db, version)[0])
 
 # ---------------------------
 # UI: Sidebar - Login & Input
 # ---------------------------
-conn = get_conn()
-ensure_db()
-populate_demo_if_empty(conn)  # auto-populate demo rows for quick demo
+perf.section("sidebar")
+# The source picker is drawn further down; its value from the last rerun
+# (session state) decides which file this rerun reads and writes.
+source = st.session_state.get("data_source", "Home").lower()
+db = get_db(source)
+get_leaderboard_refresher(source)
 
 # Sidebar Title and User Management
 st.sidebar.markdown(f"<div class='big-title'>Eco Saver</div>", unsafe_allow_html=True)
@@ -309,7 +267,7 @@ with st.sidebar.form("login_form", clear_on_submit=False):
         if username == "":
             st.warning("Please enter a username.")
         else:
-            uid = add_user_if_not_exists(conn, username)
+            uid = db.add_user(username)
             st.success(f"Logged in as **{username}**")
 
 st.sidebar.markdown("---")
@@ -319,8 +277,9 @@ st.sidebar.header("Data Source")
 st.sidebar.selectbox(
     "CHOOSE HOME/SCHOOL", 
     options=["Home", "School"],
-    help="This selection could be used to load different data sets or benchmark usage.",
-    index=0
+    help="Home and school readings are stored in separate databases; every view uses the selected one.",
+    index=0,
+    key="data_source",
 )
 
 
@@ -332,57 +291,78 @@ st.markdown("<div class='subtle'>Predictive student dashboard for electricity &
 st.markdown("---")
 
 # MOVED FILTERS TO MAIN PAGE (and removed date range)
-users = ["All users"] + get_user_list(conn)
+perf.section("load")
+with db.reader() as conn:
+    data_version = (source, get_data_version(conn))
+users = ["All users"] + cached_user_list(db, data_version)
 selected_user = st.selectbox("View user", options=users, index=0, label_visibility="visible")
 
-# Load data based on current requirements (No specific start/end date now)
-df_all = load_usage_df(conn) 
-df_filtered = df_all.copy()
-if selected_user != "All users":
-    df_filtered = df_all[df_all["username"] == selected_user].copy()
+# Load data based on current requirements (No specific start/end date now).
+# A single-user view reads only that user's rows; "All users" reads the rollup.
+if selected_user == "All users":
+    agg, pred_global = cached_aggregate(db, data_version)
+    has_data = not agg.empty
+else:
+    df_user = cached_user_frame(db, data_version, selected_user)
+    has_data = not df_user.empty
 
 st.markdown("---") # Separator after the main filter
 
 col_main, col_side = st.columns([2,1])
 
 # LEFT: Trends & analysis
+perf.section("trends")
 with col_main:
     st.header("Usage Trends & Prediction")
-    if df_filtered.empty:
+    if not has_data:
         st.info("No data for selection. Add entries from the sidebar to begin.")
     else:
         if selected_user != "All users":
-            df_user = df_filtered.sort_values("date").copy()
             st.subheader(f"User — {selected_user}")
-            fig = px.line(df_user, x="date", y="electricity_units", markers=True, title="Electricity (kWh) over time")
-            st.plotly_chart(fig, use_container_width=True)
-            fig2 = px.bar(df_user, x="date", y="water_liters", title="Water (L) over time")
-            st.plotly_chart(fig2, use_container_width=True)
+            fig, fig2 = cached_user_charts(db, data_version, selected_user)
+            st.plotly_chart(charts.from_json(fig), use_container_width=True)
+            st.plotly_chart(charts.from_json(fig2), use_container_width=True)
+            for meter_fig in cached_meter_charts(db, data_version, selected_user):
+                st.plotly_chart(charts.from_json(meter_fig), use_container_width=True)
 
             latest = df_user.iloc[-1]
             st.metric("Latest electricity (kWh)", f"{latest['electricity_units']:.2f}")
             st.metric("Latest water (L)", f"{int(latest['water_liters']):,}")
 
-            pred, model = fit_linear_trend(df_user, "electricity_units")
-            if pred is None:
-                pred = global_trend_predict(df_all, "electricity_units")
+            pred, used_global = cached_user_prediction(db, data_version, selected_user)
+            if used_global:
                 st.info(f"Not enough user history for per-user model. Using global trend: {pred:.2f} kWh (next-day estimate).")
             else:
                 st.success(f"Per-user trend prediction (next day): {pred:.2f} kWh")
 
+            fc = cached_user_forecast(db, data_version, selected_user)
+            if fc["pred"].notna().any():
+                st.write("Forecast (trend + day of week, 95% intervals):")
+                st.dataframe({
+                    "Horizon": [f"{h} day" if h == 1 else f"{h} days" for h in fc["horizon"]],
+                    "Date": fc["date"].dt.strftime("%a %d %b"),
+                    "kWh that day": [f"{p:.2f} ({lo:.2f}–{hi:.2f})" for p, lo, hi in zip(fc["pred"], fc["lower"], fc["upper"])],
+                    "Total kWh": [f"{t:.1f} ({lo:.1f}–{hi:.1f})"
+                                  for t, lo, hi in zip(fc["total"], fc["total_lower"], fc["total_upper"])],
+                }, use_container_width=True, hide_index=True)
+
             score = eco_score(latest["electricity_units"], pred)
             st.write("EcoScore (higher is better):")
             st.progress(score/100)
             st.write(f"**{score}/100**")
 
-            latest_co2 = latest["electricity_units"] * CO2_PER_KWH + latest["water_liters"] * CO2_PER_LITER_WATER
+            latest_co2 = co2_kg(latest["electricity_units"], latest["water_liters"])
             st.write(f"Estimated CO₂ footprint (latest day): **{latest_co2:.3f} kg CO₂**")
             st.caption(f"Factors: {CO2_PER_KWH} kgCO₂/kWh, {CO2_PER_LITER_WATER} kgCO₂/L")
 
-            # Removed: st.subheader("Detected Patterns") block
-            
+            st.subheader("Detected Patterns")
+            patterns = cached_user_patterns(db, data_version, selected_user)
+            for msg, severity in patterns:
+                {"alert": st.error, "warning": st.warning}.get(severity, st.info)(msg)
+            if not patterns:
+                st.write("No unusual patterns in the last 30 days.")
+
             st.subheader("Personalized Suggestions")
-            # Note: Since detect_patterns is now empty, generate_suggestions is simplified
             suggestions = generate_suggestions(latest["electricity_units"], pred, df_user)
             for s in suggestions:
                 st.write("•", s)
@@ -394,67 +374,147 @@ with col_main:
                 change_led = st.checkbox("Switch 3 incandescent bulbs -> LED (daily effect)")
                 submit_whatif = st.form_submit_button("Estimate savings")
                 if submit_whatif:
-                    est_elec_save = ac_reduce * 0.8 + (0.5 if change_led else 0.0)
-                    est_water_save = shower_reduce * 10
-                    est_co2_save = est_elec_save * CO2_PER_KWH + est_water_save * CO2_PER_LITER_WATER
-                    st.write(f"Estimated electricity saved/day: **{est_elec_save:.2f} kWh**")
-                    st.write(f"Estimated water saved/day: **{est_water_save:.0f} L**")
-                    st.write(f"Estimated CO₂ reduction/day: **{est_co2_save:.3f} kg CO₂**")
+                    saved = whatif_lookup(cached_whatif_grid(db, data_version, selected_user),
+                                          ac_reduce, shower_reduce, change_led)
+                    st.write(f"Estimated electricity saved/day: **{saved['kwh']:.2f} kWh** "
+                             f"({saved['kwh_pct']:.0f}% of your latest day)")
+                    st.write(f"Estimated water saved/day: **{saved['liters']:.0f} L** "
+                             f"(leaves {saved['liters_per_person']:.0f} L per person)")
+                    st.write(f"Estimated CO₂ reduction/day: **{saved['co2_kg']:.3f} kg CO₂**")
 
         else:
             st.subheader("All users — aggregated")
-            agg = df_filtered.groupby("date").agg({"electricity_units":"mean","water_liters":"mean"}).reset_index()
-            fig_all_e = px.line(agg, x="date", y="electricity_units", title="Average electricity (kWh) — all users")
-            st.plotly_chart(fig_all_e, use_container_width=True)
-            fig_all_w = px.line(agg, x="date", y="water_liters", title="Average water (L) — all users")
-            st.plotly_chart(fig_all_w, use_container_width=True)
-            pred_global = global_trend_predict(df_filtered, "electricity_units")
+            fig_all_e, fig_all_w = cached_aggregate_charts(db, data_version)
+            st.plotly_chart(charts.from_json(fig_all_e), use_container_width=True)
+            st.plotly_chart(charts.from_json(fig_all_w), use_container_width=True)
             st.write(f"Global next-day electricity estimate (average users): **{pred_global:.2f} kWh**")
 
+            st.subheader("Anomalies across all users")
+            alerts = cached_cohort_alerts(db, data_version)
+            if alerts.empty:
+                st.info("No anomalies detected in the last 30 days.")
+            else:
+                counts = alerts["severity"].value_counts()
+                st.write(" | ".join(f"**{counts.get(s, 0)}** {s}" for s in ("alert", "warning", "info")))
+                st.dataframe(alerts[["username", "severity", "message"]], use_container_width=True, hide_index=True)
+
+            other = next(s for s in DATA_SOURCES if s != source)
+            st.subheader(f"{source.title()} vs {other.title()} (last 30 days)")
+            with get_db(other).reader() as other_conn:
+                other_version = get_data_version(other_conn)
+            comparison = cached_source_comparison(db, data_version, other, other_version)
+            if comparison:
+                st.dataframe([{"username": u,
+                               f"{source} kWh": kwh, f"{other} kWh": o_kwh,
+                               f"{source} water L": water, f"{other} water L": o_water}
+                              for u, _n, kwh, water, _o_n, o_kwh, o_water in comparison],
+                             use_container_width=True, hide_index=True)
+            else:
+                st.info("No readings in either source in the last 30 days.")
+
 # RIGHT: Leaderboard & admin
+perf.section("leaderboard")
 with col_side:
     st.header("Leaderboard (last 7 days)")
     # Since date range is removed, we hardcode the leaderboard to the last 7 days
-    last7_start = (date.today() - timedelta(days=7)).strftime(DATE_FMT)
-    last7_df = load_usage_df(conn, last7_start, date.today().strftime(DATE_FMT))
-    users_scores = []
-    for u in last7_df["username"].unique().tolist():
-        du = last7_df[last7_df["username"] == u].sort_values("date")
-        if du.empty:
-            continue
-        latest_val = du.iloc[-1]["electricity_units"]
-        pred_u, _ = fit_linear_trend(du, "electricity_units")
-        if pred_u is None:
-            pred_u = global_trend_predict(last7_df, "electricity_units") or latest_val
-        score = eco_score(latest_val, pred_u)
-        users_scores.append({"username": u, "score": score, "latest_kWh": float(latest_val), "pred": round(float(pred_u),2)})
-    if users_scores:
-        lb = pd.DataFrame(users_scores).sort_values("score", ascending=False).reset_index(drop=True)
+    with db.reader() as conn:
+        lb = dashboard.leaderboard_view(conn)
+        rank = user_rank(conn, username) if username else None
+    if not lb.empty:
         st.table(lb)
+        if rank:
+            st.caption(f"Your rank: #{rank[0]} of {rank[1]} (EcoScore {rank[2]})")
     else:
         st.info("No data in last 7 days to show leaderboard.")
 
+    perf.section("quick_stats")
     st.markdown("---")
     st.subheader("Quick stats")
-    for u in get_user_list(conn):
-        # We use df_all here, which defaults to the last 30 days of data in the new setup
-        du = df_all[df_all["username"] == u] 
-        if du.empty:
-            continue
-        st.write(f"**{u}** — records: {len(du)} | avg kWh: {du['electricity_units'].mean():.2f} | avg water L: {du['water_liters'].mean():.0f}")
+    # Default history window (last 30 days), aggregated in SQLite
+    for u, records, avg_kwh, avg_water in cached_quick_stats(db, data_version):
+        st.write(f"**{u}** — records: {records} | avg kWh: {avg_kwh:.2f} | avg water L: {avg_water:.0f}")
 
+    perf.section("admin")
     st.markdown("---")
     st.subheader("Admin")
+    st.checkbox("Performance panel", key="perf_panel", help="Per-section and SQL timings for each rerun")
+    with st.expander("Export usage data"):
+        # Streamed to a scratch file only when asked for; reruns never build it.
+        exp_cols = st.columns(3)
+        exp_format = exp_cols[0].selectbox("Format", export.FORMATS, key="export_format")
+        exp_sources = exp_cols[1].multiselect("Sources", list(DATA_SOURCES), default=[source], key="export_sources")
+        exp_user = exp_cols[2].text_input("Only user (optional)", key="export_user")
+        exp_range = st.date_input("Dates (optional)", value=(), key="export_range")
+        if st.button("Prepare export"):
+            st.session_state.pop("export_ready", None)
+            if not exp_sources:
+                st.warning("Pick at least one source to export.")
+            else:
+                if not os.path.exists(st.session_state.get("export_file", "")):  # one scratch file at a time
+                    fd, st.session_state["export_file"] = tempfile.mkstemp(prefix="ecosaver_export_")
+                    os.close(fd)
+                start, end = (tuple(exp_range) + (None, None))[:2]
+                try:
+                    n = export.export_usage(st.session_state["export_file"], exp_format, exp_sources,
+                                            start, end or start, exp_user or None)
+                    st.session_state["export_ready"] = (exp_format, n)
+                except ImportError as e:
+                    st.error(str(e))
+        export_file = st.session_state.get("export_file", "")
+        if st.session_state.get("export_ready") and os.path.exists(export_file):
+            exp_done, n = st.session_state["export_ready"]
+
+            # Read only when the button is clicked (never on a rerun), then
+            # delete the scratch file; the next export starts a new one.
+            def export_bytes(path=export_file):
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.remove(path)
+                return data
+
+            st.download_button(f"Download {n} rows ({exp_done})", data=export_bytes,
+                               file_name=f"ecosaver_usage.{exp_done}")
+        else:
+            st.session_state.pop("export_ready", None)
     if st.checkbox("Reset DB (danger!)"):
         if st.button("Confirm reset"):
-            try:
-                conn.close()
-            except Exception:
-                pass
-            if os.path.exists(DB_FILE):
-                os.remove(DB_FILE)
-            ensure_db()
-            st.experimental_rerun()
+            # Resets the selected data source only. The Database is shared by
+            # every session: close() stops new checkouts and waits for the
+            # readers other sessions hold. The other sources' readers may have
+            # this file ATTACHed (source comparison); they are detached and
+            # held back until the new file exists.
+            get_leaderboard_refresher(source).set()
+            db.close()
+            db_file = source_db_file(source)
+            with ExitStack() as paused:
+                for other in DATA_SOURCES:
+                    if other != source:
+                        for reader_conn in paused.enter_context(get_db(other).drained()):
+                            detach_source(reader_conn, source)
+                for path in (db_file, db_file + "-wal", db_file + "-shm"):
+                    if os.path.exists(path):
+                        os.remove(path)
+                ensure_db(db_file)
+            # Drop only this source's resources: the other source's Database
+            # and refresher stay in use (clearing all would leak their threads).
+            get_db.clear(source)
+            get_leaderboard_refresher.clear(source)
+            st.cache_data.clear()
+            st.rerun()
 
 st.markdown("---")
-st.caption("EcoSaver — built for student hackathons. Trend prediction uses simple OLS (statsmodels). CO₂ factors are illustrative approximations.")
\ No newline at end of file
+st.caption("EcoSaver — built for student hackathons. Trend prediction uses least squares with day-of-week terms (NumPy). CO₂ factors are illustrative approximations.")
+
+if perf_on:
+    rec = perf.end_run()
+    if st.session_state.get("perf_panel"):
+        with st.expander(f"Performance — this rerun: {rec.total_ms:.0f} ms", expanded=True):
+            report = rec.to_dict()
+            st.dataframe([{"span": "  " * s["depth"] + s["name"], "start ms": s["start_ms"], "ms": s["ms"]}
+                          for s in sorted(report["spans"], key=lambda s: s["start_ms"])],
+                         use_container_width=True, hide_index=True)
+            if report["sql"]:
+                st.dataframe(report["sql"][:15], use_container_width=True, hide_index=True)
+            if report["counters"]:
+                st.json(report["counters"])
+            st.caption(f"Each recorded rerun is appended to {perf.METRICS_LOG}.")
\ No newline at end of file
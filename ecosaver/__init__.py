@@ -0,0 +1,3 @@
+"""
+EcoSaver core — storage and analytics shared by the Streamlit pages and CLI tools.
+"""
@@ -0,0 +1,378 @@
+# ecosaver/api.py
+"""
+Headless JSON API: per-user history, next-day prediction, EcoScore,
+suggestions and the 7-day leaderboard, without rendering the dashboard.
+
+    GET  /api/health
+    GET  /api/users                      usernames
+    GET  /api/users/<name>               one user's report
+    GET  /api/batch?users=a,b,c          many users' reports in one response
+    POST /api/batch  {"users": [...]}
+    GET  /api/leaderboard[?k=10]         top k of the last-7-days leaderboard
+
+Every endpoint takes ?source=home|school (config.DATA_SOURCES, default home).
+A report holds the default history window (as on the dashboard), the
+next-day trend prediction with the same global-trend fallback, the EcoScore
+of the latest day against it, the suggestions and the leaderboard rank.
+
+Responses are cached in-process on the versions they depend on: the
+data_version bumped by every write, and the leaderboard_version bumped by
+every leaderboard refresh. The ETag is built from the same versions, so a
+request with a matching If-None-Match gets a 304 after a single meta lookup.
+Batch reports reuse the single-user cache entries and compute the rest from
+one indexed read of their rows; predictions come from the stored trend sums.
+
+Usage:  python -m ecosaver.api [--host 127.0.0.1] [--port 8502] [--max-age 0]
+"""
+import argparse
+import json
+import sys
+import threading
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from ecosaver import perf
+from ecosaver.config import DATA_SOURCES, DATE_FMT, DEFAULT_SOURCE
+from ecosaver.dashboard import USER_VIEW_COLUMNS, aggregate_view
+from ecosaver.leaderboard import (LEADERBOARD_TOP_K, VERSION_KEY, start_refresher, stored_window, top_k,
+                                  user_rank)
+from ecosaver.perf import timed
+from ecosaver.pool import Database
+from ecosaver.rollups import window_start
+from ecosaver.scoring import eco_score
+from ecosaver.sources import source_db_file
+from ecosaver.storage import get_user_list, load_usage_df
+from ecosaver.suggestions import generate_suggestions
+from ecosaver.trend_stats import predict_next
+
+DEFAULT_PORT = 8502          # next to Streamlit's 8501
+CACHE_MAX_ENTRIES = 1024
+MAX_BATCH_USERS = 500
+MAX_LEADERBOARD_K = 1000
+
+
+# ---------------------------
+# Reports
+# ---------------------------
+def _num(value):
+    # JSON has no NaN; numpy scalars become Python numbers.
+    if value is None or value != value:
+        return None
+    return float(value)
+
+@timed()
+def user_reports(conn, usernames) -> dict:
+    """
+    {username: report} for the given users that have readings in the default
+    history window: one read for all of them, and each prediction from the
+    user's stored trend sums. Users with too little history get the global
+    trend, as in dashboard.user_prediction.
+    """
+    import numpy as np
+
+    df = load_usage_df(conn, columns=USER_VIEW_COLUMNS, username=list(usernames))
+    if df.empty:
+        return {}
+    # Stable: each user's rows become one contiguous run, still in date order.
+    df = df.sort_values("username", kind="stable", ignore_index=True)
+    names = df["username"].astype(str).to_numpy()
+    starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]])
+    ends = np.r_[starts[1:], len(df)]
+    since = window_start(conn)
+    dates = df["date"].dt.strftime(DATE_FMT).tolist()
+    elec = df["electricity_units"].astype(float).tolist()
+    water = df["water_liters"].astype(int).tolist()
+    hh = df["household_size"].astype(int).tolist()
+
+    global_pred = []
+    reports = {}
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        name = str(names[s])
+        pred, used_global = _num(predict_next(conn, name, since)[0]), False
+        if pred is None:
+            if not global_pred:
+                global_pred.append(aggregate_view(conn)[1])
+            pred, used_global = _num(global_pred[0]), True
+        rank = user_rank(conn, name)
+        reports[name] = {
+            "username": name,
+            "history": [{"date": d, "electricity_units": k, "water_liters": w, "household_size": h}
+                        for d, k, w, h in zip(dates[s:e], elec[s:e], water[s:e], hh[s:e])],
+            "latest": {"date": dates[e - 1], "electricity_units": elec[e - 1], "water_liters": water[e - 1]},
+            "prediction": {"next_day_kwh": pred, "used_global_trend": used_global},
+            "eco_score": eco_score(elec[e - 1], pred),
+            "suggestions": generate_suggestions(elec[e - 1], pred, df.iloc[s:e]),
+            "rank": {"rank": rank[0], "of": rank[1], "score": rank[2]} if rank else None,
+        }
+    return reports
+
+def leaderboard_report(conn, k=LEADERBOARD_TOP_K) -> dict:
+    """The stored leaderboard window and its top `k` rows, best first."""
+    start, end = stored_window(conn) or (None, None)
+    return {
+        "window": {"start": start, "end": end},
+        "rows": [{"rank": i, "username": u, "score": s, "latest_kwh": _num(latest), "pred": _num(pred)}
+                 for i, (u, s, latest, pred) in enumerate(top_k(conn, k), 1)],
+    }
+
+def versions(conn) -> dict:
+    """{"data": data_version, "leaderboard": leaderboard_version} in one read."""
+    found = dict(conn.execute("SELECT key, value FROM meta WHERE key IN ('data_version', ?)", (VERSION_KEY,)))
+    return {"data": found.get("data_version", 0), "leaderboard": found.get(VERSION_KEY, 0)}
+
+
+# ---------------------------
+# Cache
+# ---------------------------
+class _Cache:
+    """Thread-safe LRU. Keys carry the versions they were computed at, so stale entries just age out."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+                perf.count("api.cache_hit")
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return value
+
+class Api:
+    """
+    Request handling without the HTTP layer: `respond` maps (method, path,
+    query, body, If-None-Match) to (status, headers, body bytes).
+    One pooled Database (and optionally a leaderboard refresher) per source.
+    """
+
+    def __init__(self, max_age=0, refresh=True, cache_entries=CACHE_MAX_ENTRIES):
+        self.max_age = max_age
+        self.refresh = refresh
+        self.cache = _Cache(cache_entries)
+        self._dbs = {}
+        self._refreshers = []
+        self._lock = threading.Lock()
+
+    def db(self, source) -> Database:
+        with self._lock:
+            if source not in self._dbs:
+                self._dbs[source] = Database(source_db_file(source))
+                if self.refresh:
+                    self._refreshers.append(start_refresher(source_db_file(source)))
+            return self._dbs[source]
+
+    def close(self):
+        for stop in self._refreshers:
+            stop.set()
+        for db in self._dbs.values():
+            db.close()
+
+    # Route -> the versions its response depends on (a report includes the rank).
+    _DEPENDS = {"users": ("data",), "user": ("data", "leaderboard"), "batch": ("data", "leaderboard"),
+                "leaderboard": ("leaderboard",)}
+
+    def respond(self, method, path, query, body=b"", if_none_match=None):
+        try:
+            route, args = self._route(method, path, query, body)
+        except _NotAllowed as e:
+            return self._error(HTTPStatus.METHOD_NOT_ALLOWED, str(e))
+        except LookupError as e:
+            return self._error(HTTPStatus.NOT_FOUND, str(e))
+        except ValueError as e:
+            return self._error(HTTPStatus.BAD_REQUEST, str(e))
+        if route == "health":
+            return self._json(HTTPStatus.OK, {"status": "ok", "sources": list(DATA_SOURCES)})
+
+        source = args["source"]
+        db = self.db(source)
+        with db.reader() as conn:
+            # Versions are read before the rows: a write in between makes the
+            # body newer than its ETag, never older.
+            v = versions(conn)
+            tag = [v[name] for name in self._DEPENDS[route]]
+            etag = f'"{source}-{route}-{"-".join(map(str, tag))}"'
+            headers = {"ETag": etag, "Cache-Control": f"max-age={self.max_age}" if self.max_age else "no-cache"}
+            if method == "GET" and _etag_matches(if_none_match, etag):
+                perf.count("api.not_modified")
+                return HTTPStatus.NOT_MODIFIED, headers, b""
+
+            key = (source, route, args.get("key"), tuple(tag))
+            payload = self.cache.get(key)
+            if payload is None:
+                payload = self.cache.put(key, self._encode(self._compute(conn, route, args, source, tag)))
+        if payload is _MISSING_USER:
+            return self._error(HTTPStatus.NOT_FOUND, f"No readings for user {args['key']!r} in the history window")
+        return HTTPStatus.OK, dict(headers, **{"Content-Type": "application/json"}), payload
+
+    def _compute(self, conn, route, args, source, tag):
+        if route == "users":
+            return {"users": get_user_list(conn)}
+        if route == "leaderboard":
+            return leaderboard_report(conn, args["key"])
+        reports = self._reports(conn, source, tag, args["users"])
+        if route == "user":
+            return reports.get(args["users"][0], _MISSING_USER)
+        return {"users": [reports[u] for u in args["users"] if u in reports],
+                "missing": [u for u in args["users"] if u not in reports]}
+
+    def _reports(self, conn, source, tag, usernames) -> dict:
+        """Reports for `usernames`, reusing and filling the per-user cache."""
+        reports, todo = {}, []
+        for u in usernames:
+            cached = self.cache.get((source, "report", u, tuple(tag)))
+            if cached is not None:
+                reports[u] = cached
+            else:
+                todo.append(u)
+        fresh = user_reports(conn, todo) if todo else {}
+        for u in todo:
+            # Users without readings are cached too, as a miss.
+            reports[u] = self.cache.put((source, "report", u, tuple(tag)), fresh.get(u, _MISSING_USER))
+        return {u: r for u, r in reports.items() if r is not _MISSING_USER}
+
+    def _route(self, method, path, query, body):
+        """(route, args) for a request; LookupError for unknown paths, ValueError for bad arguments."""
+        parts = [unquote(p) for p in path.strip("/").split("/")]
+        if parts[:1] != ["api"] or len(parts) < 2:
+            raise LookupError(f"Unknown path {path!r}")
+        params = {k: v[-1] for k, v in parse_qs(query).items()}
+        source = params.get("source", DEFAULT_SOURCE).strip().lower()
+        source_db_file(source)  # ValueError for an unknown source
+        route, rest = parts[1], parts[2:]
+        if method == "POST" and route != "batch" or method not in ("GET", "POST"):
+            raise _NotAllowed(f"{method} {path} is not supported")
+
+        if route == "health" and not rest:
+            return "health", {}
+        if route == "users" and not rest:
+            return "users", {"source": source}
+        if route == "users" and len(rest) == 1 and rest[0].strip():
+            name = rest[0].strip().lower()
+            return "user", {"source": source, "users": [name], "key": name}
+        if route == "leaderboard" and not rest:
+            k = int(params.get("k", LEADERBOARD_TOP_K))
+            if not 1 <= k <= MAX_LEADERBOARD_K:
+                raise ValueError(f"k must be between 1 and {MAX_LEADERBOARD_K}")
+            return "leaderboard", {"source": source, "key": k}
+        if route == "batch" and not rest:
+            if method == "POST":
+                try:
+                    users = json.loads(body or b"{}").get("users")
+                except (json.JSONDecodeError, AttributeError):
+                    raise ValueError('Expected a JSON body like {"users": ["name", ...]}') from None
+                if not isinstance(users, list) or not all(isinstance(u, str) for u in users):
+                    raise ValueError('"users" must be a list of usernames')
+            else:
+                users = params.get("users", "").split(",")
+            users = list(dict.fromkeys(u.strip().lower() for u in users if u.strip()))
+            if not users:
+                raise ValueError("No users given")
+            if len(users) > MAX_BATCH_USERS:
+                raise ValueError(f"At most {MAX_BATCH_USERS} users per batch")
+            return "batch", {"source": source, "users": users, "key": tuple(users)}
+        raise LookupError(f"Unknown path {path!r}")
+
+    @staticmethod
+    def _encode(payload):
+        return payload if payload is _MISSING_USER else json.dumps(payload, allow_nan=False).encode()
+
+    def _json(self, status, payload):
+        return status, {"Content-Type": "application/json", "Cache-Control": "no-store"}, self._encode(payload)
+
+    def _error(self, status, message):
+        return self._json(status, {"error": message})
+
+_MISSING_USER = object()
+
+class _NotAllowed(Exception):
+    pass
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    # Weak comparison, as If-None-Match requires.
+    return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+
+# ---------------------------
+# HTTP server
+# ---------------------------
+def make_handler(api: Api, quiet=False):
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "EcoSaverAPI/1"
+
+        def _handle(self, method):
+            url = urlsplit(self.path)
+            body = b""
+            if method == "POST":
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            rec = perf.start_run("api") if perf.enabled_by_env() else None
+            try:
+                status, headers, payload = api.respond(method, url.path, url.query, body,
+                                                       self.headers.get("If-None-Match"))
+            finally:
+                if rec is not None:
+                    perf.end_run()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            self._handle("GET")
+
+        def do_POST(self):
+            self._handle("POST")
+
+        def log_message(self, fmt, *args):
+            if not quiet:
+                super().log_message(fmt, *args)
+
+    return Handler
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, max_age=0, refresh=True, quiet=False):
+    """(ThreadingHTTPServer, Api); call serve_forever() on the server, then api.close()."""
+    api = Api(max_age=max_age, refresh=refresh)
+    return ThreadingHTTPServer((host, port), make_handler(api, quiet)), api
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve EcoSaver predictions, EcoScores and the leaderboard as JSON.")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT})")
+    parser.add_argument("--max-age", type=int, default=0,
+                        help="Cache-Control max-age in seconds (default: 0, clients revalidate every poll)")
+    parser.add_argument("--no-refresh", action="store_true",
+                        help="Don't refresh the leaderboard here (the dashboard process already does)")
+    parser.add_argument("--quiet", action="store_true", help="Don't log each request")
+    args = parser.parse_args(argv)
+
+    server, api = make_server(args.host, args.port, args.max_age, not args.no_refresh, args.quiet)
+    print(f"Serving on http://{args.host}:{server.server_port}/api/", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        api.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# ecosaver/appliances.py
+"""
+Appliance-level energy model and the What-If savings grid.
+
+APPLIANCES lists each appliance's activity keys (a unit count and hours per
+day; either may be fixed) and its draw. `daily_usage` turns any number of
+activity records into kWh, litres and kg CO₂ arrays in one call: the records
+become a (records x keys) matrix and the appliance terms are column products
+summed by `energy_kwh`, which also serves callers with their own rates.
+
+`whatif_grid` evaluates every position of the What-If sliders (AC hours x
+shower minutes x LED swap) for one user's latest day and household size at
+once; `whatif_lookup` then reads a single cell, so a slider change is an
+index lookup rather than a recomputation.
+"""
+from collections import namedtuple
+
+from ecosaver.carbon import AC_KWH_PER_HOUR, LED_SWAP_KWH, SHOWER_LITERS_PER_MIN, co2_kg
+
+# Typical appliance draw (kWh per hour of use), as used by the AI estimator page.
+AC_KWH = 1.5
+HEATER_KWH = 2.0
+MICROWAVE_KWH = 0.8
+INDUCTION_STOVE_KWH = 2.0
+FAN_KWH = 0.05
+LIGHT_KWH = 0.01
+PUMP_KWH = 1.0
+WATER_PUMP_LPH = 300      # litres delivered per pump hour
+AMBIENT_HOURS = 8         # assumed daily run time of fans and lights
+BASE_WATER_PER_PERSON = 50
+MIN_DAILY_KWH = 0.1
+
+# count_key None: a single unit; hours_key None: AMBIENT_HOURS a day.
+Appliance = namedtuple("Appliance", "name count_key hours_key kwh_per_hour")
+APPLIANCES = (
+    Appliance("ac", "num_acs", "duration_ac_hours", AC_KWH),
+    Appliance("heater", "num_heaters", "duration_heater_hours", HEATER_KWH),
+    Appliance("microwave", None, "duration_microwave_hours", MICROWAVE_KWH),
+    Appliance("induction_stove", None, "duration_induction_stove_hours", INDUCTION_STOVE_KWH),
+    Appliance("water_pump", None, "duration_water_pump_motors", PUMP_KWH),
+    Appliance("fan", "num_fans", None, FAN_KWH),
+    Appliance("light", "num_lights", None, LIGHT_KWH),
+)
+PUMP_HOURS_KEY = "duration_water_pump_motors"
+
+# Slider positions of the What-If form; the grid has one cell per combination.
+WHATIF_AC_HOURS = tuple(i / 4 for i in range(17))   # 0 to 4, step 0.25
+WHATIF_SHOWER_MINS = tuple(range(11))
+WHATIF_LED = (False, True)
+
+
+# ---------------------------
+# Appliance model
+# ---------------------------
+def activity_matrix(records, keys):
+    """
+    (len(records) x len(keys)) float array from a DataFrame, a dict of
+    columns or a list of dicts. Missing keys and NaNs count as 0.
+    """
+    import numpy as np
+
+    if isinstance(records, (list, tuple)):
+        m = np.array([[r.get(k) or 0 for k in keys] for r in records], dtype=float).reshape(len(records), len(keys))
+    else:
+        n = len(records) if hasattr(records, "columns") else len(next(iter(records.values()), ()))
+        m = np.column_stack([np.asarray(records[k], dtype=float) if k in records else np.zeros(n)
+                             for k in keys]) if keys else np.zeros((n, 0))
+    return np.nan_to_num(m)
+
+def energy_kwh(counts, hours, rates):
+    """Σ counts x hours x rates over the last axis; shapes broadcast (e.g. one row per record)."""
+    import numpy as np
+
+    return (np.asarray(counts, dtype=float) * np.asarray(hours, dtype=float)
+            * np.asarray(rates, dtype=float)).sum(axis=-1)
+
+def daily_usage(records, hh_size=1):
+    """
+    (kWh, litres, kg CO₂) arrays for a day of each activity record, keyed
+    like the estimator's ESTIMATE_KEYS. `hh_size` is a scalar or one value
+    per record. Matches estimator.usage_from_estimate record by record.
+    """
+    import numpy as np
+
+    keys = [k for a in APPLIANCES for k in (a.count_key, a.hours_key) if k]
+    m = activity_matrix(records, keys)
+    col = {k: m[:, i] for i, k in enumerate(keys)}
+    ones = np.ones(len(m))
+    counts = np.column_stack([col[a.count_key] if a.count_key else ones for a in APPLIANCES])
+    hours = np.column_stack([col[a.hours_key] if a.hours_key else ones * AMBIENT_HOURS for a in APPLIANCES])
+    elec = np.maximum(energy_kwh(counts, hours, [a.kwh_per_hour for a in APPLIANCES]), MIN_DAILY_KWH)
+    water = (np.trunc(col[PUMP_HOURS_KEY] * WATER_PUMP_LPH)
+             + np.asarray(hh_size, dtype=float) * BASE_WATER_PER_PERSON).astype(np.int64)
+    return elec, water, co2_kg(elec, water)
+
+# ---------------------------
+# What-If grid
+# ---------------------------
+def whatif_grid(latest_kwh=None, latest_liters=None, hh_size=1):
+    """
+    {field: array} over (WHATIF_AC_HOURS, WHATIF_SHOWER_MINS, WHATIF_LED):
+    kWh, litres and kg CO₂ saved per day, the share of the latest day saved
+    (kwh_pct, liters_pct) and litres per person left after the saving. The
+    last three are NaN without a latest day.
+    """
+    import numpy as np
+
+    ac, shower, led = np.meshgrid(WHATIF_AC_HOURS, WHATIF_SHOWER_MINS, WHATIF_LED, indexing="ij")
+    kwh = ac * AC_KWH_PER_HOUR + np.where(led, LED_SWAP_KWH, 0.0)
+    liters = shower * float(SHOWER_LITERS_PER_MIN)
+    missing = np.full(kwh.shape, np.nan)
+    return {
+        "kwh": kwh,
+        "liters": liters,
+        "co2_kg": co2_kg(kwh, liters),
+        "kwh_pct": 100 * kwh / latest_kwh if latest_kwh else missing,
+        "liters_pct": 100 * liters / latest_liters if latest_liters else missing,
+        "liters_per_person": (np.maximum(latest_liters - liters, 0) / max(int(hh_size or 1), 1)
+                              if latest_liters is not None else missing),
+    }
+
+def whatif_lookup(grid, ac_reduce_hours, shower_reduce_mins, change_led=False):
+    """{field: value} of the grid cell nearest the slider values."""
+    i = min(range(len(WHATIF_AC_HOURS)), key=lambda k: abs(WHATIF_AC_HOURS[k] - ac_reduce_hours))
+    j = min(range(len(WHATIF_SHOWER_MINS)), key=lambda k: abs(WHATIF_SHOWER_MINS[k] - shower_reduce_mins))
+    return {field: float(values[i, j, int(bool(change_led))]) for field, values in grid.items()}
@@ -0,0 +1,260 @@
+# ecosaver/bench.py
+"""
+Micro-benchmarks for the EcoSaver core, run headless against a scratch database.
+
+Each case is timed `--repeat` times after a warm-up call and reported as
+latency percentiles, throughput (rows or calls per second at the median) and
+peak Python heap during one extra traced call. `import.*` cases time a cold
+import of each package module in a fresh interpreter (peak = child max RSS). Results are written as JSON
+so two commits can be compared with --compare.
+
+Usage:
+    python -m ecosaver.bench --db /tmp/eco_bench.db --users 2000 --days 365 --json out.json
+    python -m ecosaver.bench --db /tmp/eco_bench.db --compare out.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+
+import numpy as np
+
+from ecosaver.api import MAX_BATCH_USERS, user_reports
+from ecosaver.charts import downsample
+from ecosaver.dashboard import dashboard_pass
+from ecosaver.forecast import fit_users, forecasts, predict, refresh_forecasts
+from ecosaver.leaderboard import LEADERBOARD_TOP_K, refresh_leaderboard, top_k, user_rank
+from ecosaver.patterns import detect_alerts
+from ecosaver.rollups import load_daily_rollup
+from ecosaver.scoring import eco_score, compute_leaderboard
+from ecosaver.storage import get_conn, load_usage_df
+from ecosaver.suggestions import generate_suggestions
+from ecosaver.trend_stats import predict_next
+from ecosaver.trends import (fit_linear_trend, global_trend_predict, batch_linear_trends,
+                             global_trend_from_daily)
+
+ECO_SCORE_CALLS = 10_000
+
+# Cold-start import cost, each measured in a fresh interpreter. The modules
+# app.py imports at the top must stay free of numpy / pandas.
+IMPORT_MODULES = ["ecosaver.storage", "ecosaver.trend_stats", "ecosaver.trends",
+                  "ecosaver.dashboard", "ecosaver.forecast", "ecosaver.charts",
+                  "ecosaver.appliances", "ecosaver.export", "ecosaver.pool", "ecosaver.bench"]
+
+_IMPORT_PROBE = """
+import importlib, sys, time
+t0 = time.perf_counter()
+importlib.import_module(sys.argv[1])
+dt = time.perf_counter() - t0
+rss_kb = 0
+try:  # VmHWM is this process's own peak; ru_maxrss can include the forking parent
+    with open("/proc/self/status") as f:
+        rss_kb = next(int(l.split()[1]) for l in f if l.startswith("VmHWM:"))
+except (OSError, StopIteration):
+    try:
+        import resource
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        pass
+print(dt, rss_kb)
+"""
+
+
+# ---------------------------
+# Cases
+# ---------------------------
+def build_cases(conn):
+    """[(name, items, fn)]: `items` is what one call processes, for throughput."""
+    df_window = load_usage_df(conn)
+    if df_window.empty:
+        raise ValueError("Benchmark database has no usage rows; pass --users/--days to generate a cohort.")
+    username = df_window["username"].iloc[0]
+    df_user = df_window[df_window["username"] == username]
+    end = df_window["date"].max()
+    df_week = df_window[df_window["date"] > end - timedelta(days=7)]
+    latest, pred = float(df_user["electricity_units"].iloc[-1]), float(df_user["electricity_units"].mean())
+    rng = np.random.default_rng(0)
+    score_pairs = list(zip(rng.uniform(0, 10, ECO_SCORE_CALLS).tolist(),
+                           rng.uniform(0, 10, ECO_SCORE_CALLS).tolist()))
+    n_window, n_user, n_week = len(df_window), len(df_user), len(df_week)
+    refresh_leaderboard(conn)
+    refresh_forecasts(conn)
+    user_ids = [r[0] for r in conn.execute("SELECT id FROM users")]
+    batch = df_window["username"].astype(str).unique()[:MAX_BATCH_USERS].tolist()
+
+    return [
+        ("load_usage_df.window", n_window, lambda: load_usage_df(conn)),
+        ("load_usage_df.user", n_user, lambda: load_usage_df(conn, username=username)),
+        ("fit_linear_trend.user", n_user, lambda: fit_linear_trend(df_user)),
+        ("predict_next.user", 1, lambda: predict_next(conn, username)),
+        ("global_trend_predict.window", n_window, lambda: global_trend_predict(df_window)),
+        ("batch_linear_trends.window", n_window, lambda: batch_linear_trends(df_window)),
+        ("forecast.fit_all", len(user_ids), lambda: predict(fit_users(conn, user_ids))),
+        ("forecast.stored.user", 1, lambda: forecasts(conn, [username])),
+        ("compute_leaderboard.week", n_week, lambda: compute_leaderboard(df_week)),
+        ("leaderboard.top_k", LEADERBOARD_TOP_K, lambda: top_k(conn)),
+        ("leaderboard.user_rank", 1, lambda: user_rank(conn, username)),
+        ("api.user_reports.user", 1, lambda: user_reports(conn, [username])),
+        ("api.user_reports.batch", len(batch), lambda: user_reports(conn, batch)),
+        ("eco_score.x10k", ECO_SCORE_CALLS, lambda: [eco_score(l, p) for l, p in score_pairs]),
+        ("generate_suggestions.user", 1, lambda: generate_suggestions(latest, pred, df_user)),
+        ("detect_alerts.window", n_window, lambda: detect_alerts(df_window)),
+        ("daily_rollup.global_trend", n_window,
+         lambda: global_trend_from_daily(load_daily_rollup(conn), "elec_sum")),
+        ("charts.downsample.window", n_window,
+         lambda: downsample(df_window, "date", "electricity_units")),
+        ("dashboard_pass", 1, lambda: dashboard_pass(conn, username)),
+    ]
+
+def measure(fn, items: int, repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return _summarise(np.array(times) * 1000, items, repeat, peak / 2**20)
+
+def _summarise(ms, items, repeat, peak_mb):
+    ms = np.asarray(ms)
+    p50 = float(np.percentile(ms, 50))
+    return {
+        "items": items,
+        "repeat": repeat,
+        "mean_ms": float(ms.mean()),
+        "min_ms": float(ms.min()),
+        "p50_ms": p50,
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "items_per_s": items / (p50 / 1000) if p50 > 0 else None,
+        "peak_mem_mb": peak_mb,
+    }
+
+def measure_import(module: str, repeat: int) -> dict:
+    """Import time of `module` in `repeat` fresh interpreters; peak memory is the child's max RSS."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    times, rss = [], []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE, module], capture_output=True,
+                             text=True, check=True, env=env).stdout.split()
+        times.append(float(out[0]) * 1000)
+        rss.append(int(out[1]))
+    return _summarise(times, 1, repeat, max(rss) / 1024)
+
+def _selected(name, only):
+    return not only or any(name.startswith(o) for o in only)
+
+def run(conn, repeat: int, only=None) -> dict:
+    results = {}
+    for name, items, fn in build_cases(conn):
+        if _selected(name, only):
+            results[name] = measure(fn, items, repeat)
+    for module in IMPORT_MODULES:
+        name = f"import.{module}"
+        if _selected(name, only):
+            results[name] = measure_import(module, min(repeat, 5))
+    return results
+
+# ---------------------------
+# Reporting
+# ---------------------------
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results):
+    print(f"{'case':32} {'items':>9} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'items/s':>12} {'peak MB':>9}")
+    for name, r in results.items():
+        rate = f"{r['items_per_s']:,.0f}" if r["items_per_s"] else "-"
+        print(f"{name:32} {r['items']:>9} {r['p50_ms']:>10.2f} {r['p95_ms']:>10.2f} "
+              f"{r['p99_ms']:>10.2f} {rate:>12} {r['peak_mem_mb']:>9.1f}")
+
+def compare(results, baseline, threshold: float) -> int:
+    """Print p50 ratios against a previous JSON report; returns the number of regressions."""
+    regressions = 0
+    print(f"\n{'case':32} {'base p50':>10} {'new p50':>10} {'ratio':>7}")
+    for name, r in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        ratio = r["p50_ms"] / old["p50_ms"] if old["p50_ms"] else float("inf")
+        flag = "  REGRESSION" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{name:32} {old['p50_ms']:>10.2f} {r['p50_ms']:>10.2f} {ratio:>7.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the EcoSaver core functions headless.")
+    parser.add_argument("--db", required=True, help="Scratch SQLite file")
+    parser.add_argument("--users", type=int, help="Generate this many synthetic users if the DB is empty")
+    parser.add_argument("--days", type=int, default=365, help="Days per generated user (default: 365)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", nargs="*", help="Run only cases whose name starts with one of these")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Previous --json report to compare p50 latencies against")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="p50 ratio above which a case counts as a regression (default: 1.2)")
+    args = parser.parse_args(argv)
+
+    conn = get_conn(args.db)
+    try:
+        rows = conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0]
+        if rows == 0 and args.users:
+            from ecosaver.synth import write_cohort
+            t0 = time.perf_counter()
+            rows = write_cohort(conn, args.users, args.days, args.seed)
+            print(f"Generated {rows} rows in {time.perf_counter() - t0:.2f}s")
+        results = run(conn, args.repeat, args.only)
+        users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "db": os.path.abspath(args.db),
+            "users": users,
+            "rows": rows,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            if compare(results, json.load(f), args.threshold):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
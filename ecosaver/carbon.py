@@ -0,0 +1,22 @@
+# ecosaver/carbon.py
+"""
+CO₂ estimates for daily usage and the What-If savings form.
+"""
+from ecosaver.config import CO2_PER_KWH, CO2_PER_LITER_WATER
+
+# What-If assumptions: kWh saved per hour of AC/heavy load avoided, daily
+# saving from swapping 3 incandescent bulbs for LEDs, litres per shower minute.
+AC_KWH_PER_HOUR = 0.8
+LED_SWAP_KWH = 0.5
+SHOWER_LITERS_PER_MIN = 10
+
+
+def co2_kg(elec_kwh, water_liters):
+    """kg CO₂ for `elec_kwh` of electricity plus `water_liters` of water."""
+    return elec_kwh * CO2_PER_KWH + water_liters * CO2_PER_LITER_WATER
+
+def whatif_savings(ac_reduce_hours, shower_reduce_mins, change_led=False):
+    """(kWh, litres, kg CO₂) saved per day by the What-If choices."""
+    elec = ac_reduce_hours * AC_KWH_PER_HOUR + (LED_SWAP_KWH if change_led else 0.0)
+    water = shower_reduce_mins * SHOWER_LITERS_PER_MIN
+    return elec, water, co2_kg(elec, water)
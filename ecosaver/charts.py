@@ -0,0 +1,137 @@
+# ecosaver/charts.py
+"""
+Chart data pipeline for the dashboard's usage plots.
+
+Series longer than the point budget are decimated server-side before plotly
+sees them: line charts with Largest-Triangle-Three-Buckets (LTTB), which
+keeps the visual shape, and bar charts with min/max bucketing, which keeps
+every bucket's peak and trough. Above WEBGL_THRESHOLD raw points line traces
+switch to WebGL. Series within the budget are plotted exactly as before.
+
+Figures are returned as plotly JSON so app.py can cache the serialized
+payload per data_version; `from_json` turns it back into a figure.
+"""
+
+from ecosaver.perf import timed
+
+CHART_POINT_BUDGET = 1000
+WEBGL_THRESHOLD = 2000
+
+
+# ---------------------------
+# Decimation
+# ---------------------------
+def _as_float(x):
+    import numpy as np
+
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype("int64").astype("float64")
+    return x.astype("float64")
+
+def lttb_indices(x, y, budget: int):
+    """
+    Indices of the `budget` points LTTB keeps from (x, y), which must be in x
+    order. The first and last points are always kept.
+    """
+    import numpy as np
+
+    n = len(y)
+    if budget >= n or budget < 3:
+        return np.arange(n)
+    x, y = _as_float(x), np.asarray(y, dtype="float64")
+    # Interior points split into budget - 2 buckets; one point is picked per bucket.
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    keep = np.empty(budget, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(budget - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex.
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+def minmax_indices(y, budget: int):
+    """
+    Indices of each bucket's minimum and maximum (at most `budget` points in
+    total), in their original order. The first and last points are always kept.
+    """
+    import numpy as np
+
+    n = len(y)
+    if budget >= n or budget < 4:
+        return np.arange(n)
+    y = np.asarray(y, dtype="float64")
+    buckets = (budget - 2) // 2
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    keep = [0, n - 1]
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            seg = y[lo:hi]
+            keep += [lo + int(np.argmin(seg)), lo + int(np.argmax(seg))]
+    return np.unique(keep)
+
+def downsample(df, x: str, y: str, budget: int = CHART_POINT_BUDGET, method: str = "lttb"):
+    """
+    `df` reduced to about `budget` rows for plotting `y` over `x` ("lttb" or
+    "minmax"). Frames within the budget are returned unchanged.
+    """
+    if len(df) <= budget:
+        return df
+    if method == "lttb":
+        idx = lttb_indices(df[x].to_numpy(), df[y].to_numpy(), budget)
+    elif method == "minmax":
+        idx = minmax_indices(df[y].to_numpy(), budget)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method!r}")
+    return df.iloc[idx]
+
+# ---------------------------
+# Figures
+# ---------------------------
+def _title(title, shown, total):
+    return title if shown == total else f"{title} ({shown:,} of {total:,} points)"
+
+@timed()
+def line_json(df, x: str, y: str, title: str, markers: bool = False,
+              budget: int = CHART_POINT_BUDGET) -> str:
+    """Plotly JSON for a line chart of `y` over `x`, decimated with LTTB above `budget`."""
+    import plotly.express as px
+
+    data = downsample(df, x, y, budget, "lttb")
+    if len(data) == len(df):
+        fig = px.line(data, x=x, y=y, markers=markers, title=title)
+    else:
+        # Markers would suggest every shown point is a raw sample.
+        fig = px.line(data, x=x, y=y, title=_title(title, len(data), len(df)),
+                      render_mode="webgl" if len(df) > WEBGL_THRESHOLD else "auto")
+    return fig.to_json()
+
+@timed()
+def bar_json(df, x: str, y: str, title: str, budget: int = CHART_POINT_BUDGET) -> str:
+    """Plotly JSON for a bar chart of `y` over `x`, min/max-bucketed above `budget`."""
+    import plotly.express as px
+
+    data = downsample(df, x, y, budget, "minmax")
+    return px.bar(data, x=x, y=y, title=_title(title, len(data), len(df))).to_json()
+
+def user_charts(df_user, budget: int = CHART_POINT_BUDGET):
+    """(electricity line, water bar) JSON for one user's frame."""
+    return (line_json(df_user, "date", "electricity_units", "Electricity (kWh) over time",
+                      markers=True, budget=budget),
+            bar_json(df_user, "date", "water_liters", "Water (L) over time", budget))
+
+def aggregate_charts(agg, budget: int = CHART_POINT_BUDGET):
+    """(electricity, water) line JSON for the all-users daily averages."""
+    return (line_json(agg, "date", "electricity_units", "Average electricity (kWh) — all users", budget=budget),
+            line_json(agg, "date", "water_liters", "Average water (L) — all users", budget=budget))
+
+def from_json(payload: str):
+    import plotly.io as pio
+
+    return pio.from_json(payload)
@@ -0,0 +1,19 @@
+# ecosaver/config.py
+import os
+
+# ---------------------------
+# Config & constants
+# ---------------------------
+APP_NAME = "EcoSaver"
+DB_DIR = "data"
+DB_FILE = os.path.join(DB_DIR, "techforge_eco.db")
+# One SQLite file per data source, same schema in each; home keeps the original file.
+DATA_SOURCES = {
+    "home": DB_FILE,
+    "school": os.path.join(DB_DIR, "techforge_eco_school.db"),
+}
+DEFAULT_SOURCE = "home"
+CO2_PER_KWH = 0.82          # kg CO2 per kWh (example factor)
+CO2_PER_LITER_WATER = 0.00035  # kg CO2 per liter (1000 L -> 0.35 kg)
+DATE_FMT = "%Y-%m-%d"
+DEFAULT_HISTORY_DAYS = 30 # For default filtering after date range removal
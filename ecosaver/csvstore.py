@@ -0,0 +1,295 @@
+# ecosaver/csvstore.py
+"""
+Append-only CSV log with date-partitioned columnar storage, for the CSV
+backend of techforge_ecosaver.
+
+Writes append one line to the log (data/usage.csv). `compact` moves the log
+into one directory per month under data/usage_parts/, each holding one .npy
+array per column that is read back memory-mapped. manifest.json names the
+live partition directories and the log byte offset already compacted; it is
+replaced atomically, so readers see either the old or the new layout.
+Partitions a compaction supersedes are listed as retired and deleted by a
+later compaction once RETIRE_GRACE_SECONDS have passed, so a reader holding
+the previous manifest can still open them.
+`load_data` reads only the months overlapping the requested dates plus the
+uncompacted tail of the log.
+
+Usage:  python -m ecosaver.csvstore [--log data/usage.csv]   (compact now)
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+
+LOG_COLUMNS = ["name", "date", "electricity_units", "water_liters", "household_size"]
+COLUMN_DTYPES = {"electricity_units": "float64", "water_liters": "int64", "household_size": "int64"}
+MANIFEST = "manifest.json"
+COMPACT_THRESHOLD_BYTES = 256 * 1024
+RETIRE_GRACE_SECONDS = 300
+
+_compact_lock = threading.Lock()
+
+
+def parts_dir_for(log_file: str) -> str:
+    return os.path.splitext(log_file)[0] + "_parts"
+
+def _read_manifest(parts_dir):
+    try:
+        with open(os.path.join(parts_dir, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"log_offset": 0, "partitions": {}}
+
+def _write_manifest(parts_dir, manifest):
+    tmp = os.path.join(parts_dir, f".{MANIFEST}.{uuid.uuid4().hex}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(parts_dir, MANIFEST))
+
+# ---------------------------
+# Writes
+# ---------------------------
+def append_entry(row: dict, log_file: str):
+    """Append one entry as a single CSV line; the log is created with a header if missing."""
+    new = not os.path.exists(log_file) or os.path.getsize(log_file) == 0
+    line = io.StringIO()
+    writer = csv.writer(line, lineterminator="\n")
+    if new:
+        writer.writerow(LOG_COLUMNS)
+    writer.writerow([row.get(c, "") for c in LOG_COLUMNS])
+    # One write() call per entry keeps concurrent appenders from interleaving lines.
+    with open(log_file, "a", encoding="utf-8", newline="") as f:
+        f.write(line.getvalue())
+
+def uncompacted_bytes(log_file: str) -> int:
+    if not os.path.exists(log_file):
+        return 0
+    return os.path.getsize(log_file) - _read_manifest(parts_dir_for(log_file))["log_offset"]
+
+def compact(log_file: str) -> int:
+    """
+    Fold the uncompacted log tail into the monthly partitions and return the
+    number of rows moved. Only complete lines are consumed; a line still being
+    appended stays in the tail for next time.
+    """
+    import numpy as np
+    import pandas as pd
+
+    parts_dir = parts_dir_for(log_file)
+    with _compact_lock:
+        os.makedirs(parts_dir, exist_ok=True)
+        manifest = _read_manifest(parts_dir)
+        header, tail, consumed = _read_tail(log_file, manifest["log_offset"])
+        if not consumed:
+            return 0
+        new = _parse_csv(header + tail)
+        if new.empty:
+            manifest["log_offset"] += consumed
+            _write_manifest(parts_dir, manifest)
+            return 0
+
+        superseded = []
+        for month, rows in new.groupby(new["date"].dt.strftime("%Y-%m"), sort=True):
+            if month in manifest["partitions"]:
+                old = manifest["partitions"][month]
+                rows = pd.concat([_read_partition(os.path.join(parts_dir, old), mmap=False), rows],
+                                 ignore_index=True)
+                superseded.append(old)
+            rows = rows.sort_values("date", kind="stable")
+            name = f"{month}.{uuid.uuid4().hex[:8]}"
+            target = os.path.join(parts_dir, name)
+            os.makedirs(target)
+            np.save(os.path.join(target, "name.npy"), rows["name"].to_numpy().astype(str))
+            np.save(os.path.join(target, "date.npy"), rows["date"].to_numpy().astype("datetime64[D]"))
+            for col, dtype in COLUMN_DTYPES.items():
+                np.save(os.path.join(target, f"{col}.npy"), rows[col].to_numpy(dtype=dtype))
+            manifest["partitions"][month] = name
+
+        manifest["log_offset"] += consumed
+        # Readers may still hold the old manifest: delete superseded
+        # partitions only once they have been retired for the grace period.
+        now = time.time()
+        retired = manifest.get("retired", [])
+        expired = [d for d, since in retired if now - since >= RETIRE_GRACE_SECONDS]
+        manifest["retired"] = [[d, since] for d, since in retired if d not in expired] + \
+            [[d, now] for d in superseded]
+        _write_manifest(parts_dir, manifest)
+        for d in expired:
+            shutil.rmtree(os.path.join(parts_dir, d), ignore_errors=True)
+        return len(new)
+
+def compact_in_background(log_file: str, threshold: int = COMPACT_THRESHOLD_BYTES):
+    """Start a compaction thread once the tail exceeds `threshold` bytes (no-op if one is running)."""
+    if uncompacted_bytes(log_file) < threshold or _compact_lock.locked():
+        return None
+    t = threading.Thread(target=compact, args=(log_file,), daemon=True, name="csvstore-compact")
+    t.start()
+    return t
+
+def reset(log_file: str):
+    """Delete the log and every partition."""
+    if os.path.exists(log_file):
+        os.remove(log_file)
+    shutil.rmtree(parts_dir_for(log_file), ignore_errors=True)
+
+# ---------------------------
+# Reads
+# ---------------------------
+def _read_tail(log_file, offset):
+    """(header line, complete lines after `offset`, bytes consumed)."""
+    if not os.path.exists(log_file):
+        return b"", b"", 0
+    with open(log_file, "rb") as f:
+        header = f.readline()
+        f.seek(max(offset, len(header)))
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    skipped_header = max(len(header) - offset, 0)
+    return header, data[:end], (end + skipped_header) if end else skipped_header
+
+def _parse_csv(data: bytes):
+    import pandas as pd
+
+    df = pd.read_csv(io.BytesIO(data), parse_dates=["date"]) if data.strip() else \
+        pd.DataFrame({c: pd.Series(dtype="object") for c in LOG_COLUMNS})
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+def _read_partition(path, mmap=True, start_date=None, end_date=None):
+    """
+    One partition as a frame. Rows are sorted by date, so with bounds only the
+    matching slice of each memory-mapped column is copied out.
+    """
+    import numpy as np
+    import pandas as pd
+
+    mode = "r" if mmap else None
+    cols = {c: np.load(os.path.join(path, f"{c}.npy"), mmap_mode=mode) for c in LOG_COLUMNS}
+    dates = cols["date"]
+    lo = np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date), "D")) if start_date is not None else 0
+    hi = (np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date), "D"), side="right")
+          if end_date is not None else len(dates))
+    df = pd.DataFrame({c: np.array(v[lo:hi]) for c, v in cols.items()})
+    df["date"] = df["date"].astype("datetime64[ns]")
+    return df
+
+def _months(start, end):
+    import pandas as pd
+
+    return {p.strftime("%Y-%m") for p in pd.period_range(start, end, freq="M")}
+
+def load_data(log_file: str, start_date=None, end_date=None):
+    """
+    Entries with start_date <= date <= end_date (either bound optional), from
+    the overlapping monthly partitions plus the uncompacted log tail.
+    """
+    try:
+        return _load(log_file, start_date, end_date)
+    except FileNotFoundError:
+        # A partition outlived its grace period mid-read: the manifest has
+        # moved on, so read again from the current one.
+        return _load(log_file, start_date, end_date)
+
+def _load(log_file, start_date, end_date):
+    import pandas as pd
+
+    parts_dir = parts_dir_for(log_file)
+    manifest = _read_manifest(parts_dir)
+    months = manifest["partitions"]
+    if start_date is not None or end_date is not None:
+        known = sorted(months)
+        lo = pd.Timestamp(start_date) if start_date is not None else pd.Timestamp(known[0] if known else "1970-01")
+        hi = pd.Timestamp(end_date) if end_date is not None else \
+            pd.Period(known[-1] if known else "1970-01", freq="M").end_time
+        wanted = _months(lo, hi) if lo <= hi else set()
+        months = {m: d for m, d in months.items() if m in wanted}
+
+    from pandas.api.types import union_categoricals
+
+    from ecosaver.frames import compact_usage
+
+    # Partitions are already cut to the bounds; only the tail needs a filter.
+    # Names become categoricals frame by frame, so the full-length string
+    # column is never built.
+    frames, names = [], []
+    for _, d in sorted(months.items()):
+        part = _read_partition(os.path.join(parts_dir, d), start_date=start_date, end_date=end_date)
+        names.append(_name_codes(part.pop("name")))
+        frames.append(part)
+    header, tail, _ = _read_tail(log_file, manifest["log_offset"])
+    tail = _parse_csv(header + tail)
+    if start_date is not None:
+        tail = tail[tail["date"] >= pd.Timestamp(start_date)]
+    if end_date is not None:
+        tail = tail[tail["date"] <= pd.Timestamp(end_date)]
+    if not tail.empty:
+        names.append(_name_codes(tail.pop("name")))
+        frames.append(tail)
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return _parse_csv(b"")
+    df = pd.concat(frames, ignore_index=True)
+    df.insert(0, "name", union_categoricals([n for n in names if len(n)]))
+    return compact_usage(df)
+
+def _name_codes(names):
+    """Names as a categorical, stripped and lower-cased once per distinct name."""
+    import numpy as np
+    import pandas as pd
+
+    uniq, inverse = np.unique(names.to_numpy().astype(str), return_inverse=True)
+    remap, normalized = pd.factorize(pd.Index(uniq).str.strip().str.lower())
+    return pd.Categorical.from_codes(remap[inverse], normalized)
+
+def iter_chunks(log_file: str, start_date=None, end_date=None):
+    """
+    The same entries as load_data, as lists of row tuples in LOG_COLUMNS
+    order (dates as 'YYYY-MM-DD' text): one chunk per monthly partition,
+    then the log tail. Only one partition is in memory at a time.
+    """
+    import pandas as pd
+
+    parts_dir = parts_dir_for(log_file)
+    manifest = _read_manifest(parts_dir)
+    frames = (_read_partition(os.path.join(parts_dir, d), start_date=start_date, end_date=end_date)
+              for m, d in sorted(manifest["partitions"].items())
+              if (start_date is None or m >= pd.Timestamp(start_date).strftime("%Y-%m"))
+              and (end_date is None or m <= pd.Timestamp(end_date).strftime("%Y-%m")))
+
+    def tail():
+        header, data, _ = _read_tail(log_file, manifest["log_offset"])
+        df = _parse_csv(header + data)
+        if start_date is not None:
+            df = df[df["date"] >= pd.Timestamp(start_date)]
+        if end_date is not None:
+            df = df[df["date"] <= pd.Timestamp(end_date)]
+        yield df
+
+    from itertools import chain
+    for df in chain(frames, tail()):
+        if df.empty:
+            continue
+        cols = [df["name"].astype(str).str.strip().str.lower(), df["date"].dt.strftime("%Y-%m-%d")]
+        cols += [df[c].tolist() for c in LOG_COLUMNS[2:]]
+        yield list(zip(*cols))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact the EcoSense CSV log into monthly columnar partitions.")
+    parser.add_argument("--log", default=os.path.join("data", "usage.csv"), help="Log file (default: data/usage.csv)")
+    args = parser.parse_args(argv)
+    n = compact(args.log)
+    print(f"Compacted {n} rows from {args.log} into {parts_dir_for(args.log)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
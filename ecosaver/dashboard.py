@@ -0,0 +1,102 @@
+# ecosaver/dashboard.py
+"""
+Headless computations behind each panel of the Streamlit dashboard.
+
+app.py wraps these in its data_version-keyed caches; batch jobs, benchmarks
+and tests call them directly without a Streamlit runtime.
+"""
+from ecosaver.leaderboard import top_k
+from ecosaver.rollups import load_daily_rollup, load_user_summary, window_start
+from ecosaver.scoring import eco_score
+from ecosaver.storage import load_usage_df, get_user_list
+from ecosaver.suggestions import generate_suggestions
+from ecosaver.trend_stats import predict_next
+
+# Only the columns each view reads are fetched from SQLite.
+USER_VIEW_COLUMNS = ("username", "date", "electricity_units", "water_liters", "household_size")
+LEADERBOARD_COLUMNS = ["username", "score", "latest_kWh", "pred"]
+
+
+def user_frame(conn, username):
+    """One user's rows in the default history window, in date order."""
+    return load_usage_df(conn, columns=USER_VIEW_COLUMNS, username=username)
+
+def aggregate_view(conn):
+    """(per-day averages over all users, global next-day estimate), from the daily rollup."""
+    from ecosaver.trends import global_trend_from_daily
+
+    daily = load_daily_rollup(conn)
+    agg = daily[["date", "electricity_units", "water_liters"]]
+    return agg, global_trend_from_daily(daily, "elec_sum")
+
+def cohort_alerts(conn):
+    """Pattern alerts for every user over the default history window, in one pass."""
+    from ecosaver.patterns import detect_alerts
+
+    return detect_alerts(load_usage_df(conn, columns=USER_VIEW_COLUMNS))
+
+def user_prediction(conn, username, global_fallback):
+    """
+    (prediction, used_global_fallback) for the user over the default history
+    window, from the stored trend sums. `global_fallback` is called only when
+    the user has too little history for their own trend.
+    """
+    pred, _ = predict_next(conn, username, since=window_start(conn))
+    if pred is None:
+        return global_fallback(), True
+    return pred, False
+
+def leaderboard_view(conn, k=None):
+    """Precomputed leaderboard rows in compute_leaderboard's columns: the top `k`, or every ranked user."""
+    import pandas as pd
+
+    return pd.DataFrame(top_k(conn, k), columns=LEADERBOARD_COLUMNS)
+
+def meter_view(conn, username, days=7):
+    """
+    [(kind, frame)] for each of the user's interval meters over the last
+    `days` days, one row per bucket at the grain meters.pick_grain chooses.
+    """
+    import time
+
+    from ecosaver import meters
+
+    start = int(time.time()) - days * 86400
+    return [(kind, meters.series(conn, username, kind, start=start))
+            for kind in meters.user_meters(conn, username)]
+
+def forecast_view(conn, username):
+    """
+    (frame, pending): the user's forecast.HORIZONS forecasts, one row per
+    horizon, and the (version, user_ids, fit) to store with
+    forecast.save_params if the stored fit was out of date (else None).
+    """
+    from ecosaver.forecast import forecasts
+
+    frame, pending = forecasts(conn, [username])
+    return frame.reset_index().drop(columns="username"), pending
+
+def whatif_view(df_user):
+    """What-If savings grid for the user's latest day and household size (appliances.whatif_grid)."""
+    from ecosaver.appliances import whatif_grid
+
+    if df_user.empty:
+        return whatif_grid()
+    return whatif_grid(float(df_user["electricity_units"].iloc[-1]), int(df_user["water_liters"].iloc[-1]),
+                       int(df_user["household_size"].iloc[-1]))
+
+def quick_stats(conn):
+    """[(username, records, avg kWh, avg water L)] over the default history window."""
+    return load_user_summary(conn)
+
+def dashboard_pass(conn, username):
+    """Everything one uncached dashboard rerun computes, for one user plus the shared panels."""
+    users = get_user_list(conn)
+    agg, pred_global = aggregate_view(conn)
+    df_user = user_frame(conn, username)
+    pred, _ = user_prediction(conn, username, lambda: pred_global)
+    latest = df_user.iloc[-1]
+    score = eco_score(latest["electricity_units"], pred)
+    tips = generate_suggestions(latest["electricity_units"], pred, df_user)
+    lb = leaderboard_view(conn)
+    return users, agg, score, tips, lb, quick_stats(conn)
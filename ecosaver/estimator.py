@@ -0,0 +1,347 @@
+# ecosaver/estimator.py
+"""
+LLM-backed estimation of daily usage from free-text activity logs.
+
+`Estimator` wraps a backend (anything with `generate(prompt) -> str`, or an
+async `agenerate`) with:
+  - text normalisation and a TTL + LRU cache of parsed results,
+  - asyncio fan-out under a concurrency limit, with per-call timeouts and
+    retries with exponential backoff,
+  - batch calls that send each distinct activity text only once.
+
+`GeminiBackend` talks to Google Gemini; `StubBackend` is an offline,
+deterministic keyword parser for tests and throughput runs.
+
+Usage:  python -m ecosaver.estimator --stub "2 ACs for 4 hours" "fan and 3 lights"
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# The appliance rates are re-exported for callers that imported them from here.
+from ecosaver.appliances import (  # noqa: F401
+    AC_KWH, HEATER_KWH, MICROWAVE_KWH, INDUCTION_STOVE_KWH, FAN_KWH, LIGHT_KWH, PUMP_KWH,
+    WATER_PUMP_LPH, AMBIENT_HOURS, BASE_WATER_PER_PERSON, daily_usage,
+)
+
+# Keys requested by `build_prompt`; missing or unparsable values become 0.
+ESTIMATE_KEYS = [
+    "num_acs", "duration_ac_hours", "num_heaters", "duration_heater_hours",
+    "duration_microwave_hours", "duration_induction_stove_hours",
+    "duration_water_pump_motors", "num_fans", "num_lights",
+]
+
+
+class EstimationError(Exception):
+    """The backend failed, timed out or returned unparsable output after all retries."""
+
+
+# ---------------------------
+# Prompt, parsing and usage maths
+# ---------------------------
+def build_prompt(text: str) -> str:
+    keys = ",\n".join(f'    "{k}": <value>' for k in ESTIMATE_KEYS)
+    return f"""
+    You are an expert data extractor. From the user's input describing their daily activities, extract the following data.
+
+    If the unit is not explicitly hours but duration is given (e.g., "30 minutes"), convert it to hours.
+    If you can't obtain data for any of the keys, fill in 0 for that value.
+
+    Provide the output in a single JSON object (with no other text, commentary, or markdown blocks) using only these keys:
+
+    {{
+{keys}
+    }}
+
+    The user input is: "{text}"
+    """
+
+def normalize_activity(text: str) -> str:
+    """Cache key for an activity log: lower case, single spaces, no trailing punctuation."""
+    return re.sub(r"\s+", " ", str(text)).strip().strip(".!").lower()
+
+def parse_response(raw: str, keys=None) -> dict:
+    """
+    Parse a model reply into {key: float}. Markdown fences are stripped; the
+    reply is read with json.loads, never eval. With `keys`, exactly those keys
+    are returned and missing or non-numeric values become 0.
+    """
+    body = raw.strip()
+    if body.startswith("```"):
+        body = body.strip("`")
+        if body.lower().startswith("json"):
+            body = body[4:]
+    data = json.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+
+    def num(v):
+        try:
+            return float(v)
+        except (TypeError, ValueError):
+            return 0.0
+
+    if keys is None:
+        return {k: num(v) for k, v in data.items()}
+    return {k: num(data.get(k, 0)) for k in keys}
+
+def usage_from_estimate(data: dict, hh_size: int = 1):
+    """(electricity kWh, water L) for one day from a parsed estimate."""
+    elec, water, _ = daily_usage([data], hh_size)
+    return float(elec[0]), int(water[0])
+
+# ---------------------------
+# Cache
+# ---------------------------
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire `ttl` seconds after insertion."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= self._clock():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+# ---------------------------
+# Backends
+# ---------------------------
+class GeminiBackend:
+    """google.generativeai model; pass an existing GenerativeModel or a model name."""
+
+    def __init__(self, model="gemini-2.5-flash", api_key=None, json_mode=True):
+        if isinstance(model, str):
+            import google.generativeai as genai
+
+            api_key = api_key or os.environ.get("GOOGLE_API_KEY")
+            if api_key:
+                genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(model)
+        self.model = model
+        self.generation_config = {"response_mime_type": "application/json"} if json_mode else None
+
+    def generate(self, prompt: str) -> str:
+        return self.model.generate_content(prompt, generation_config=self.generation_config).text
+
+
+class StubBackend:
+    """
+    Offline backend: pulls counts and durations out of the user text in the
+    prompt with regular expressions. Same text, same answer; `latency` adds
+    an artificial delay to model network round trips.
+    """
+    _NUM = r"(\d+(?:\.\d+)?|an?|one|two|three|four|five|six)"
+    _WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6}
+    _APPLIANCES = {
+        "ac": r"acs?|air ?conditioners?",
+        "heater": r"heaters?",
+        "microwave": r"microwaves?",
+        "induction": r"induction(?: stoves?)?",
+        "pump": r"(?:water )?pumps?(?: motors?)?|motors?",
+        "fan": r"fans?",
+        "light": r"lights?|bulbs?",
+    }
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def _number(self, token):
+        return float(self._WORDS.get(token, token)) if token else 0.0
+
+    def _extract(self, text):
+        text = text.lower()
+        found = {}
+        for name, pat in self._APPLIANCES.items():
+            m = re.search(rf"(?:{self._NUM}\s+)?(?:{pat})\b(?:\D{{0,25}}?{self._NUM}\s*(hours?|hrs?|h|minutes?|mins?))?", text)
+            if not m:
+                continue
+            count = self._number(m.group(1)) or 1.0
+            hours = self._number(m.group(2))
+            if m.group(3) and m.group(3).startswith("m"):
+                hours /= 60
+            found[name] = (count, hours)
+        return found
+
+    def generate(self, prompt: str) -> str:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        m = re.search(r'The user input is: "(.*)"', prompt, re.S)
+        f = self._extract(m.group(1) if m else prompt)
+        get = lambda k, i: f.get(k, (0.0, 0.0))[i]
+        return json.dumps({
+            "num_acs": get("ac", 0), "duration_ac_hours": get("ac", 1),
+            "num_heaters": get("heater", 0), "duration_heater_hours": get("heater", 1),
+            "duration_microwave_hours": get("microwave", 1),
+            "duration_induction_stove_hours": get("induction", 1),
+            "duration_water_pump_motors": get("pump", 1),
+            "num_fans": get("fan", 0), "num_lights": get("light", 0),
+        })
+
+# ---------------------------
+# Estimator
+# ---------------------------
+class Estimator:
+    """
+    Cached, concurrent activity-log estimator.
+
+    `prompt` builds the model prompt from the activity text and `keys` fixes
+    the parsed fields (None keeps whatever numeric keys the model returns).
+    """
+
+    def __init__(self, backend, prompt=build_prompt, keys=ESTIMATE_KEYS, cache=None,
+                 max_concurrency: int = 8, timeout: float = 30.0, retries: int = 2,
+                 backoff: float = 0.5):
+        self.backend = backend
+        self.prompt = prompt
+        self.keys = keys
+        self.cache = cache if cache is not None else TTLCache()
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+    async def _call(self, text: str) -> dict:
+        prompt = self.prompt(text)
+        last = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                if hasattr(self.backend, "agenerate"):
+                    raw = await asyncio.wait_for(self.backend.agenerate(prompt), self.timeout)
+                else:
+                    raw = await asyncio.wait_for(asyncio.to_thread(self.backend.generate, prompt), self.timeout)
+                return parse_response(raw, self.keys)
+            except Exception as e:  # backend, timeout and parse errors are all retried
+                last = e
+        raise EstimationError(f"estimate failed after {self.retries + 1} attempts: {last!r}") from last
+
+    async def aestimate_many(self, texts, return_exceptions: bool = False):
+        """
+        Estimate every text concurrently; results come back in input order.
+        Texts that normalise to the same key share one backend call. With
+        `return_exceptions`, failures are returned in place as EstimationError.
+        """
+        keys = [normalize_activity(t) for t in texts]
+        results = {}
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key in results or key in pending:
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                pending[key] = text
+
+        sem = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(key, text):
+            async with sem:
+                try:
+                    value = await self._call(text)
+                except EstimationError as e:
+                    results[key] = e
+                    return
+            self.cache.set(key, value)
+            results[key] = value
+
+        await asyncio.gather(*(run(k, t) for k, t in pending.items()))
+        out = []
+        for key in keys:
+            value = results[key]
+            if isinstance(value, EstimationError):
+                if not return_exceptions:
+                    raise value
+                out.append(value)
+            else:
+                out.append(dict(value))
+        return out
+
+    async def aestimate(self, text: str) -> dict:
+        return (await self.aestimate_many([text]))[0]
+
+    def estimate_many(self, texts, return_exceptions: bool = False):
+        """Blocking wrapper around aestimate_many, for scripts and Streamlit handlers."""
+        return asyncio.run(self.aestimate_many(list(texts), return_exceptions))
+
+    def estimate(self, text: str) -> dict:
+        return self.estimate_many([text])[0]
+
+
+def estimate_and_add_usage(conn, estimator, entries) -> int:
+    """
+    Estimate a batch of (username, date, activity_text, hh_size) logs, such as
+    a day's entries for a whole class, and write them with one add_usage_bulk
+    transaction. Raises EstimationError if any entry fails; nothing is written.
+    """
+    from ecosaver.storage import add_usage_bulk
+
+    entries = list(entries)
+    estimates = estimator.estimate_many([text for _, _, text, _ in entries])
+    hh_sizes = [hh_size for *_, hh_size in entries]
+    elec, water, _ = daily_usage(estimates, hh_sizes)  # one vectorized pass over the batch
+    return add_usage_bulk(conn, [(username, day, e, w, hh_size) for (username, day, _, hh_size), e, w
+                                 in zip(entries, elec.tolist(), water.tolist())])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate daily usage from activity descriptions.")
+    parser.add_argument("texts", nargs="+", help="Activity descriptions")
+    parser.add_argument("--stub", action="store_true", help="Use the offline stub backend")
+    parser.add_argument("--model", default="gemini-2.5-flash")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--household-size", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    backend = StubBackend() if args.stub else GeminiBackend(args.model)
+    estimator = Estimator(backend, max_concurrency=args.concurrency)
+    t0 = time.perf_counter()
+    results = estimator.estimate_many(args.texts, return_exceptions=True)
+    for text, est in zip(args.texts, results):
+        if isinstance(est, EstimationError):
+            print(f"{text!r}: error: {est}")
+            continue
+        elec, water = usage_from_estimate(est, args.household_size)
+        print(f"{text!r}: {elec:.2f} kWh, {water} L")
+    print(f"{len(args.texts)} estimates in {time.perf_counter() - t0:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
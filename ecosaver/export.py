@@ -0,0 +1,190 @@
+# ecosaver/export.py
+"""
+Streaming export of usage rows to CSV, JSON lines or Parquet.
+
+Rows are fetched from SQLite in chunks of `chunk_size` (cursor.fetchmany)
+and each chunk is written and dropped before the next is read, so memory is
+bounded by one chunk whatever the size of the history. Chunks stay plain
+tuples; pandas is not involved. Exports are produced only when asked for:
+nothing here runs during a dashboard rerun.
+
+Parquet needs pyarrow, which is imported only for that format.
+
+Usage:
+    python -m ecosaver.export --out usage.csv [--format csv|jsonl|parquet]
+        [--source home school] [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--user NAME]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+from ecosaver.config import DATA_SOURCES, DEFAULT_SOURCE
+from ecosaver.perf import timed
+from ecosaver.storage import to_date_str
+
+FORMATS = ("csv", "jsonl", "parquet")
+EXPORT_COLUMNS = ["username", "date", "electricity_units", "water_liters", "household_size"]
+CHUNK_ROWS = 50_000
+
+
+def format_for(path: str) -> str:
+    """Export format implied by a file name (default: csv)."""
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    return {"json": "jsonl", "ndjson": "jsonl", "pq": "parquet"}.get(ext, ext if ext in FORMATS else "csv")
+
+# ---------------------------
+# Sources
+# ---------------------------
+def iter_usage_chunks(conn, start_date=None, end_date=None, username=None, chunk_size: int = CHUNK_ROWS):
+    """
+    Usage rows as tuples in EXPORT_COLUMNS order (dates as 'YYYY-MM-DD'
+    text), over the whole history unless bounded, in (date, id) order, as
+    lists of at most `chunk_size` rows.
+    """
+    where, params = [], []
+    if start_date:
+        where.append("u.date >= ?")
+        params.append(to_date_str(start_date))
+    if end_date:
+        where.append("u.date <= ?")
+        params.append(to_date_str(end_date))
+    if username:
+        where.append("us.username = ?")
+        params.append(username.strip().lower())
+    q = ("SELECT us.username, u.date, u.electricity_units, u.water_liters, u.household_size "
+         "FROM usage u JOIN users us ON u.user_id = us.id")
+    if where:
+        q += " WHERE " + " AND ".join(where)
+    q += " ORDER BY u.date, u.id"
+    cur = conn.execute(q, params)
+    try:
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cur.close()
+
+# ---------------------------
+# Writers
+# ---------------------------
+def _write_csv(columns, chunks, f):
+    text = io.TextIOWrapper(f, encoding="utf-8", newline="", write_through=True)
+    try:
+        writer = csv.writer(text, lineterminator="\n")
+        writer.writerow(columns)
+        rows = 0
+        for chunk in chunks:
+            writer.writerows(chunk)
+            rows += len(chunk)
+        return rows
+    finally:
+        text.detach()  # leave the caller's file open
+
+def _write_jsonl(columns, chunks, f):
+    rows = 0
+    for chunk in chunks:
+        f.write("".join(json.dumps(dict(zip(columns, row))) + "\n" for row in chunk).encode("utf-8"))
+        rows += len(chunk)
+    return rows
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow: pip install pyarrow") from None
+    return pa, pq
+
+def _write_parquet(columns, chunks, f):
+    pa, pq = _pyarrow()
+
+    rows, writer = 0, None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pydict({c: list(v) for c, v in zip(columns, zip(*chunk))}
+                                         if chunk else {c: [] for c in columns})
+            if writer is None:
+                writer = pq.ParquetWriter(f, table.schema)
+            writer.write_table(table.cast(writer.schema))  # one row group per chunk
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+_WRITERS = {"csv": _write_csv, "jsonl": _write_jsonl, "parquet": _write_parquet}
+
+def write_chunks(columns, chunks, out, fmt: str = "csv") -> int:
+    """
+    Write an iterable of row chunks (lists of tuples in `columns` order) to
+    `out` (a path or a binary file object) in `fmt`, one chunk at a time.
+    Returns the number of rows written.
+    """
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {list(FORMATS)}")
+    if fmt == "parquet":
+        _pyarrow()  # fail before creating the output file
+    if isinstance(out, (str, os.PathLike)):
+        with open(out, "wb") as f:
+            return _WRITERS[fmt](list(columns), chunks, f)
+    return _WRITERS[fmt](list(columns), chunks, out)
+
+@timed()
+def export_usage(out, fmt: str = "csv", sources=None, start_date=None, end_date=None,
+                 username=None, chunk_size: int = CHUNK_ROWS) -> int:
+    """
+    Stream usage rows from each of `sources` (default: the default source)
+    to `out`. With more than one source a `source` column is added.
+    Returns the number of rows written.
+    """
+    from ecosaver.sources import get_source_conn
+
+    sources = list(sources or [DEFAULT_SOURCE])
+    tagged = len(sources) > 1
+
+    def chunks():
+        for source in sources:
+            conn = get_source_conn(source)
+            try:
+                for chunk in iter_usage_chunks(conn, start_date, end_date, username, chunk_size):
+                    yield [(source,) + row for row in chunk] if tagged else chunk
+            finally:
+                conn.close()
+
+    columns = (["source"] if tagged else []) + EXPORT_COLUMNS
+    return write_chunks(columns, chunks(), out, fmt)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export EcoSaver usage rows without loading them all into memory.")
+    parser.add_argument("--out", required=True, help="Output file ('-' for stdout)")
+    parser.add_argument("--format", choices=FORMATS, help="Default: from the --out extension, else csv")
+    parser.add_argument("--source", nargs="+", choices=list(DATA_SOURCES), default=[DEFAULT_SOURCE])
+    parser.add_argument("--start", help="First day (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last day (YYYY-MM-DD)")
+    parser.add_argument("--user", help="Only this username")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or format_for(args.out)
+    out = sys.stdout.buffer if args.out == "-" else args.out
+    try:
+        n = export_usage(out, fmt, args.source, args.start, args.end, args.user, args.chunk_size)
+    except ImportError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    except BrokenPipeError:  # e.g. piped into `head`
+        sys.stderr.close()
+        return 0
+    if args.out != "-":
+        print(f"Exported {n} rows to {args.out} ({fmt})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
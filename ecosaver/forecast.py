@@ -0,0 +1,361 @@
+# ecosaver/forecast.py
+"""
+Multi-horizon usage forecasts with prediction intervals, fitted for every
+user in one batched solve.
+
+Each user's last FORECAST_HISTORY_DAYS of readings are fitted by least squares to
+
+    kWh = b0 + b1·x + Σ c_d·[weekday = d]      (x in days; Monday is the base day)
+
+Users with fewer than SEASONAL_MIN_ROWS readings get the trend line only,
+and users with fewer than MIN_ROWS get no fit (NaN forecasts). The normal
+equations of all users are accumulated with one bincount per term and solved
+with a single stacked pseudo-inverse, which also gives each fit's coefficient
+covariance. A forecast is then a dot product and its interval a quadratic
+form. `predict` reports, for each horizon in HORIZONS, the value on day h
+after the last reading and the total over days 1..h (for budgets), each with
+a Student-t prediction interval.
+
+Fitted parameters are stored per user in `forecast_params`, stamped with the
+data_version they were fitted at. Every usage write records in
+`usage_changes` the data_version at which each touched user's readings
+changed (storage.mark_users_changed), so a stored fit is reused until that
+user gets new readings.
+
+`fit_groups` and `predict` need only arrays; trends.fit_linear_trend and
+trends.global_trend_predict are wrappers over them.
+
+Usage:  python -m ecosaver.forecast [--db data/techforge_eco.db] [--user asha] [--refresh]
+"""
+import argparse
+import sys
+import time
+
+from ecosaver.config import DB_FILE
+from ecosaver.perf import timed
+
+HORIZONS = (1, 7, 30)
+FORECAST_HISTORY_DAYS = 90
+MIN_ROWS = 3
+SEASONAL_MIN_ROWS = 14
+INTERVAL_LEVEL = 0.95
+# Coefficients: intercept, slope, then Tuesday..Sunday offsets from Monday.
+N_PARAMS = 8
+FORECAST_COLUMNS = ["date", "pred", "lower", "upper", "total", "total_lower", "total_upper"]
+
+# Stay well under SQLite's bound-parameter limit.
+_MAX_PARAMS = 500
+
+
+# ---------------------------
+# Batched least squares
+# ---------------------------
+def _weekday(days):
+    """Monday = 0 for day numbers counted from 1970-01-01 (a Thursday)."""
+    return (days + 3) % 7
+
+def _design(x, weekday, seasonal):
+    """(rows x N_PARAMS) design matrix; weekday columns are zero where not `seasonal`."""
+    import numpy as np
+
+    X = np.zeros((len(x), N_PARAMS))
+    X[:, 0] = 1.0
+    X[:, 1] = x
+    rows = np.flatnonzero(seasonal & (weekday > 0))
+    X[rows, 1 + weekday[rows]] = 1.0
+    return X
+
+def fit_groups(codes, days, y, n_groups, seasonal=True):
+    """
+    Fit every group at once. `codes` (0..n_groups-1) assigns each row to a
+    group, `days` are integer day numbers and `y` the values. Returns a dict
+    of per-group arrays: n, dof, sigma2 (residual variance), x_mean,
+    last_day, beta (n_groups x N_PARAMS) and cov, the pseudo-inverse of the
+    centred normal matrix (sigma2 * cov is the coefficient covariance).
+    x is measured from each group's last day and centred on its mean, which
+    keeps the normal equations well conditioned for long histories.
+    """
+    import numpy as np
+
+    codes = np.asarray(codes, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    y = np.asarray(y, dtype=float)
+    n = np.bincount(codes, minlength=n_groups)
+    last_day = np.full(n_groups, np.iinfo(np.int64).min)
+    np.maximum.at(last_day, codes, days)
+    x = (days - last_day[codes]).astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = np.bincount(codes, weights=x, minlength=n_groups) / n
+    seasonal_group = np.asarray(seasonal) & (n >= SEASONAL_MIN_ROWS)
+    X = _design(x - x_mean[codes], _weekday(days), np.broadcast_to(seasonal_group, n_groups)[codes])
+
+    # Weekday columns are all zero when no group is seasonal; skip their sums.
+    cols = N_PARAMS if seasonal_group.any() else 2
+    xtx = np.zeros((n_groups, N_PARAMS, N_PARAMS))
+    xty = np.zeros((n_groups, N_PARAMS))
+    for i in range(cols):
+        xty[:, i] = np.bincount(codes, weights=X[:, i] * y, minlength=n_groups)
+        for j in range(i, cols):
+            xtx[:, i, j] = xtx[:, j, i] = np.bincount(codes, weights=X[:, i] * X[:, j], minlength=n_groups)
+    cov = np.linalg.pinv(xtx, hermitian=True)
+    beta = np.einsum("gij,gj->gi", cov, xty)
+    resid = y - np.einsum("ri,ri->r", X, beta[codes])
+    sse = np.bincount(codes, weights=resid * resid, minlength=n_groups)
+    dof = n - np.linalg.matrix_rank(xtx, hermitian=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sigma2 = np.where(dof > 0, sse / np.maximum(dof, 1), np.nan)
+
+    short = n < MIN_ROWS
+    beta[short] = np.nan
+    sigma2[short] = np.nan
+    return {"n": n, "dof": dof, "sigma2": sigma2, "x_mean": x_mean,
+            "last_day": last_day, "beta": beta, "cov": cov}
+
+def _horizon_row(fit, k):
+    """
+    Design rows (groups x N_PARAMS) for day k after each group's last day.
+    Trend-only fits have zero weekday coefficients and covariance, so the
+    weekday column set here adds nothing to them.
+    """
+    import numpy as np
+
+    g = len(fit["n"])
+    return _design(np.full(g, float(k)) - fit["x_mean"], _weekday(fit["last_day"] + k), np.ones(g, dtype=bool))
+
+@timed()
+def predict(fit, horizons=HORIZONS, level=INTERVAL_LEVEL):
+    """
+    {field: (groups x len(horizons)) array} from a fit_groups result: day
+    (day number of the target date), pred/lower/upper for that day and
+    total/total_lower/total_upper summed over days 1..h. Intervals are NaN
+    where the fit has no residual degrees of freedom.
+    """
+    import numpy as np
+
+    # scipy.special loads in a fraction of scipy.stats' import time.
+    from scipy.special import stdtrit
+
+    horizons = sorted(set(horizons))
+    beta, cov, sigma2 = fit["beta"], fit["cov"], fit["sigma2"]
+    with np.errstate(invalid="ignore"):
+        q = stdtrit(np.where(fit["dof"] > 0, fit["dof"], np.nan), 0.5 + level / 2)
+    out = {f: [] for f in ("day", "pred", "lower", "upper", "total", "total_lower", "total_upper")}
+    cum = np.zeros_like(beta)
+    k = 0
+    for h in horizons:
+        while k < h:
+            k += 1
+            row = _horizon_row(fit, k)
+            cum += row
+        pred = np.einsum("gi,gi->g", row, beta)
+        total = np.einsum("gi,gi->g", cum, beta)
+        half = q * np.sqrt(sigma2 * (1 + np.einsum("gi,gij,gj->g", row, cov, row)))
+        total_half = q * np.sqrt(sigma2 * (h + np.einsum("gi,gij,gj->g", cum, cov, cum)))
+        out["day"].append(fit["last_day"] + h)
+        out["pred"].append(pred)
+        out["lower"].append(pred - half)
+        out["upper"].append(pred + half)
+        out["total"].append(total)
+        out["total_lower"].append(total - total_half)
+        out["total_upper"].append(total + total_half)
+    return {f: np.column_stack(v) for f, v in out.items()}
+
+def next_day(fit):
+    """Point forecast for the day after each group's last day (no intervals)."""
+    import numpy as np
+
+    return np.einsum("gi,gi->g", _horizon_row(fit, 1), fit["beta"])
+
+def forecast_frame(fit, names, horizons=HORIZONS, level=INTERVAL_LEVEL):
+    """predict() as a frame indexed by (username, horizon) with FORECAST_COLUMNS."""
+    import numpy as np
+    import pandas as pd
+
+    horizons = sorted(set(horizons))
+    out = predict(fit, horizons, level)
+    g, hn = out["pred"].shape
+    frame = pd.DataFrame({
+        "username": np.repeat(np.asarray(names, dtype=object), hn),
+        "horizon": np.tile(np.asarray(horizons, dtype=np.int16), g),
+        "date": out["day"].ravel().astype("datetime64[D]").astype("datetime64[ns]"),
+        **{f: out[f].ravel() for f in FORECAST_COLUMNS[1:]},
+    })
+    return frame.set_index(["username", "horizon"])
+
+# ---------------------------
+# Stored parameters
+# ---------------------------
+def _pack(fit, i):
+    import numpy as np
+
+    return np.concatenate([fit["beta"][i], fit["cov"][i].ravel()]).astype("<f8").tobytes()
+
+def _unpack(rows):
+    """fit dict from forecast_params rows (n, dof, sigma2, x_mean, last_date, params)."""
+    import numpy as np
+
+    if not rows:
+        return _empty_fit()
+    n, dof, sigma2, x_mean, last_date, blobs = zip(*rows)
+    params = np.frombuffer(b"".join(blobs), dtype="<f8").reshape(len(rows), N_PARAMS * (N_PARAMS + 1))
+    return {"n": np.array(n), "dof": np.array(dof),
+            "sigma2": np.array(sigma2, dtype=float), "x_mean": np.array(x_mean, dtype=float),
+            "last_day": np.array(last_date, dtype="datetime64[D]").astype(np.int64),
+            "beta": params[:, :N_PARAMS].copy(),
+            "cov": params[:, N_PARAMS:].reshape(-1, N_PARAMS, N_PARAMS).copy()}
+
+def _empty_fit():
+    import numpy as np
+
+    return {"n": np.zeros(0, int), "dof": np.zeros(0, int), "sigma2": np.zeros(0), "x_mean": np.zeros(0),
+            "last_day": np.zeros(0, np.int64), "beta": np.zeros((0, N_PARAMS)),
+            "cov": np.zeros((0, N_PARAMS, N_PARAMS))}
+
+def _concat(a, b):
+    import numpy as np
+
+    return {k: np.concatenate([a[k], b[k]]) for k in a}
+
+def _take(fit, idx):
+    return {k: v[idx] for k, v in fit.items()}
+
+def _chunks(ids):
+    for i in range(0, len(ids), _MAX_PARAMS):
+        chunk = ids[i:i + _MAX_PARAMS]
+        yield chunk, ",".join("?" * len(chunk))
+
+def _users(conn, usernames):
+    """[(user_id, username)] of `usernames` (default: all) that have readings."""
+    q = ("SELECT id, username FROM users us WHERE EXISTS (SELECT 1 FROM usage WHERE user_id = us.id)")
+    if usernames is None:
+        return conn.execute(q + " ORDER BY username").fetchall()
+    names = sorted({u.strip().lower() for u in usernames})
+    rows = []
+    for chunk, marks in _chunks(names):
+        rows += conn.execute(q + f" AND username IN ({marks})", chunk).fetchall()
+    return sorted(rows, key=lambda r: r[1])
+
+def _current(conn, user_ids):
+    """{user_id: forecast_params row} for fits newer than the user's last change."""
+    out = {}
+    for chunk, marks in _chunks(user_ids):
+        for uid, *row in conn.execute(f"""
+            SELECT fp.user_id, fp.n, fp.dof, fp.sigma2, fp.x_mean, fp.last_date, fp.params
+            FROM forecast_params fp LEFT JOIN usage_changes c ON c.user_id = fp.user_id
+            WHERE fp.user_id IN ({marks}) AND fp.fit_version > COALESCE(c.version, -1)
+        """, chunk):
+            out[uid] = tuple(row)
+    return out
+
+_WINDOW_SQL = """
+    SELECT u.user_id, u.date, u.electricity_units
+    FROM (SELECT user_id, date(MAX(date), ?) AS since FROM usage {where} GROUP BY user_id) w
+    JOIN usage u ON u.user_id = w.user_id AND u.date >= w.since
+"""
+
+def fit_users(conn, user_ids):
+    """fit_groups over the last FORECAST_HISTORY_DAYS of each user's readings, in `user_ids` order."""
+    import numpy as np
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return _empty_fit()
+    lut = np.full(max(user_ids) + 1, -1, dtype=np.int64)
+    lut[user_ids] = np.arange(len(user_ids))
+    since = f"-{FORECAST_HISTORY_DAYS - 1} days"
+    # Per-user MAX(date) and each window are idx_usage_user_date range scans.
+    # Large sets read every user's window once instead of in IN (...) chunks.
+    if len(user_ids) > _MAX_PARAMS:
+        batches = [conn.execute(_WINDOW_SQL.format(where=""), [since]).fetchall()]
+    else:
+        batches = [conn.execute(_WINDOW_SQL.format(where=f"WHERE user_id IN ({marks})"), [since] + chunk).fetchall()
+                   for chunk, marks in _chunks(user_ids)]
+    rows = [r for batch in batches for r in batch]
+    if not rows:
+        return _empty_fit()
+    uid, d, v = zip(*rows)
+    uid = np.array(uid, dtype=np.int64)
+    codes = np.where(uid < len(lut), lut[np.minimum(uid, len(lut) - 1)], -1)
+    keep = codes >= 0
+    days = np.array(d, dtype="datetime64[D]").astype(np.int64)
+    return fit_groups(codes[keep], days[keep], np.array(v, dtype=float)[keep], len(user_ids))
+
+def save_params(conn, version, user_ids, fit):
+    """Store fitted parameters stamped with `version`, in the caller's transaction."""
+    import numpy as np
+
+    last = fit["last_day"].astype("datetime64[D]").astype(str)
+    conn.executemany("""
+        INSERT OR REPLACE INTO forecast_params
+            (user_id, fit_version, last_date, n, dof, sigma2, x_mean, params)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(int(uid), int(version), last[i], int(fit["n"][i]), int(fit["dof"][i]),
+           None if np.isnan(fit["sigma2"][i]) else float(fit["sigma2"][i]),
+           float(fit["x_mean"][i]), _pack(fit, i))
+          for i, uid in enumerate(user_ids)])
+
+@timed()
+def forecasts(conn, usernames=None, horizons=HORIZONS, level=INTERVAL_LEVEL):
+    """
+    (forecast_frame for `usernames` (default: every user with readings),
+    pending). Current stored fits are reused; the other users are fitted
+    together in one batched solve and returned as `pending`, a
+    (version, user_ids, fit) tuple for save_params, or None if nothing was
+    refitted. Storing is left to the caller so read-only connections work.
+    """
+    import numpy as np
+
+    from ecosaver.storage import get_data_version
+
+    # The version is read before the rows: a write in between leaves the
+    # saved fit older than the change, so it is refitted next time.
+    version = get_data_version(conn)
+    users = _users(conn, usernames)
+    ids = [uid for uid, _ in users]
+    stored = _current(conn, ids)
+    stale = [uid for uid in ids if uid not in stored]
+    fresh = fit_users(conn, stale)
+    fit = _concat(_unpack([stored[uid] for uid in ids if uid in stored]), fresh)
+    pos = {uid: i for i, uid in enumerate([uid for uid in ids if uid in stored] + stale)}
+    fit = _take(fit, np.array([pos[uid] for uid in ids], dtype=np.int64))
+    frame = forecast_frame(fit, [name for _, name in users], horizons, level)
+    return frame, ((version, stale, fresh) if stale else None)
+
+def refresh_forecasts(conn, usernames=None) -> int:
+    """Refit and store every user without a current fit; returns the number refitted."""
+    with conn:
+        _, pending = forecasts(conn, usernames, horizons=(1,))
+        if pending:
+            save_params(conn, *pending)
+    return len(pending[1]) if pending else 0
+
+
+def main(argv=None):
+    import pandas as pd
+
+    from ecosaver.storage import get_conn
+
+    parser = argparse.ArgumentParser(description="Print EcoSaver usage forecasts with prediction intervals.")
+    parser.add_argument("--db", default=DB_FILE, help=f"SQLite file (default: {DB_FILE})")
+    parser.add_argument("--user", action="append", help="Username (repeatable; default: all users)")
+    parser.add_argument("--refresh", action="store_true", help="Store refitted parameters")
+    args = parser.parse_args(argv)
+
+    conn = get_conn(args.db)
+    try:
+        t0 = time.perf_counter()
+        if args.refresh:
+            n = refresh_forecasts(conn, args.user)
+            print(f"Refitted {n} users in {time.perf_counter() - t0:.2f}s")
+        frame, pending = forecasts(conn, args.user)
+        if pending:
+            print(f"{len(pending[1])} users fitted on the fly (use --refresh to store them)")
+        with pd.option_context("display.max_rows", 60, "display.max_columns", None, "display.width", 160):
+            print(frame.round({c: 2 for c in FORECAST_COLUMNS[1:]}))
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+# ecosaver/frames.py
+"""
+Compact usage frames and a per-user row index.
+
+`compact_usage` (and `frame_from_rows`, which builds such a frame straight
+from SQLite rows) stores user names as categoricals (one small integer code
+per row plus one string per user) and the integer columns in narrow dtypes.
+Electricity stays float64 so trends and scores match the SQL-side sums
+exactly.
+
+`index_by_user` sorts a frame once by (user, date) and maps every user to the
+contiguous row range holding their rows, so per-user slices are O(1) views
+and a pass over all users is O(rows) in total instead of one full scan per
+user.
+"""
+import numpy as np
+import pandas as pd
+
+USER_COLUMNS = ("username", "name")
+NARROW_DTYPES = {"user_id": "int32", "water_liters": "int32", "household_size": "int16"}
+ROW_DTYPES = {"usage_id": "int64", "date": "datetime64[ns]", "electricity_units": "float64",
+              **NARROW_DTYPES}
+
+
+def frame_from_rows(rows, columns):
+    """
+    A compact frame built column by column from database row tuples, with
+    no intermediate object-dtype frame. Dates must be 'YYYY-MM-DD' text.
+    """
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    data = {}
+    for col, vals in zip(columns, values):
+        if col in USER_COLUMNS:
+            data[col] = pd.Categorical(vals)
+        elif col == "date":
+            data[col] = np.array(vals, dtype="datetime64[D]").astype(ROW_DTYPES[col])
+        else:
+            data[col] = np.array(vals, dtype=ROW_DTYPES.get(col))
+    return pd.DataFrame(data, columns=list(columns))
+
+def compact_usage(df):
+    """`df` with categorical user names and narrow integer columns (one astype pass)."""
+    dtypes = {c: "category" for c in USER_COLUMNS
+              if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype)}
+    # Only integer columns narrow; a float column here holds NaNs and stays as is.
+    dtypes.update({c: t for c, t in NARROW_DTYPES.items()
+                   if c in df.columns and df[c].dtype.kind in "iu" and df[c].dtype != t})
+    return df.astype(dtypes) if dtypes else df
+
+def index_by_user(df, by="username"):
+    """
+    (frame sorted by (`by`, date), {user: (start, stop)}). Users map in name
+    order; rows keep date order within each user.
+    """
+    if df.empty:
+        return df, {}
+    col = df[by]
+    codes, names = (col.cat.codes.to_numpy(), col.cat.categories) if isinstance(col.dtype, pd.CategoricalDtype) \
+        else pd.factorize(col, sort=True)
+    if "date" in df.columns:
+        order = np.lexsort((df["date"].to_numpy(), codes))
+    else:
+        order = np.argsort(codes, kind="stable")
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    stops = np.r_[starts[1:], len(codes)]
+    ranges = {names[codes[s]]: (int(s), int(e)) for s, e in zip(starts, stops)}
+    return df.iloc[order].reset_index(drop=True), dict(sorted(ranges.items()))
+
+def user_rows(df_sorted, ranges, user):
+    """`user`'s rows of an index_by_user frame (empty if the user has none)."""
+    start, stop = ranges.get(user, (0, 0))
+    return df_sorted.iloc[start:stop]
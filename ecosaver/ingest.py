@@ -0,0 +1,82 @@
+# ecosaver/ingest.py
+"""
+Bulk import of daily usage readings from CSV or JSON-lines files.
+
+Accepted columns/keys: username (or `name`, as in the data/usage.csv files
+written by techforge_ecosaver), date, electricity_units, water_liters and
+household_size (optional, defaults to 1). Existing (user, date) rows are
+replaced.
+
+Usage:  python -m ecosaver.ingest usage.csv more.jsonl [--db data/techforge_eco.db]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from ecosaver.config import DB_FILE
+from ecosaver.storage import get_conn, add_usage_bulk
+
+FORMATS = ("csv", "jsonl")
+
+
+def _record(obj: dict, where: str):
+    try:
+        username = obj.get("username") or obj.get("name")
+        if not username:
+            raise KeyError("username")
+        return (username, obj["date"], float(obj["electricity_units"]),
+                int(float(obj["water_liters"])), int(float(obj.get("household_size") or 1)))
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"{where}: bad record ({e!r})") from None
+
+def guess_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    return "jsonl" if ext in (".jsonl", ".ndjson", ".json") else "csv"
+
+def read_records(path: str, fmt: str = None):
+    """Yield (username, date, elec, water, hh_size) tuples from a CSV or JSON-lines file."""
+    fmt = fmt or guess_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of {FORMATS}")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            for lineno, row in enumerate(csv.DictReader(f), start=2):
+                yield _record(row, f"{path}:{lineno}")
+        else:
+            for lineno, line in enumerate(f, start=1):
+                if line.strip():
+                    yield _record(json.loads(line), f"{path}:{lineno}")
+
+def ingest_files(conn, paths, fmt: str = None) -> int:
+    """Load every file into the database in one transaction; returns rows written."""
+    records = []
+    for path in paths:
+        records.extend(read_records(path, fmt))
+    return add_usage_bulk(conn, records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load usage readings into the EcoSaver database.")
+    parser.add_argument("files", nargs="+", help="CSV or JSON-lines files")
+    parser.add_argument("--db", default=DB_FILE, help=f"SQLite file (default: {DB_FILE})")
+    parser.add_argument("--format", choices=FORMATS, help="Input format (default: from file extension)")
+    args = parser.parse_args(argv)
+
+    conn = get_conn(args.db)
+    t0 = time.perf_counter()
+    try:
+        n = ingest_files(conn, args.files, args.format)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    print(f"Loaded {n} rows into {args.db} in {time.perf_counter() - t0:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
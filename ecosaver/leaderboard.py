@@ -0,0 +1,225 @@
+# ecosaver/leaderboard.py
+"""
+Precomputed "last 7 days" leaderboard.
+
+The `leaderboard` table holds, per user with readings in the window, the
+latest kWh, the next-day trend prediction and the EcoScore, ranked through
+idx_leaderboard_rank. Triggers on `usage` queue changed users in
+`leaderboard_dirty`; `refresh_leaderboard` recomputes only those (plus users
+on the global-trend fallback, whose prediction depends on everyone) and does
+a full rebuild when the window moves to a new day. Top-K and "my rank" are
+single index walks.
+
+The numbers match compute_leaderboard over the same window: per-user and
+global trends come from the same OLS sums, aggregated in SQLite.
+
+Usage:  python -m ecosaver.leaderboard [--db data/techforge_eco.db] [--top 10]   (refresh and print)
+"""
+import argparse
+import sys
+import threading
+from datetime import date, timedelta
+
+from ecosaver import perf
+from ecosaver.config import DB_FILE, DATE_FMT
+from ecosaver.perf import timed
+from ecosaver.scoring import eco_score
+from ecosaver.trend_stats import predict_from_sums
+
+LEADERBOARD_DAYS = 7
+LEADERBOARD_TOP_K = 10
+REFRESH_INTERVAL_SECONDS = 15
+VERSION_KEY = "leaderboard_version"  # bumped by every refresh that rewrites rows
+
+# Stay well under SQLite's bound-parameter limit.
+_MAX_PARAMS = 500
+
+_WINDOW_SUMS_SQL = """
+    SELECT user_id, COUNT(*), SUM(x), SUM(y), SUM(x * x), SUM(x * y), MAX(x), MAX(latest)
+    FROM (SELECT user_id, julianday(date) - julianday(:start) AS x, electricity_units AS y,
+                 FIRST_VALUE(electricity_units) OVER (PARTITION BY user_id ORDER BY date DESC) AS latest
+          FROM usage WHERE date BETWEEN :start AND :end {users})
+    GROUP BY user_id
+"""
+
+
+def leaderboard_range(today=None):
+    """('YYYY-MM-DD', 'YYYY-MM-DD') covering the last LEADERBOARD_DAYS up to `today`."""
+    today = today or date.today()
+    return ((today - timedelta(days=LEADERBOARD_DAYS)).strftime(DATE_FMT),
+            today.strftime(DATE_FMT))
+
+# ---------------------------
+# Maintenance
+# ---------------------------
+def _global_pred(conn, start, end):
+    # global_trend_predict over the window's raw rows, from the daily rollup.
+    n, sx, sy, sxx, sxy, last_x = conn.execute("""
+        SELECT SUM(n), SUM(x * n), SUM(elec_sum), SUM(x * x * n), SUM(x * elec_sum), MAX(x)
+        FROM (SELECT julianday(date) - julianday(?) AS x, n, elec_sum
+              FROM daily_rollup WHERE date BETWEEN ? AND ?)
+    """, (start, start, end)).fetchone()
+    if not n:
+        return None
+    if n < 3:
+        return sy / n
+    return predict_from_sums(n, sx, sy, sxx, sxy, last_x)
+
+def _score_rows(conn, start, end, user_ids=None):
+    """[(user_id, latest, pred, score, fallback)] for `user_ids` (default: all) in the window."""
+    params = {"start": start, "end": end}
+    if user_ids is None:
+        chunks = [""]
+    else:
+        ids = sorted(set(user_ids))
+        chunks = [",".join(str(int(u)) for u in ids[i:i + _MAX_PARAMS])
+                  for i in range(0, len(ids), _MAX_PARAMS)]
+    global_pred = None
+    rows = []
+    for chunk in chunks:
+        users = f"AND user_id IN ({chunk})" if chunk else ""
+        for uid, n, sx, sy, sxx, sxy, last_x, latest in conn.execute(
+                _WINDOW_SUMS_SQL.format(users=users), params):
+            pred, fallback = predict_from_sums(n, sx, sy, sxx, sxy, last_x), 0
+            if pred is None:
+                if global_pred is None:
+                    global_pred = _global_pred(conn, start, end)
+                # compute_leaderboard falls back to the user's own latest value
+                # when the global trend is missing (or zero).
+                pred, fallback = (global_pred or latest), 1
+            rows.append((uid, latest, pred, eco_score(latest, pred), fallback))
+    return rows
+
+@timed()
+def refresh_leaderboard(conn, today=None) -> int:
+    """
+    Bring the table up to date for the window ending `today` and return the
+    number of users recomputed. Does a full rebuild when the window differs
+    from the stored one; otherwise only queued users and fallback users.
+    """
+    start, end = leaderboard_range(today)
+    if conn.in_transaction:
+        conn.commit()
+    # IMMEDIATE: no writer can queue a user between reading and clearing the queue.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        same_window = stored_window(conn) == (start, end)
+        dirty = [r[0] for r in conn.execute("SELECT user_id FROM leaderboard_dirty")]
+        if same_window and not dirty:
+            conn.rollback()
+            return 0
+        if same_window:
+            targets = dirty + [r[0] for r in conn.execute("SELECT user_id FROM leaderboard WHERE fallback = 1")]
+            rows = _score_rows(conn, start, end, targets)
+            targets = sorted(set(targets))
+            for i in range(0, len(targets), _MAX_PARAMS):
+                chunk = targets[i:i + _MAX_PARAMS]
+                conn.execute(f"DELETE FROM leaderboard WHERE user_id IN ({','.join('?' * len(chunk))})", chunk)
+        else:
+            rows = _score_rows(conn, start, end)
+            conn.execute("DELETE FROM leaderboard")
+        conn.executemany("INSERT INTO leaderboard (user_id, latest_kwh, pred, score, fallback) "
+                         "VALUES (?, ?, ?, ?, ?)", rows)
+        conn.execute("DELETE FROM leaderboard_dirty")
+        conn.execute("INSERT OR REPLACE INTO leaderboard_window (id, start_date, end_date) VALUES (1, ?, ?)",
+                     (start, end))
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, 1) "
+                     "ON CONFLICT (key) DO UPDATE SET value = value + 1", (VERSION_KEY,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(rows)
+
+def _refresh_tick(conn):
+    # One metrics record per tick with ECOSAVER_PERF=1, and always for a failed one.
+    perf.start_run("leaderboard.refresh")
+    failed = False
+    try:
+        perf.count("leaderboard.refreshed_users", refresh_leaderboard(conn))
+    except Exception as e:  # a locked or vanished database: retry next tick
+        perf.count(f"leaderboard.refresh_failed.{type(e).__name__}")
+        failed = True
+    perf.end_run(perf.METRICS_LOG if failed or perf.enabled_by_env() else None)
+
+def start_refresher(db_file: str = DB_FILE, interval: float = REFRESH_INTERVAL_SECONDS):
+    """
+    Refresh the leaderboard every `interval` seconds on a daemon thread with its
+    own connection. Returns a threading.Event; set it to stop the thread.
+    Failed refreshes are recorded in the perf metrics log, not raised.
+    """
+    from ecosaver.storage import get_conn
+
+    stop = threading.Event()
+
+    def run():
+        conn = get_conn(db_file)
+        try:
+            while True:
+                _refresh_tick(conn)
+                if stop.wait(interval):
+                    break
+        finally:
+            conn.close()
+
+    threading.Thread(target=run, daemon=True, name="leaderboard-refresh").start()
+    return stop
+
+# ---------------------------
+# Reads
+# ---------------------------
+def stored_window(conn):
+    """('YYYY-MM-DD', 'YYYY-MM-DD') the table was last refreshed for, or None."""
+    row = conn.execute("SELECT start_date, end_date FROM leaderboard_window WHERE id = 1").fetchone()
+    return tuple(row) if row else None
+
+def leaderboard_version(conn) -> int:
+    """Counter bumped by each refresh that changed the table; a cache key for leaderboard reads."""
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (VERSION_KEY,)).fetchone()
+    return row[0] if row else 0
+
+@timed()
+def top_k(conn, k: int = LEADERBOARD_TOP_K):
+    """[(username, score, latest_kWh, pred)] for the `k` best scores (None: all), best first."""
+    return conn.execute("""
+        SELECT us.username, lb.score, lb.latest_kwh, ROUND(lb.pred, 2)
+        FROM leaderboard lb JOIN users us ON lb.user_id = us.id
+        ORDER BY lb.score DESC, lb.user_id LIMIT ?
+    """, (-1 if k is None else int(k),)).fetchall()
+
+@timed()
+def user_rank(conn, username: str):
+    """(rank, ranked users, score) for `username`, or None if not on the leaderboard. Ties share a rank."""
+    row = conn.execute("""
+        SELECT lb.score FROM leaderboard lb JOIN users us ON lb.user_id = us.id
+        WHERE us.username = ?
+    """, (username.strip().lower(),)).fetchone()
+    if row is None:
+        return None
+    score = row[0]
+    above = conn.execute("SELECT COUNT(*) FROM leaderboard WHERE score > ?", (score,)).fetchone()[0]
+    total = conn.execute("SELECT COUNT(*) FROM leaderboard").fetchone()[0]
+    return above + 1, total, score
+
+
+def main(argv=None):
+    from ecosaver.storage import get_conn
+
+    parser = argparse.ArgumentParser(description="Refresh the EcoSaver leaderboard and print the top users.")
+    parser.add_argument("--db", default=DB_FILE, help=f"SQLite file (default: {DB_FILE})")
+    parser.add_argument("--top", type=int, default=LEADERBOARD_TOP_K, help="Rows to print")
+    args = parser.parse_args(argv)
+
+    conn = get_conn(args.db)
+    try:
+        n = refresh_leaderboard(conn)
+        print(f"Refreshed {n} users ({' to '.join(leaderboard_range())})")
+        for i, (user, score, latest, pred) in enumerate(top_k(conn, args.top), 1):
+            print(f"{i:>3}. {user:<20} {score:>3}  latest {latest:.2f} kWh  pred {pred:.2f} kWh")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,428 @@
+# ecosaver/loadtest.py
+"""
+Load test for the Streamlit dashboard: N concurrent sessions of app.py run
+in-process through streamlit.testing.v1.AppTest, so it needs no browser,
+server or network.
+
+The app runs in a scratch working directory. Its relative data/ paths then
+point at a database generated there (`--users` x `--days`, or a copy of
+`--db`). Each session is one AppTest with its own session state on its own
+thread. st.cache_data, st.cache_resource and the pooled Database are shared
+by all sessions, as they are on a real server. Every session repeats a
+weighted mix (`--mix`) of actions, and each action ends in a rerun:
+
+    login    type a username into login_form and submit it (db.add_user)
+    switch   pick another user in the "View user" select box
+    whatif   set the whatif_form sliders and checkbox and submit the form
+    insert   write a reading through a second pool.Database on the same
+             file, as the estimator pages and ingest jobs do, then rerun
+
+Reported:
+    - rerun latency p50/p95/p99 per action and overall, and reruns/s
+    - each p50 against a single-session pass over the same actions
+    - lock contention: the time reruns waited for a pooled reader or the
+      writer (the pool.* spans of every ECOSAVER_PERF rerun), the latency of
+      the inserts' own commits and "database is locked" errors
+    - memory per session: the Python heap one more session holds after its
+      first run (tracemalloc; RSS growth per session is below allocator
+      noise), plus the process's peak resident set (VmHWM)
+
+Usage:
+    python -m ecosaver.loadtest --users 500 --days 90 --sessions 8 --seconds 30
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import numpy as np
+
+from ecosaver import perf
+from ecosaver.config import DB_FILE
+from ecosaver.pool import Database
+from ecosaver.storage import get_conn, get_user_list
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_FILE = os.path.join(ROOT, "app.py")
+
+ACTIONS = ("login", "switch", "whatif", "insert")
+DEFAULT_MIX = "login=1,switch=4,whatif=3,insert=2"
+BASELINE_ROUNDS = 5  # single-session runs of each action
+
+# Widget labels in app.py.
+LOGIN_INPUT = "Enter your username (no password)"
+LOGIN_SUBMIT = "Create / Use user"
+VIEW_USER = "View user"
+ALL_USERS = "All users"
+WHATIF_AC = "Reduce AC / heavy load (hours/day)"
+WHATIF_SHOWER = "Shorter shower (mins/day)"
+WHATIF_LED = "Switch 3 incandescent bulbs -> LED (daily effect)"
+WHATIF_SUBMIT = "Estimate savings"
+
+
+def _apptest():
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        raise ImportError("The load test needs streamlit>=1.28: pip install streamlit") from None
+    return AppTest
+
+@contextmanager
+def shared_runtime():
+    """
+    Let AppTest sessions rerun on several threads at once, sharing what a
+    real server shares. Each AppTest run installs a mock streamlit Runtime
+    and unsets it when it ends, so one session finishing would pull the
+    runtime from under another's script thread (RuntimeError "Runtime hasn't
+    been created!" and an empty page): fall back to the last installed mock.
+    Each run also compiles app.py into a fresh ScriptCache, and ast.parse is
+    not thread-safe on every CPython (SystemError "AST constructor recursion
+    depth mismatch"): hand out one cache, as the server does. global.appTest,
+    which each run patches and restores, stays on throughout.
+    """
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    last = []
+    script_cache = ScriptCache()
+
+    def instance(cls):
+        if cls._instance is not None:
+            last[:] = [cls._instance]
+        elif last:
+            return last[0]
+        return orig_instance.__func__(cls)
+
+    def exists(cls):
+        return cls._instance is not None or bool(last)
+
+    orig_instance, orig_exists = Runtime.__dict__["instance"], Runtime.__dict__["exists"]
+    orig_app_test = config.get_option("global.appTest")
+    Runtime.instance, Runtime.exists = classmethod(instance), classmethod(exists)
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+    config.set_option("global.appTest", True)
+    try:
+        yield
+    finally:
+        Runtime.instance, Runtime.exists = orig_instance, orig_exists
+        app_test.ScriptCache = local_script_runner.ScriptCache = ScriptCache
+        config.set_option("global.appTest", orig_app_test)
+
+def parse_mix(text: str) -> dict:
+    """'login=1,switch=4' -> {action: weight}; unknown actions and negative weights are errors."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in ACTIONS:
+            raise ValueError(f"Unknown action {name!r} in --mix (expected one of {', '.join(ACTIONS)})")
+        mix[name] = float(weight or 1)
+        if mix[name] < 0:
+            raise ValueError(f"Negative weight for {name!r} in --mix")
+    if not any(mix.values()):
+        raise ValueError("--mix gives every action a weight of 0")
+    return mix
+
+def _proc_status_kib(field: str):
+    """A VmRSS/VmHWM-style field of /proc/self/status in KiB (None off Linux)."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+# ---------------------------
+# Workspace
+# ---------------------------
+def prepare_workdir(workdir, users, days, seed=0, db=None) -> str:
+    """
+    Put the home database under `workdir` where app.py looks for it (a copy
+    of `db`, or a generated cohort if none exists yet) and return its path.
+    """
+    target = os.path.join(workdir, DB_FILE)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if db:
+        shutil.copyfile(db, target)
+    conn = get_conn(target)
+    try:
+        if conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 0:
+            from ecosaver.synth import write_cohort
+            write_cohort(conn, users, days, seed)
+    finally:
+        conn.close()
+    return target
+
+
+# ---------------------------
+# Sessions
+# ---------------------------
+class _Session:
+    """One browser tab: an AppTest of app.py plus the actions a user takes in it."""
+
+    def __init__(self, users, writer, seed, timeout):
+        self.at = _apptest().from_file(APP_FILE, default_timeout=timeout)
+        self.users, self.writer = users, writer
+        self.rng = random.Random(seed)
+        self.write_ms = []
+
+    def _widget(self, kind, label):
+        for w in getattr(self.at, kind):
+            if w.label == label:
+                return w
+        raise LookupError(f"No {kind} labelled {label!r} on the page")
+
+    def run(self) -> list:
+        """Rerun the script; returns the messages of exceptions it displayed."""
+        self.at.run()
+        return [e.message for e in self.at.exception]
+
+    def login(self):
+        self._widget("text_input", LOGIN_INPUT).input(self.rng.choice(self.users))
+        self._widget("button", LOGIN_SUBMIT).click()
+
+    def switch(self):
+        self._widget("selectbox", VIEW_USER).select(self.rng.choice(self.users))
+
+    def whatif(self):
+        # The form is only drawn for a single user's view.
+        if self._widget("selectbox", VIEW_USER).value == ALL_USERS:
+            self.switch()
+            self.run()
+        self._widget("slider", WHATIF_AC).set_value(self.rng.randint(0, 16) / 4)
+        self._widget("slider", WHATIF_SHOWER).set_value(self.rng.randint(0, 10))
+        self._widget("checkbox", WHATIF_LED).set_value(self.rng.random() < 0.5)
+        self._widget("button", WHATIF_SUBMIT).click()
+
+    def insert(self):
+        day = (date.today() - timedelta(days=self.rng.randint(0, 6))).isoformat()
+        t0 = time.perf_counter()
+        self.writer.add_usage(self.rng.choice(self.users), day, round(self.rng.uniform(0.5, 12), 2),
+                              self.rng.randint(50, 400), self.rng.randint(1, 6))
+        self.write_ms.append((time.perf_counter() - t0) * 1000)
+
+def _act(session, action, out):
+    """Run one action and its rerun; appends (action, ms, error messages) to `out`."""
+    t0 = time.perf_counter()
+    try:
+        getattr(session, action)()
+        errors = session.run()
+    except Exception as e:
+        errors = [f"{type(e).__name__}: {e}"]
+    out.append((action, (time.perf_counter() - t0) * 1000, errors))
+
+def _loop(session, actions, weights, deadline, out):
+    while time.perf_counter() < deadline:
+        _act(session, session.rng.choices(actions, weights)[0], out)
+
+def _session_heap_kib(users, writer, seed, timeout) -> float:
+    """Python heap held by one extra session after its first run, in KiB; traced apart from the timed runs."""
+    tracemalloc.start()
+    try:
+        session = _Session(users, writer, seed, timeout)
+        session.run()
+        held = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return held / 1024
+
+
+# ---------------------------
+# Runner
+# ---------------------------
+def _pct(ms, q):
+    return float(np.percentile(ms, q)) if len(ms) else None
+
+def _latency(samples) -> dict:
+    """{action: {n, p50_ms, p95_ms, p99_ms}} plus an "all" row."""
+    by_action = defaultdict(list)
+    for action, ms, _ in samples:
+        by_action[action].append(ms)
+    by_action = {a: by_action[a] for a in ACTIONS if a in by_action}
+    by_action["all"] = [ms for _, ms, _ in samples]
+    return {a: {"n": len(ms), "p50_ms": _pct(ms, 50), "p95_ms": _pct(ms, 95), "p99_ms": _pct(ms, 99)}
+            for a, ms in by_action.items()}
+
+def _pool_waits(log_file) -> dict:
+    """
+    Pool waits of the dashboard reruns in the metrics log (and its rotated
+    .1): p95 reader / writer wait per rerun and their share of rerun time.
+    """
+    reader, writer, total = [], [], 0.0
+    for f in (log_file + ".1", log_file):
+        if not os.path.exists(f):
+            continue
+        with open(f, encoding="utf-8") as fh:
+            for line in fh:
+                rec = json.loads(line)
+                if rec.get("label") != "dashboard":
+                    continue
+                spans = rec.get("spans", [])
+                reader.append(sum(s["ms"] for s in spans if s["name"] == "pool.reader_wait"))
+                writer.append(sum(s["ms"] for s in spans if s["name"] == "pool.write"))
+                total += rec.get("total_ms") or 0.0
+    return {
+        "reruns_logged": len(reader),
+        "reader_wait_p95_ms": _pct(reader, 95),
+        "writer_wait_p95_ms": _pct(writer, 95),
+        "wait_share": (sum(reader) + sum(writer)) / total if total else None,
+    }
+
+def run_baseline(users, writer, actions, seed, timeout) -> dict:
+    """Uncontended latency: one session, BASELINE_ROUNDS of each action in turn."""
+    session = _Session(users, writer, seed, timeout)
+    out = []
+    session.run()
+    for _ in range(BASELINE_ROUNDS):
+        for action in actions:
+            _act(session, action, out)
+    return _latency(out)
+
+def run_sessions(users, writer, sessions, seconds, mix, seed=0, timeout=30.0,
+                 log_file=perf.METRICS_LOG) -> dict:
+    """
+    `sessions` AppTest sessions doing the `mix` of actions for `seconds`;
+    returns the metrics. Run from the scratch workdir: `log_file` is cleared.
+    """
+    actions = [a for a in ACTIONS if mix.get(a)]
+    weights = [mix[a] for a in actions]
+    _Session(users, writer, seed, timeout).run()  # imports and warm caches stay out of the figures
+    pool = [_Session(users, writer, seed + i, timeout) for i in range(sessions)]
+    first = []
+    for s in pool:  # the script's first run in a new session
+        t0 = time.perf_counter()
+        s.run()
+        first.append((time.perf_counter() - t0) * 1000)
+    session_heap_kib = _session_heap_kib(users, writer, seed, timeout)
+
+    for f in (log_file + ".1", log_file):  # keep only the concurrent run's reruns
+        if os.path.exists(f):
+            os.remove(f)
+    out = []
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=_loop, args=(s, actions, weights, deadline, out)) for s in pool]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    errors = Counter(msg for _, _, errs in out for msg in errs)
+    write_ms = [ms for s in pool for ms in s.write_ms]
+    return {
+        "sessions": sessions,
+        "seconds": elapsed,
+        "reruns": len(out),
+        "reruns_per_s": len(out) / elapsed,
+        "first_run_ms": {"p50": _pct(first, 50), "max": max(first)},
+        "latency": _latency(out),
+        "insert_commit_p50_ms": _pct(write_ms, 50),
+        "insert_commit_p95_ms": _pct(write_ms, 95),
+        "pool": _pool_waits(log_file),
+        "errors": sum(errors.values()),
+        "locked_errors": sum(n for msg, n in errors.items() if "database is locked" in msg),
+        "error_kinds": dict(errors.most_common(5)),
+        "session_heap_kib": session_heap_kib,
+        "peak_rss_kib": _proc_status_kib("VmHWM"),
+    }
+
+def print_results(r, baseline=None):
+    def ms(v):
+        return f"{v:.1f}" if v is not None else "-"
+
+    print(f"{r['sessions']} sessions, {r['reruns']} reruns in {r['seconds']:.1f}s "
+          f"({r['reruns_per_s']:.1f} reruns/s); first run p50 {ms(r['first_run_ms']['p50'])} ms")
+    print(f"{'action':8} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'solo p50':>9} {'x solo':>7}")
+    for action, row in r["latency"].items():
+        solo = (baseline or {}).get(action, {}).get("p50_ms")
+        ratio = f"{row['p50_ms'] / solo:.1f}" if solo else "-"
+        print(f"{action:8} {row['n']:>6} {ms(row['p50_ms']):>9} {ms(row['p95_ms']):>9} "
+              f"{ms(row['p99_ms']):>9} {ms(solo):>9} {ratio:>7}")
+    pool = r["pool"]
+    share = f"{100 * pool['wait_share']:.1f}%" if pool["wait_share"] is not None else "-"
+    print(f"contention: reader wait p95 {ms(pool['reader_wait_p95_ms'])} ms, "
+          f"writer wait p95 {ms(pool['writer_wait_p95_ms'])} ms ({share} of rerun time); "
+          f"insert commit p50/p95 {ms(r['insert_commit_p50_ms'])}/{ms(r['insert_commit_p95_ms'])} ms; "
+          f"{r['locked_errors']} locked")
+    peak = f"{r['peak_rss_kib'] / 1024:.0f} MiB" if r["peak_rss_kib"] is not None else "-"
+    print(f"memory: {r['session_heap_kib']:.0f} KiB per session, peak RSS {peak}")
+    print(f"errors: {r['errors']}")
+    for kind, n in r["error_kinds"].items():
+        print(f"{n:>8} x {kind}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the Streamlit dashboard with concurrent in-process sessions.")
+    parser.add_argument("--db", help="Copy this database in (default: generate one)")
+    parser.add_argument("--users", type=int, default=200, help="Synthetic users to generate (default: 200)")
+    parser.add_argument("--days", type=int, default=90, help="Days per generated user (default: 90)")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions (default: 8)")
+    parser.add_argument("--seconds", type=float, default=20, help="Duration of the concurrent run (default: 20)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Action weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--timeout", type=float, default=30, help="Per-rerun timeout in seconds (default: 30)")
+    parser.add_argument("--no-baseline", action="store_true", help="Skip the single-session pass")
+    parser.add_argument("--workdir", help="Scratch directory to run the app in (default: a temporary one, removed after)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+        _apptest()
+    except (ValueError, ImportError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+    json_out = os.path.abspath(args.json) if args.json else None
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="ecosaver_load_"))
+    db_file = prepare_workdir(workdir, args.users, args.days, args.seed,
+                              os.path.abspath(args.db) if args.db else None)
+    conn = get_conn(db_file)
+    try:
+        users = get_user_list(conn)
+    finally:
+        conn.close()
+    if not users:
+        print("error: the load-test database has no users", file=sys.stderr)
+        return 1
+
+    # app.py opens data/... relative to the working directory and imports ecosaver from the repo.
+    cwd = os.getcwd()
+    os.environ[perf.ENV_VAR] = "1"
+    sys.path.insert(0, ROOT)
+    os.chdir(workdir)
+    writer = Database(db_file)
+    try:
+        with shared_runtime():
+            baseline = None if args.no_baseline else run_baseline(
+                users, writer, [a for a in ACTIONS if mix.get(a)], args.seed, args.timeout)
+            result = run_sessions(users, writer, args.sessions, args.seconds, mix, args.seed, args.timeout)
+    finally:
+        writer.close()
+        os.chdir(cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    result["baseline"] = baseline
+    print_results(result, baseline)
+    if json_out:
+        with open(json_out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
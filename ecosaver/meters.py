@@ -0,0 +1,372 @@
+# ecosaver/meters.py
+"""
+Interval meter readings (hourly or finer) with time-bucketed rollups.
+
+Each user has at most one meter per kind (electricity in kWh, water in
+litres). A reading is the consumption over the interval starting at `ts`,
+stored as integer epoch seconds of the meter's wall-clock time (naive
+timestamps are taken as UTC, so a day bucket is the calendar day the meter
+reported). `meter_readings` is keyed by (meter, ts); a reading sent again
+replaces the first.
+
+`ingest_readings` writes readings in batches and then, in the same
+transaction, rebuilds the hour, day and month buckets in `meter_rollup` for
+the time range each meter received (hours from raw rows, days from hours,
+months from days). It also derives the daily `usage` rows of the touched
+days from the day buckets, so the dashboard's charts, predictions, rollups
+and leaderboard keep reading daily rows and never scan interval data.
+
+Reads go to the coarsest bucket that answers them: `series` picks the finest
+grain that fits a point budget (or the grain asked for), and `total` covers a
+range with whole months, then days, then hours, and reads raw rows only for
+the ragged edges.
+
+Usage:  python -m ecosaver.meters readings.csv [more.jsonl] [--db data/techforge_eco.db]
+        python -m ecosaver.meters --synth-users 100 --synth-days 30 --interval 900 --db /tmp/m.db
+"""
+import argparse
+import calendar
+import csv
+import json
+import os
+import sys
+import time
+from datetime import date, datetime
+
+from ecosaver.config import DB_FILE
+from ecosaver.perf import timed
+from ecosaver.rollups import refresh_daily_rollup, refresh_user_rollup
+from ecosaver.storage import UPSERT_USAGE_SQL, bump_data_version, mark_users_changed
+from ecosaver.trend_stats import refresh_user_stats
+
+KINDS = ("electricity", "water")
+GRAINS = ("hour", "day", "month")   # finest first
+GRAIN_SECONDS = {"hour": 3600, "day": 86400, "month": 31 * 86400}  # month: upper bound, for budgets
+SERIES_COLUMNS = ["ts", "n", "total", "min", "max"]
+MAX_POINTS = 1000
+BATCH_ROWS = 100_000
+
+# SQL: epoch second of the start of the month holding the epoch-second expression {}
+# (plus optional date modifiers). strftime('%s') rather than unixepoch(), which
+# needs SQLite 3.38.
+_MONTH_OF = "CAST(strftime('%s', date({}, 'unixepoch', 'start of month'{})) AS INTEGER)"
+
+
+def to_epoch(ts) -> int:
+    """Epoch seconds for an int/float, a datetime/date or ISO-8601 text (naive = UTC)."""
+    if isinstance(ts, (int, float)):
+        return int(ts)
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts.strip().replace("Z", "+00:00"))
+    if isinstance(ts, datetime):
+        return calendar.timegm(ts.utctimetuple() if ts.tzinfo else ts.timetuple())
+    if isinstance(ts, date):
+        return calendar.timegm(ts.timetuple())
+    raise ValueError(f"Not a timestamp: {ts!r}")
+
+def _floor(ts: int, grain: str) -> int:
+    if grain == "month":
+        d = time.gmtime(ts)
+        return calendar.timegm((d.tm_year, d.tm_mon, 1, 0, 0, 0))
+    return ts - ts % GRAIN_SECONDS[grain]
+
+def _next(ts: int, grain: str) -> int:
+    """Start of the bucket after the one starting at `ts`."""
+    if grain == "month":
+        d = time.gmtime(ts)
+        return calendar.timegm((d.tm_year + d.tm_mon // 12, d.tm_mon % 12 + 1, 1, 0, 0, 0))
+    return ts + GRAIN_SECONDS[grain]
+
+# ---------------------------
+# Writes
+# ---------------------------
+def meter_ids(conn, pairs):
+    """{(username, kind): meter id} for `pairs`, creating missing users and meters (caller's transaction)."""
+    pairs = {(str(u).strip().lower(), k) for u, k in pairs}
+    bad = {k for _, k in pairs} - set(KINDS)
+    if bad:
+        raise ValueError(f"Unknown meter kind(s) {sorted(bad)}; expected one of {list(KINDS)}")
+    now = datetime.utcnow().isoformat()
+    conn.executemany("INSERT OR IGNORE INTO users (username, created_at) VALUES (?, ?)",
+                     [(u, now) for u in {u for u, _ in pairs}])
+    users = dict((name, uid) for uid, name in conn.execute("SELECT id, username FROM users"))
+    conn.executemany("INSERT OR IGNORE INTO meters (user_id, kind) VALUES (?, ?)",
+                     [(users[u], k) for u, k in pairs])
+    meters = {(uid, kind): mid for mid, uid, kind in conn.execute("SELECT id, user_id, kind FROM meters")}
+    return {(u, k): meters[(users[u], k)] for u, k in pairs}
+
+_REFRESH_HOUR_SQL = """
+    INSERT OR REPLACE INTO meter_rollup (grain, meter_id, start, n, total, min, max)
+    SELECT 'hour', r.meter_id, r.ts - r.ts % 3600, COUNT(*), SUM(r.value), MIN(r.value), MAX(r.value)
+    FROM temp.meter_touched t JOIN meter_readings r
+      ON r.meter_id = t.meter_id AND r.ts >= t.lo - t.lo % 3600 AND r.ts < t.hi - t.hi % 3600 + 3600
+    GROUP BY r.meter_id, r.ts - r.ts % 3600
+"""
+
+_REFRESH_FROM_SQL = """
+    INSERT OR REPLACE INTO meter_rollup (grain, meter_id, start, n, total, min, max)
+    SELECT '{grain}', b.meter_id, {bucket}, SUM(b.n), SUM(b.total), MIN(b.min), MAX(b.max)
+    FROM temp.meter_touched t JOIN meter_rollup b
+      ON b.grain = '{finer}' AND b.meter_id = t.meter_id AND b.start >= {lo} AND b.start < {hi}
+    GROUP BY b.meter_id, {bucket}
+"""
+
+def _refresh_rollups(conn):
+    """Rebuild every bucket overlapping each meter's touched range in temp.meter_touched."""
+    conn.execute(_REFRESH_HOUR_SQL)
+    conn.execute(_REFRESH_FROM_SQL.format(
+        grain="day", finer="hour", bucket="b.start - b.start % 86400",
+        lo="t.lo - t.lo % 86400", hi="t.hi - t.hi % 86400 + 86400"))
+    conn.execute(_REFRESH_FROM_SQL.format(
+        grain="month", finer="day", bucket=_MONTH_OF.format("b.start", ""),
+        lo=_MONTH_OF.format("t.lo", ""), hi=_MONTH_OF.format("t.hi", ", '+1 month'")))
+
+def _derive_usage(conn):
+    """
+    Upsert the daily usage rows of every (user, day) touched, from the day
+    buckets. A kind the user has no meter for keeps the row's current value
+    (0 for a new row); household size carries over from the user's latest row.
+    Returns (dates, user ids) written.
+    """
+    rows = conn.execute("""
+        WITH days AS (
+            SELECT m.user_id, b.start,
+                   SUM(CASE WHEN m.kind = 'electricity' THEN b.total END) AS elec,
+                   SUM(CASE WHEN m.kind = 'water' THEN b.total END) AS water
+            FROM temp.meter_touched t
+            JOIN meters m ON m.id = t.meter_id
+            JOIN meter_rollup b ON b.grain = 'day' AND b.meter_id = t.meter_id
+             AND b.start >= t.lo - t.lo % 86400 AND b.start < t.hi - t.hi % 86400 + 86400
+            GROUP BY m.user_id, b.start
+        )
+        SELECT d.user_id, date(d.start, 'unixepoch'),
+               ROUND(COALESCE(d.elec, u.electricity_units, 0), 2),
+               CAST(ROUND(COALESCE(d.water, u.water_liters, 0)) AS INTEGER),
+               COALESCE(u.household_size,
+                        (SELECT p.household_size FROM usage p WHERE p.user_id = d.user_id
+                         ORDER BY p.date DESC LIMIT 1), 1)
+        FROM days d
+        LEFT JOIN usage u ON u.user_id = d.user_id AND u.date = date(d.start, 'unixepoch')
+    """).fetchall()
+    now = datetime.utcnow().isoformat()
+    conn.executemany(UPSERT_USAGE_SQL, [r + (now,) for r in rows])
+    return {r[1] for r in rows}, {r[0] for r in rows}
+
+@timed()
+def ingest_readings(conn, records, batch_size: int = BATCH_ROWS) -> int:
+    """
+    Write interval readings and bring the rollups and daily usage rows up to
+    date, all in one transaction. `records` is an iterable of
+    (username, kind, ts, value); it is consumed `batch_size` rows at a time,
+    so a generator of millions of readings is never held in memory.
+    Returns the number of readings written.
+    """
+    count = 0
+    ids = {}
+    with conn:  # commits on success, rolls back everything on error
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS meter_touched "
+                     "(meter_id INTEGER PRIMARY KEY, lo INTEGER NOT NULL, hi INTEGER NOT NULL)")
+        conn.execute("DELETE FROM temp.meter_touched")
+        batch = []
+        for rec in records:
+            batch.append(rec)
+            if len(batch) >= batch_size:
+                count += _write_batch(conn, batch, ids)
+                batch = []
+        count += _write_batch(conn, batch, ids)
+        if count:
+            _refresh_rollups(conn)
+            dates, users = _derive_usage(conn)
+            refresh_daily_rollup(conn, dates)
+            refresh_user_rollup(conn, users)
+            refresh_user_stats(conn, users)
+            mark_users_changed(conn, users)
+            bump_data_version(conn)
+        conn.execute("DELETE FROM temp.meter_touched")
+    return count
+
+def _write_batch(conn, batch, ids):
+    if not batch:
+        return 0
+    missing = {(str(u).strip().lower(), k) for u, k, _, _ in batch} - ids.keys()
+    if missing:
+        ids.update(meter_ids(conn, missing))
+    rows = [(ids[(str(u).strip().lower(), k)], to_epoch(ts), float(v)) for u, k, ts, v in batch]
+    conn.executemany("INSERT INTO meter_readings (meter_id, ts, value) VALUES (?, ?, ?) "
+                     "ON CONFLICT (meter_id, ts) DO UPDATE SET value = excluded.value", rows)
+    span = {}
+    for mid, ts, _ in rows:
+        lo, hi = span.get(mid, (ts, ts))
+        span[mid] = (min(lo, ts), max(hi, ts))
+    conn.executemany("""
+        INSERT INTO temp.meter_touched (meter_id, lo, hi) VALUES (?, ?, ?)
+        ON CONFLICT (meter_id) DO UPDATE SET lo = MIN(lo, excluded.lo), hi = MAX(hi, excluded.hi)
+    """, [(mid, lo, hi) for mid, (lo, hi) in span.items()])
+    return len(rows)
+
+def rebuild_meter_rollups(conn) -> int:
+    """Repair: rebuild every bucket and derived usage row from raw readings. Returns buckets written."""
+    with conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS meter_touched "
+                     "(meter_id INTEGER PRIMARY KEY, lo INTEGER NOT NULL, hi INTEGER NOT NULL)")
+        conn.execute("DELETE FROM temp.meter_touched")
+        conn.execute("INSERT INTO temp.meter_touched SELECT meter_id, MIN(ts), MAX(ts) "
+                     "FROM meter_readings GROUP BY meter_id")
+        conn.execute("DELETE FROM meter_rollup")
+        _refresh_rollups(conn)
+        dates, users = _derive_usage(conn)
+        refresh_daily_rollup(conn, dates)
+        refresh_user_rollup(conn, users)
+        refresh_user_stats(conn, users)
+        mark_users_changed(conn, users)
+        bump_data_version(conn)
+        conn.execute("DELETE FROM temp.meter_touched")
+    return conn.execute("SELECT COUNT(*) FROM meter_rollup").fetchone()[0]
+
+# ---------------------------
+# Reads
+# ---------------------------
+def _meter_id(conn, username, kind):
+    row = conn.execute("""
+        SELECT m.id FROM meters m JOIN users us ON m.user_id = us.id
+        WHERE us.username = ? AND m.kind = ?
+    """, (username.strip().lower(), kind)).fetchone()
+    return row[0] if row else None
+
+def user_meters(conn, username: str):
+    """Kinds the user has a meter for, in KINDS order."""
+    kinds = {r[0] for r in conn.execute("""
+        SELECT m.kind FROM meters m JOIN users us ON m.user_id = us.id WHERE us.username = ?
+    """, (username.strip().lower(),))}
+    return [k for k in KINDS if k in kinds]
+
+def pick_grain(start: int, end: int, max_points: int = MAX_POINTS) -> str:
+    """The finest stored grain that puts [start, end) into at most `max_points` buckets."""
+    for grain in GRAINS:
+        if (end - start) / GRAIN_SECONDS[grain] <= max_points:
+            return grain
+    return GRAINS[-1]
+
+@timed()
+def series(conn, username: str, kind: str = "electricity", start=None, end=None,
+           grain: str = None, max_points: int = MAX_POINTS):
+    """
+    The meter's consumption over [start, end) (default: the last 7 days) as
+    a frame with SERIES_COLUMNS, one row per bucket of `grain`: "raw", or a
+    rollup grain read from meter_rollup only (default: pick_grain).
+    """
+    import pandas as pd
+
+    end = to_epoch(end) if end is not None else _floor(int(time.time()), "hour") + 3600
+    start = to_epoch(start) if start is not None else end - 7 * 86400
+    grain = grain or pick_grain(start, end, max_points)
+    mid = _meter_id(conn, username, kind)
+    if grain == "raw":
+        q = ("SELECT ts, 1, value, value, value FROM meter_readings "
+             "WHERE meter_id = ? AND ts >= ? AND ts < ? ORDER BY ts")
+        params = (mid, start, end)
+    elif grain in GRAINS:
+        q = ("SELECT start, n, total, min, max FROM meter_rollup "
+             "WHERE grain = ? AND meter_id = ? AND start >= ? AND start < ? ORDER BY start")
+        params = (grain, mid, _floor(start, grain), end)
+    else:
+        raise ValueError(f"Unknown grain {grain!r}; expected 'raw' or one of {list(GRAINS)}")
+    rows = conn.execute(q, params).fetchall() if mid is not None else []
+    df = pd.DataFrame(rows, columns=SERIES_COLUMNS)
+    df["ts"] = pd.to_datetime(df["ts"], unit="s")
+    return df
+
+def _cover(start: int, end: int, grains=GRAINS[::-1]):
+    """[(grain, lo, hi)] covering [start, end): whole coarse buckets inside, finer ones at the edges."""
+    if start >= end:
+        return []
+    if not grains:
+        return [("raw", start, end)]
+    grain, finer = grains[0], grains[1:]
+    lo = start if _floor(start, grain) == start else _next(_floor(start, grain), grain)
+    hi = _floor(end, grain)
+    if lo >= hi:
+        return _cover(start, end, finer)
+    return _cover(start, lo, finer) + [(grain, lo, hi)] + _cover(hi, end, finer)
+
+@timed()
+def total(conn, username: str, kind: str = "electricity", start=None, end=None) -> float:
+    """The meter's consumption over [start, end), read from the coarsest buckets that fit."""
+    mid = _meter_id(conn, username, kind)
+    if mid is None:
+        return 0.0
+    start = to_epoch(start) if start is not None else 0
+    if end is None:
+        row = conn.execute("SELECT MAX(ts) FROM meter_readings WHERE meter_id = ?", (mid,)).fetchone()
+        end = (row[0] or 0) + 1
+    else:
+        end = to_epoch(end)
+    result = 0.0
+    for grain, lo, hi in _cover(start, end):
+        if grain == "raw":
+            row = conn.execute("SELECT SUM(value) FROM meter_readings WHERE meter_id = ? AND ts >= ? AND ts < ?",
+                               (mid, lo, hi)).fetchone()
+        else:
+            row = conn.execute("SELECT SUM(total) FROM meter_rollup "
+                               "WHERE grain = ? AND meter_id = ? AND start >= ? AND start < ?",
+                               (grain, mid, lo, hi)).fetchone()
+        result += row[0] or 0.0
+    return result
+
+# ---------------------------
+# Files
+# ---------------------------
+FILE_FORMATS = ("csv", "jsonl")
+
+def read_readings(path: str, fmt: str = None):
+    """Yield (username, kind, ts, value) from a CSV or JSON-lines file with those columns/keys."""
+    fmt = fmt or ("jsonl" if os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson", ".json") else "csv")
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = csv.DictReader(f) if fmt == "csv" else (json.loads(line) for line in f if line.strip())
+        for lineno, row in enumerate(rows, start=2 if fmt == "csv" else 1):
+            try:
+                yield (row.get("username") or row["name"], row.get("kind") or "electricity",
+                       row["ts"], float(row["value"]))
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"{path}:{lineno}: bad reading ({e!r})") from None
+
+
+def main(argv=None):
+    from ecosaver.storage import get_conn
+
+    parser = argparse.ArgumentParser(description="Bulk-load interval meter readings and roll them up.")
+    parser.add_argument("files", nargs="*", help="CSV or JSON-lines files with username, kind, ts, value")
+    parser.add_argument("--db", default=DB_FILE, help=f"SQLite file (default: {DB_FILE})")
+    parser.add_argument("--format", choices=FILE_FORMATS, help="Input format (default: from file extension)")
+    parser.add_argument("--synth-users", type=int, help="Generate readings for this many users instead of reading files")
+    parser.add_argument("--synth-days", type=int, default=30)
+    parser.add_argument("--interval", type=int, default=900, help="Seconds between synthetic readings (default: 900)")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild every rollup from raw readings")
+    args = parser.parse_args(argv)
+    if not (args.files or args.synth_users or args.rebuild):
+        parser.error("give files to load, --synth-users or --rebuild")
+
+    conn = get_conn(args.db)
+    t0 = time.perf_counter()
+    try:
+        if args.rebuild:
+            print(f"Rebuilt {rebuild_meter_rollups(conn)} buckets in {time.perf_counter() - t0:.2f}s")
+            return 0
+        if args.synth_users:
+            from ecosaver.synth import generate_readings
+
+            records = generate_readings(args.synth_users, args.synth_days, args.interval)
+        else:
+            records = (r for path in args.files for r in read_readings(path, args.format))
+        n = ingest_readings(conn, records)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    print(f"Loaded {n} readings into {args.db} in {time.perf_counter() - t0:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
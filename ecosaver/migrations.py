@@ -0,0 +1,324 @@
+# ecosaver/migrations.py
+"""
+Versioned schema migrations for the EcoSaver SQLite database.
+
+The schema version lives in SQLite's own `PRAGMA user_version`, so an
+existing database is upgraded in place the next time it is opened.
+Each migration runs in its own transaction together with the version bump.
+
+Usage:  python -m ecosaver.migrations [path/to/db]
+"""
+import sqlite3
+import sys
+import warnings
+
+
+# ---------------------------
+# Migrations
+# ---------------------------
+def _v1_usage_date_indexes(cur):
+    # Canonicalise stored dates to plain 'YYYY-MM-DD' text so that they sort and
+    # range-scan correctly without wrapping the column in date(...).
+    cur.execute("""
+        UPDATE usage SET date = date(date)
+        WHERE date(date) IS NOT NULL AND date IS NOT date(date)
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_usage_user_date ON usage (user_id, date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_usage_date ON usage (date)")
+
+
+def _v2_meta_data_version(cur):
+    # Monotonic counter bumped by every write; caches key their entries on it.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )""")
+    cur.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', 0)")
+
+
+def _v3_unique_user_date(cur):
+    # One reading per user per day: keep the most recently inserted duplicate,
+    # then make the (user_id, date) index unique so writes can upsert. The
+    # older duplicates are moved to usage_duplicates, not dropped.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS usage_duplicates (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            electricity_units REAL NOT NULL,
+            water_liters INTEGER NOT NULL,
+            household_size INTEGER NOT NULL,
+            created_at TEXT
+        )""")
+    cur.execute("""
+        INSERT OR IGNORE INTO usage_duplicates
+        SELECT id, user_id, date, electricity_units, water_liters, household_size, created_at
+        FROM usage WHERE id NOT IN (SELECT MAX(id) FROM usage GROUP BY user_id, date)""")
+    moved = cur.execute("""
+        DELETE FROM usage WHERE id NOT IN (
+            SELECT MAX(id) FROM usage GROUP BY user_id, date
+        )""").rowcount
+    if moved:
+        warnings.warn(f"schema v3: moved {moved} older same-day usage readings to the usage_duplicates table "
+                      "(one reading per user and day is kept)", stacklevel=2)
+    cur.execute("DROP INDEX IF EXISTS idx_usage_user_date")
+    cur.execute("CREATE UNIQUE INDEX idx_usage_user_date ON usage (user_id, date)")
+
+
+def _v4_daily_rollup(cur):
+    # Per-day count/sum/min/max over all users, kept in step by the writers in
+    # ecosaver.storage; seeded here from the existing rows.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS daily_rollup (
+            date TEXT PRIMARY KEY,
+            n INTEGER NOT NULL,
+            elec_sum REAL NOT NULL,
+            elec_min REAL NOT NULL,
+            elec_max REAL NOT NULL,
+            water_sum INTEGER NOT NULL,
+            water_min INTEGER NOT NULL,
+            water_max INTEGER NOT NULL
+        )""")
+    cur.execute("""
+        INSERT OR REPLACE INTO daily_rollup
+        SELECT date, COUNT(*),
+               SUM(electricity_units), MIN(electricity_units), MAX(electricity_units),
+               SUM(water_liters), MIN(water_liters), MAX(water_liters)
+        FROM usage GROUP BY date""")
+
+
+def _v5_user_trend_stats(cur):
+    # Per-user sufficient statistics for the O(1) trend prediction in
+    # ecosaver.trend_stats; x counts days from the user's anchor date.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_trend_stats (
+            user_id INTEGER PRIMARY KEY,
+            anchor TEXT NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            sx REAL NOT NULL DEFAULT 0,
+            sy REAL NOT NULL DEFAULT 0,
+            sxx REAL NOT NULL DEFAULT 0,
+            sxy REAL NOT NULL DEFAULT 0,
+            last_x REAL,
+            latest REAL
+        )""")
+    cur.execute("""
+        WITH pts AS (
+            SELECT user_id,
+                   MIN(date) OVER w AS anchor,
+                   julianday(date) - julianday(MIN(date) OVER w) AS x,
+                   electricity_units AS y,
+                   FIRST_VALUE(electricity_units) OVER (PARTITION BY user_id ORDER BY date DESC) AS latest
+            FROM usage
+            WINDOW w AS (PARTITION BY user_id)
+        )
+        INSERT OR REPLACE INTO user_trend_stats (user_id, anchor, n, sx, sy, sxx, sxy, last_x, latest)
+        SELECT user_id, MIN(anchor), COUNT(*), SUM(x), SUM(y), SUM(x * x), SUM(x * y), MAX(x), MAX(latest)
+        FROM pts GROUP BY user_id""")
+
+
+def _v6_reading_series(cur):
+    # Append-only per-user readings for the mainapp.py entry point, plus one
+    # head row per user so "latest users" never scans the series.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            ts TEXT NOT NULL,
+            value REAL NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_readings_user_ts ON readings (user_id, ts)")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS series_heads (
+            user_id INTEGER PRIMARY KEY,
+            n INTEGER NOT NULL,
+            last_ts TEXT NOT NULL,
+            last_value REAL NOT NULL,
+            last_id INTEGER NOT NULL
+        )""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_series_heads_last ON series_heads (last_ts, last_id)")
+
+
+def _v7_leaderboard(cur):
+    # Ranked leaderboard maintained by ecosaver.leaderboard. Triggers queue the
+    # users whose readings change; the refresher recomputes only those.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            user_id INTEGER PRIMARY KEY,
+            latest_kwh REAL NOT NULL,
+            pred REAL,
+            score INTEGER NOT NULL,
+            fallback INTEGER NOT NULL DEFAULT 0
+        )""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_leaderboard_rank ON leaderboard (score DESC, user_id)")
+    cur.execute("CREATE TABLE IF NOT EXISTS leaderboard_dirty (user_id INTEGER PRIMARY KEY)")
+    # Not INSERT OR IGNORE: a trigger inherits the conflict policy of the
+    # statement that fired it, and add_usage's upsert would turn IGNORE into ABORT.
+    queue = ("INSERT INTO leaderboard_dirty (user_id) SELECT {user} "
+             "WHERE NOT EXISTS (SELECT 1 FROM leaderboard_dirty WHERE user_id = {user});")
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_usage_insert_leaderboard AFTER INSERT ON usage
+        BEGIN {queue.format(user="NEW.user_id")} END""")
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_usage_update_leaderboard
+        AFTER UPDATE OF user_id, date, electricity_units ON usage
+        BEGIN {queue.format(user="OLD.user_id")} {queue.format(user="NEW.user_id")} END""")
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_usage_delete_leaderboard AFTER DELETE ON usage
+        BEGIN {queue.format(user="OLD.user_id")} END""")
+
+
+def _v8_meter_readings(cur):
+    # Interval (hourly/sub-hourly) meter readings for ecosaver.meters: one
+    # meter per user and kind, raw readings keyed by (meter, epoch second),
+    # and hour/day/month buckets rebuilt for the ranges each ingest touches.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS meters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL CHECK (kind IN ('electricity', 'water')),
+            UNIQUE (user_id, kind),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )""")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS meter_readings (
+            meter_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (meter_id, ts)
+        ) WITHOUT ROWID""")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS meter_rollup (
+            grain TEXT NOT NULL,
+            meter_id INTEGER NOT NULL,
+            start INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            total REAL NOT NULL,
+            min REAL NOT NULL,
+            max REAL NOT NULL,
+            PRIMARY KEY (grain, meter_id, start)
+        ) WITHOUT ROWID""")
+
+
+def _v9_forecast_params(cur):
+    # Fitted forecast parameters per user (ecosaver.forecast), stamped with
+    # the data_version they were fitted at, and the data_version at which
+    # each user's readings last changed (storage.mark_users_changed). A fit
+    # is current while its version is newer.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_params (
+            user_id INTEGER PRIMARY KEY,
+            fit_version INTEGER NOT NULL,
+            last_date TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            dof INTEGER NOT NULL,
+            sigma2 REAL,
+            x_mean REAL NOT NULL,
+            params BLOB NOT NULL
+        )""")
+    cur.execute("CREATE TABLE IF NOT EXISTS usage_changes (user_id INTEGER PRIMARY KEY, version INTEGER NOT NULL)")
+
+
+def _v10_leaderboard_window(cur):
+    # The leaderboard's stored window as two TEXT dates in a one-row table;
+    # meta.value is an INTEGER column. Moves the 'start/end' text out of meta.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS leaderboard_window (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL
+        )""")
+    cur.execute("""
+        INSERT OR REPLACE INTO leaderboard_window (id, start_date, end_date)
+        SELECT 1, substr(value, 1, 10), substr(value, 12) FROM meta
+        WHERE key = 'leaderboard_window' AND value GLOB '????-??-??/????-??-??'""")
+    cur.execute("DELETE FROM meta WHERE key = 'leaderboard_window'")
+
+
+def _v11_user_rollup(cur):
+    # Per-user count/sum/min/max and first/last date over all of a user's
+    # readings, kept in step by the writers; seeded here from the existing rows.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_rollup (
+            user_id INTEGER PRIMARY KEY,
+            n INTEGER NOT NULL,
+            first_date TEXT NOT NULL,
+            last_date TEXT NOT NULL,
+            elec_sum REAL NOT NULL,
+            elec_min REAL NOT NULL,
+            elec_max REAL NOT NULL,
+            water_sum INTEGER NOT NULL,
+            water_min INTEGER NOT NULL,
+            water_max INTEGER NOT NULL
+        )""")
+    cur.execute("""
+        INSERT OR REPLACE INTO user_rollup
+        SELECT user_id, COUNT(*), MIN(date), MAX(date),
+               SUM(electricity_units), MIN(electricity_units), MAX(electricity_units),
+               SUM(water_liters), MIN(water_liters), MAX(water_liters)
+        FROM usage GROUP BY user_id""")
+
+
+# (version, description, function) — append only, never renumber.
+MIGRATIONS = [
+    (1, "canonical usage dates + (user_id, date) and (date) indexes", _v1_usage_date_indexes),
+    (2, "meta table with data_version counter", _v2_meta_data_version),
+    (3, "unique (user_id, date) usage rows", _v3_unique_user_date),
+    (4, "daily_rollup table", _v4_daily_rollup),
+    (5, "user_trend_stats table", _v5_user_trend_stats),
+    (6, "append-only readings series with per-user heads", _v6_reading_series),
+    (7, "leaderboard table with change-tracking triggers", _v7_leaderboard),
+    (8, "interval meter readings with hour/day/month rollups", _v8_meter_readings),
+    (9, "forecast parameters and per-user change versions", _v9_forecast_params),
+    (10, "leaderboard window as TEXT dates", _v10_leaderboard_window),
+    (11, "user_rollup table", _v11_user_rollup),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn) -> int:
+    """Apply all pending migrations and return the resulting schema version."""
+    if schema_version(conn) >= LATEST_VERSION:
+        return LATEST_VERSION
+    if conn.in_transaction:
+        conn.commit()
+    for version, _description, fn in MIGRATIONS:
+        # IMMEDIATE takes the write lock up front, so two processes opening the
+        # same file cannot both apply the same migration.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            fn(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return schema_version(conn)
+
+
+def main(argv=None):
+    from ecosaver.storage import ensure_db
+    from ecosaver.config import DB_FILE
+
+    argv = sys.argv[1:] if argv is None else argv
+    db_file = argv[0] if argv else DB_FILE
+    ensure_db(db_file)
+    conn = sqlite3.connect(db_file)
+    try:
+        print(f"{db_file}: schema version {schema_version(conn)} (latest {LATEST_VERSION})")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# ecosaver/patterns.py
+"""
+Cohort-wide usage pattern detection.
+
+`user_features` reduces a usage frame to one row of per-user features in a
+single grouped pass (sort once by user and date, then slice-wise reductions),
+and every rule in RULES is evaluated on that table as whole-column
+operations. The result is a tidy alerts table: one row per (user, rule) that
+fired, with its severity, value and a readable message.
+
+A rule is a function of the features frame returning (value, severity)
+arrays, where severity is None for users the rule does not flag, plus a
+message template (or one template per severity). Register new rules with
+the `rule` decorator; no per-user code is needed.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from ecosaver.perf import timed
+
+SEVERITIES = ("alert", "warning", "info")  # most severe first
+MIN_HISTORY = 3
+ALERT_COLUMNS = ["username", "rule", "severity", "value", "message"]
+
+FEATURE_COLUMNS = ["n", "latest_elec", "mean_elec", "rising3", "weekend_avg", "weekday_avg",
+                   "latest_water", "latest_hh", "water_per_person"]
+
+Rule = namedtuple("Rule", "name fn message")
+RULES = []
+
+
+def rule(name, message):
+    """
+    Register `fn(features) -> (value, severity)` as a pattern rule. `message`
+    (a template, or a dict of templates by severity) is formatted with the
+    user's features plus `value`.
+    """
+    def register(fn):
+        RULES.append(Rule(name, fn, message))
+        return fn
+    return register
+
+# ---------------------------
+# Features
+# ---------------------------
+def user_features(df, by="username"):
+    """One row per user (first-appearance order) with the FEATURE_COLUMNS the rules read."""
+    if df.empty:
+        return pd.DataFrame(columns=FEATURE_COLUMNS, index=pd.Index([], name=by))
+
+    codes, groups = pd.factorize(df[by], sort=False)
+    dates = df["date"].to_numpy().astype("datetime64[D]")
+    order = np.lexsort((dates, codes))
+    codes, dates = codes[order], dates[order]
+    y = df["electricity_units"].to_numpy(dtype=float)[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)] - 1
+    n = ends - starts + 1
+
+    # Rising over the last three readings; guarded indices stay inside each user.
+    has3 = n >= 3
+    i2, i1 = np.where(has3, ends - 2, ends), np.where(has3, ends - 1, ends)
+    rising3 = has3 & (y[i2] < y[i1]) & (y[i1] < y[ends])
+
+    # datetime64[D] day 0 (1970-01-01) was a Thursday: weekday = (days + 3) % 7.
+    weekend = ((dates.astype(np.int64) + 3) % 7) >= 5
+    we_n = np.add.reduceat(weekend.astype(float), starts)
+    we_sum = np.add.reduceat(np.where(weekend, y, 0.0), starts)
+    total = np.add.reduceat(y, starts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weekend_avg = np.where(we_n > 0, we_sum / we_n, np.nan)
+        weekday_avg = np.where(n - we_n > 0, (total - we_sum) / (n - we_n), np.nan)
+
+    latest_water = df["water_liters"].to_numpy(dtype=float)[order][ends]
+    if "household_size" in df.columns:
+        hh = df["household_size"].to_numpy(dtype=float)[order][ends]
+        latest_hh = np.where(np.isnan(hh) | (hh == 0), 1.0, hh)
+    else:
+        latest_hh = np.full(len(starts), np.nan)
+
+    return pd.DataFrame({
+        "n": n,
+        "latest_elec": y[ends],
+        "mean_elec": total / n,
+        "rising3": rising3,
+        "weekend_avg": weekend_avg,
+        "weekday_avg": weekday_avg,
+        "latest_water": latest_water,
+        "latest_hh": latest_hh,
+        "water_per_person": latest_water / latest_hh,
+    }, index=pd.Index(groups[codes[starts]], name=by))
+
+# ---------------------------
+# Rules
+# ---------------------------
+def _flag(mask, severity):
+    return np.where(mask, severity, None)
+
+@rule("rising_trend", "Rising electricity trend over last 3 days")
+def _rising_trend(f):
+    return f["latest_elec"].to_numpy(), _flag(f["rising3"].to_numpy(), "warning")
+
+@rule("spike", "Sudden electricity spike: {latest_elec:g} units (mean {mean_elec:.2f})")
+def _spike(f):
+    value = f["latest_elec"].to_numpy()
+    return value, _flag(value > f["mean_elec"].to_numpy() * 1.5, "alert")
+
+@rule("weekend_usage", "Higher usage on weekends ({weekend_avg:.1f} units) vs weekdays ({weekday_avg:.1f})")
+def _weekend_usage(f):
+    we, wd = f["weekend_avg"].to_numpy(), f["weekday_avg"].to_numpy()
+    with np.errstate(invalid="ignore"):
+        return we / wd, _flag(we > wd * 1.25, "info")  # NaN compares False
+
+@rule("water_per_person", {"alert": "High water per-person: {value:.0f} L/person (threshold 150 L)",
+                           "info": "Moderate water per-person: {value:.0f} L/person"})
+def _water_per_person(f):
+    value = f["water_per_person"].to_numpy()
+    with np.errstate(invalid="ignore"):
+        return value, np.select([value > 150, value > 100], ["alert", "info"], None)
+
+# ---------------------------
+# Engine
+# ---------------------------
+@timed()
+def detect_alerts(df, rules=None, by="username"):
+    """
+    Evaluate `rules` (default: RULES) for every user in `df` and return the
+    alerts as a frame with ALERT_COLUMNS, most severe first. Users with
+    fewer than MIN_HISTORY readings are not checked.
+    """
+    feats = user_features(df, by)
+    feats = feats[feats["n"] >= MIN_HISTORY]
+    rules = rules or RULES
+    templates = {r.name: r.message for r in rules}
+    frames = []
+    for r in rules:
+        value, severity = r.fn(feats)
+        hit = pd.notna(severity)
+        if hit.any():
+            frames.append(pd.DataFrame({
+                "username": feats.index[hit], "rule": r.name,
+                "severity": severity[hit].astype(str), "value": np.asarray(value, dtype=float)[hit],
+            }))
+    if not frames:
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+
+    alerts = pd.concat(frames, ignore_index=True)
+    # Messages are formatted only for the rows that fired.
+    ctx = feats.loc[alerts["username"]].reset_index(drop=True)
+    alerts["message"] = [(t[s] if isinstance(t, dict) else t).format(value=v, **row)
+                         for t, v, s, row in zip(alerts["rule"].map(templates), alerts["value"],
+                                                 alerts["severity"], ctx.to_dict("records"))]
+    rank = alerts["severity"].map({s: i for i, s in enumerate(SEVERITIES)})
+    alerts = alerts.assign(_rank=rank).sort_values(["_rank", "username", "rule"], kind="stable")
+    return alerts[ALERT_COLUMNS].rename(columns={"username": by}).reset_index(drop=True)
@@ -0,0 +1,224 @@
+# ecosaver/perf.py
+"""
+Lightweight timing instrumentation: spans, counters and SQL statement stats.
+
+A recorder is active per thread between `start_run` and `end_run` (one
+dashboard rerun, one CLI call). While none is active every hook returns on
+its first check, so instrumented code pays one thread-local lookup.
+
+    perf.start_run("rerun")
+    with perf.span("leaderboard"):
+        ...
+    rec = perf.end_run()          # appends one JSON line to the metrics log
+
+`@timed("name")` wraps a function in a span; `section("name")` times
+consecutive script sections without nesting blocks; connections made with
+TracedConnection (storage.get_conn does) time every statement and count
+its rows. Set ECOSAVER_PERF=1 to record every dashboard rerun.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+ENV_VAR = "ECOSAVER_PERF"
+METRICS_LOG = os.path.join("data", "metrics.jsonl")
+MAX_LOG_BYTES = 5 * 2**20  # rotated to <log>.1 beyond this
+
+_local = threading.local()
+_NULL = nullcontext()
+_log_lock = threading.Lock()
+
+
+def enabled_by_env() -> bool:
+    return os.environ.get(ENV_VAR, "") not in ("", "0")
+
+def current():
+    """The calling thread's active Recorder, or None."""
+    return getattr(_local, "rec", None)
+
+class Recorder:
+    def __init__(self, label: str):
+        self.label = label
+        self.t0 = time.perf_counter()
+        self.total_ms = None
+        self.spans = []      # [name, start ms, duration ms, depth]
+        self.counters = {}
+        self.sql = {}        # statement -> [calls, ms, rows]
+        self.depth = 0
+        self.section = None
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def sql_stat(self, sql):
+        key = " ".join(sql.split())[:160]
+        stat = self.sql.get(key)
+        if stat is None:
+            stat = self.sql[key] = [0, 0.0, 0]
+        return stat
+
+    def to_dict(self):
+        return {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "label": self.label,
+            "total_ms": self.total_ms,
+            "spans": [{"name": n, "start_ms": round(s, 3), "ms": round(d, 3), "depth": depth}
+                      for n, s, d, depth in self.spans],
+            "counters": self.counters,
+            "sql": [{"sql": k, "calls": c, "ms": round(ms, 3), "rows": r}
+                    for k, (c, ms, r) in sorted(self.sql.items(), key=lambda kv: -kv[1][1])],
+        }
+
+# ---------------------------
+# Runs
+# ---------------------------
+def start_run(label: str = "run") -> Recorder:
+    rec = _local.rec = Recorder(label)
+    return rec
+
+def end_run(log_file: str = METRICS_LOG):
+    """Stop the thread's recorder, append it to `log_file` (None: don't) and return it."""
+    rec = current()
+    if rec is None:
+        return None
+    if rec.section is not None:
+        rec.section.__exit__(None, None, None)
+        rec.section = None
+    _local.rec = None
+    rec.total_ms = (time.perf_counter() - rec.t0) * 1000
+    if log_file:
+        write_metrics(rec, log_file)
+    return rec
+
+def write_metrics(rec: Recorder, log_file: str = METRICS_LOG):
+    line = json.dumps(rec.to_dict()) + "\n"
+    with _log_lock:
+        log_dir = os.path.dirname(log_file)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        if os.path.exists(log_file) and os.path.getsize(log_file) + len(line) > MAX_LOG_BYTES:
+            os.replace(log_file, log_file + ".1")
+        with open(log_file, "a", encoding="utf-8") as f:
+            f.write(line)
+
+# ---------------------------
+# Spans & counters
+# ---------------------------
+class _Span:
+    __slots__ = ("rec", "name", "t0")
+
+    def __init__(self, rec, name):
+        self.rec, self.name = rec, name
+
+    def __enter__(self):
+        self.rec.depth += 1
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        t1 = time.perf_counter()
+        rec = self.rec
+        rec.depth -= 1
+        rec.spans.append([self.name, (self.t0 - rec.t0) * 1000, (t1 - self.t0) * 1000, rec.depth])
+        return False
+
+def span(name: str):
+    """Context manager timing a block (a no-op without an active recorder)."""
+    rec = getattr(_local, "rec", None)
+    return _NULL if rec is None else _Span(rec, name)
+
+def timed(name: str = None):
+    """Decorator: time every call of the function as a span named `name` (default: qualified name)."""
+    def wrap(fn):
+        label = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__qualname__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            rec = getattr(_local, "rec", None)
+            if rec is None:
+                return fn(*args, **kwargs)
+            with _Span(rec, label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return wrap
+
+def count(name: str, n: int = 1):
+    rec = getattr(_local, "rec", None)
+    if rec is not None:
+        rec.count(name, n)
+
+def section(name: str):
+    """End the current top-level section (if any) and start timing `name`."""
+    rec = getattr(_local, "rec", None)
+    if rec is None:
+        return
+    if rec.section is not None:
+        rec.section.__exit__(None, None, None)
+    rec.section = _Span(rec, f"section.{name}").__enter__()
+
+# ---------------------------
+# SQL tracing
+# ---------------------------
+class TracedCursor(sqlite3.Cursor):
+    """Times statements and counts the rows fetched (or changed) while a recorder is active."""
+
+    def execute(self, sql, parameters=()):
+        rec = getattr(_local, "rec", None)
+        if rec is None:
+            return super().execute(sql, parameters)
+        self._stat = stat = rec.sql_stat(sql)
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            stat[0] += 1
+            stat[1] += (time.perf_counter() - t0) * 1000
+            stat[2] += max(self.rowcount, 0)
+
+    def executemany(self, sql, seq_of_parameters):
+        rec = getattr(_local, "rec", None)
+        if rec is None:
+            return super().executemany(sql, seq_of_parameters)
+        stat = rec.sql_stat(sql)
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            stat[0] += 1
+            stat[1] += (time.perf_counter() - t0) * 1000
+            stat[2] += max(self.rowcount, 0)
+
+    def _fetched(self, fn, *args):
+        stat = getattr(self, "_stat", None)
+        if stat is None or getattr(_local, "rec", None) is None:
+            return fn(*args)
+        t0 = time.perf_counter()
+        rows = fn(*args)
+        stat[1] += (time.perf_counter() - t0) * 1000
+        stat[2] += len(rows) if isinstance(rows, list) else rows is not None
+        return rows
+
+    def fetchone(self):
+        return self._fetched(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetched(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._fetched(super().fetchall)
+
+class TracedConnection(sqlite3.Connection):
+    """sqlite3 connection whose statements go through TracedCursor (rows read by iteration are not counted)."""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
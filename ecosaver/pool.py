@@ -0,0 +1,226 @@
+# ecosaver/pool.py
+"""
+Concurrency-safe access to the EcoSaver database for multi-session front ends.
+
+`Database` hands out reader connections from a bounded pool (at most
+`max_readers` open, each used by one thread at a time) and funnels every
+write through one writer thread. The writer drains its queue into a single
+transaction per batch, so N concurrent writes cost one commit; each write
+runs in its own savepoint, so a failing write is rolled back alone and
+reported through its future. Connections come from storage.get_conn, so
+the file is in WAL mode and readers never block on the writer.
+
+    db = Database()
+    with db.reader() as conn:
+        users = get_user_list(conn)
+    db.add_usage("asha", "2024-05-01", 4.2, 180, 3)   # waits for the commit
+"""
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from ecosaver import perf
+from ecosaver.config import DB_FILE
+from ecosaver.storage import get_conn, write_user, write_usage
+
+MAX_READERS = 8
+MAX_BATCH = 256
+# How long the writer lingers for more work before committing a batch.
+BATCH_WAIT_SECONDS = 0.002
+
+_STOP = object()
+
+
+class Database:
+    def __init__(self, db_file: str = DB_FILE, max_readers: int = MAX_READERS,
+                 max_batch: int = MAX_BATCH, batch_wait: float = BATCH_WAIT_SECONDS):
+        self.db_file = db_file
+        self.max_readers = max_readers
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait
+        self._idle = queue.LifoQueue()  # most recently used first: warm page cache
+        self._slots = threading.BoundedSemaphore(max_readers)
+        self._readers = []
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._closed = False
+        get_conn(db_file).close()  # create / migrate before any thread touches the file
+        self._writer = threading.Thread(target=self._write_loop, daemon=True, name="ecosaver-writer")
+        self._writer.start()
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+    def _open_reader(self):
+        conn = get_conn(self.db_file)
+        conn.execute("PRAGMA query_only = ON")
+        with self._lock:
+            self._readers.append(conn)
+        return conn
+
+    @contextmanager
+    def reader(self, timeout: float = None):
+        """
+        Check out a read-only connection for the calling thread; blocks while
+        all `max_readers` are in use (TimeoutError after `timeout` seconds).
+        """
+        if self._closed:
+            raise RuntimeError("Database is closed")
+        with perf.span("pool.reader_wait"):
+            acquired = self._slots.acquire(timeout=timeout)
+        if not acquired:
+            raise TimeoutError(f"No reader connection free after {timeout}s")
+        if self._closed:  # closed while this thread waited
+            self._slots.release()
+            raise RuntimeError("Database is closed")
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open_reader()
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def _acquire_all(self, timeout):
+        """Take every reader slot, i.e. wait until no reader is checked out."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for taken in range(self.max_readers):
+            left = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self._slots.acquire(timeout=left):
+                for _ in range(taken):
+                    self._slots.release()
+                raise TimeoutError(f"{self.max_readers - taken} reader connections still in use after {timeout}s")
+
+    @contextmanager
+    def drained(self, timeout: float = None):
+        """
+        Wait until no reader is checked out and hold new checkouts back until
+        the block ends; yields the open reader connections (idle, so the
+        caller may use them, e.g. to DETACH a file that is about to go away).
+        """
+        self._acquire_all(timeout)
+        try:
+            with self._lock:
+                readers = list(self._readers)
+            yield readers
+        finally:
+            for _ in range(self.max_readers):
+                self._slots.release()
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+    def submit(self, fn, *args) -> Future:
+        """
+        Queue `fn(conn, *args)` for the writer thread. It runs inside the
+        batch's transaction and must not commit. The future resolves with
+        its return value once the batch has committed.
+        """
+        if self._closed:
+            raise RuntimeError("Database is closed")
+        fut = Future()
+        self._jobs.put((fut, fn, args))
+        return fut
+
+    def write(self, fn, *args, timeout: float = None):
+        """submit() and wait for the commit; re-raises the write's exception."""
+        with perf.span("pool.write"):  # queueing, the batch and its commit
+            return self.submit(fn, *args).result(timeout)
+
+    def add_user(self, username: str) -> int:
+        return self.write(write_user, username)
+
+    def add_usage(self, username: str, date_str: str, elec: float, water: int, hh_size: int):
+        return self.write(_write_user_usage, username, date_str, elec, water, hh_size)
+
+    def _next_batch(self):
+        batch = [self._jobs.get()]
+        while len(batch) < self.max_batch and batch[-1] is not _STOP:
+            try:
+                batch.append(self._jobs.get(timeout=self.batch_wait))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_loop(self):
+        # Autocommit mode: transactions and savepoints are issued explicitly.
+        conn = get_conn(self.db_file, isolation_level=None)
+        try:
+            while True:
+                batch = self._next_batch()
+                stop = batch[-1] is _STOP
+                jobs = batch[:-1] if stop else batch
+                if jobs:
+                    self._run_batch(conn, jobs)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _run_batch(self, conn, jobs):
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fut, fn, args in jobs:
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT job")
+                try:
+                    results.append((fut, fn(conn, *args), None))
+                    conn.execute("RELEASE job")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    results.append((fut, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            try:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            # Fail every job of the batch, including those not started when
+            # BEGIN or a statement failed, so no caller waits forever and the
+            # writer thread lives on.
+            for fut, _fn, _args in jobs:
+                if not fut.done() and (fut.running() or fut.set_running_or_notify_cancel()):
+                    fut.set_exception(e)
+            return
+        for fut, value, error in results:
+            if error is None:
+                fut.set_result(value)
+            else:
+                fut.set_exception(error)
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+    def close(self, timeout: float = None):
+        """
+        Stop accepting reads and writes, finish queued writes, wait for the
+        readers other threads have checked out to come back (TimeoutError
+        after `timeout` seconds) and close every connection.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._jobs.put(_STOP)
+        self._writer.join()
+        self._acquire_all(timeout)  # kept: the pool hands out nothing after this
+        with self._lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+
+
+def _write_user_usage(conn, username, date_str, elec, water, hh_size):
+    write_usage(conn, write_user(conn, username), date_str, elec, water, hh_size)
@@ -0,0 +1,163 @@
+# ecosaver/rollups.py
+"""
+Daily rollups of the usage table for the aggregated "All users" views.
+
+`daily_rollup` holds one row per date with the reading count and the sum,
+min and max of electricity and water; `user_rollup` holds the same per user,
+plus the user's first and last date. Writers call `refresh_daily_rollup`
+and `refresh_user_rollup` inside their own transaction for the dates and
+users they touched, so the rollups commit (or roll back) together with the
+raw rows. A reading is unique per (user_id, date), so the usage row itself
+is the per-user-per-day rollup.
+
+Usage:  python -m ecosaver.rollups [--db data/techforge_eco.db]   (rebuild from raw rows)
+"""
+import argparse
+import sys
+import time
+
+from ecosaver.config import DB_FILE, DEFAULT_HISTORY_DAYS
+from ecosaver.perf import timed
+
+ROLLUP_COLUMNS = ["date", "n", "elec_sum", "elec_min", "elec_max",
+                  "water_sum", "water_min", "water_max"]
+
+_AGGREGATE_SQL = """
+    SELECT date, COUNT(*),
+           SUM(electricity_units), MIN(electricity_units), MAX(electricity_units),
+           SUM(water_liters), MIN(water_liters), MAX(water_liters)
+    FROM usage
+"""
+
+USER_ROLLUP_COLUMNS = ["user_id", "n", "first_date", "last_date", "elec_sum", "elec_min", "elec_max",
+                       "water_sum", "water_min", "water_max"]
+
+_USER_AGGREGATE_SQL = """
+    SELECT user_id, COUNT(*), MIN(date), MAX(date),
+           SUM(electricity_units), MIN(electricity_units), MAX(electricity_units),
+           SUM(water_liters), MIN(water_liters), MAX(water_liters)
+    FROM usage
+"""
+
+# Stay well under SQLite's bound-parameter limit.
+_MAX_PARAMS = 500
+
+
+# ---------------------------
+# Maintenance
+# ---------------------------
+def refresh_daily_rollup(conn, dates):
+    """
+    Recompute the rollup rows for `dates` from the usage table.
+
+    Runs in the caller's transaction and does not commit. Each date is an
+    idx_usage_date range lookup; recomputing (rather than adding a delta)
+    keeps min/max exact when an upsert replaces an earlier reading.
+    """
+    dates = sorted(set(dates))
+    for i in range(0, len(dates), _MAX_PARAMS):
+        chunk = dates[i:i + _MAX_PARAMS]
+        marks = ",".join("?" * len(chunk))
+        conn.execute(f"DELETE FROM daily_rollup WHERE date IN ({marks})", chunk)
+        conn.execute(f"INSERT INTO daily_rollup ({', '.join(ROLLUP_COLUMNS)}) "
+                     f"{_AGGREGATE_SQL} WHERE date IN ({marks}) GROUP BY date", chunk)
+
+def refresh_user_rollup(conn, user_ids):
+    """
+    Recompute the user_rollup rows of `user_ids` from the usage table, in the
+    caller's transaction. Each user is an idx_usage_user_date range lookup.
+    """
+    user_ids = sorted(set(user_ids))
+    for i in range(0, len(user_ids), _MAX_PARAMS):
+        chunk = user_ids[i:i + _MAX_PARAMS]
+        marks = ",".join("?" * len(chunk))
+        conn.execute(f"DELETE FROM user_rollup WHERE user_id IN ({marks})", chunk)
+        conn.execute(f"INSERT INTO user_rollup ({', '.join(USER_ROLLUP_COLUMNS)}) "
+                     f"{_USER_AGGREGATE_SQL} WHERE user_id IN ({marks}) GROUP BY user_id", chunk)
+
+def rebuild_rollups(conn) -> int:
+    """Repair: drop every rollup row and recompute from raw usage. Returns days written."""
+    with conn:
+        conn.execute("DELETE FROM daily_rollup")
+        conn.execute(f"INSERT INTO daily_rollup ({', '.join(ROLLUP_COLUMNS)}) "
+                     f"{_AGGREGATE_SQL} GROUP BY date")
+        conn.execute("DELETE FROM user_rollup")
+        conn.execute(f"INSERT INTO user_rollup ({', '.join(USER_ROLLUP_COLUMNS)}) "
+                     f"{_USER_AGGREGATE_SQL} GROUP BY user_id")
+    return conn.execute("SELECT COUNT(*) FROM daily_rollup").fetchone()[0]
+
+# ---------------------------
+# Reads
+# ---------------------------
+def window_start(conn, table="usage"):
+    """
+    First day ('YYYY-MM-DD', or None when `table` is empty) of load_usage_df's
+    default window: DEFAULT_HISTORY_DAYS back from the latest stored date.
+    """
+    row = conn.execute(f"SELECT date(MAX(date), ?) FROM {table}",
+                       (f"-{DEFAULT_HISTORY_DAYS} days",)).fetchone()
+    return row[0]
+
+@timed()
+def load_daily_rollup(conn, start_date=None):
+    """
+    Rollup rows from `start_date` on (default: the same history window as
+    load_usage_df), in date order, with electricity/water means added.
+    """
+    import pandas as pd
+
+    if start_date is None:
+        start_date = window_start(conn, "daily_rollup")
+    df = pd.read_sql_query(f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM daily_rollup "
+                           "WHERE date >= ? ORDER BY date", conn,
+                           params=[start_date or ""], parse_dates=["date"])
+    df["electricity_units"] = df["elec_sum"] / df["n"]
+    df["water_liters"] = df["water_sum"] / df["n"]
+    return df
+
+@timed()
+def load_user_summary(conn, start_date=None):
+    """
+    Per-user reading count and mean kWh / water from `start_date` on
+    (default: the load_usage_df history window).
+    Returns [(username, records, avg_kwh, avg_water)] ordered by username.
+
+    Users whose first reading is inside the window are read straight from
+    user_rollup; only users with older history are aggregated from their
+    idx_usage_user_date range.
+    """
+    if start_date is None:
+        start_date = window_start(conn)
+    return conn.execute("""
+        SELECT us.username, r.n, r.elec_sum / r.n, r.water_sum * 1.0 / r.n
+        FROM user_rollup r JOIN users us ON r.user_id = us.id
+        WHERE r.first_date >= :start
+        UNION ALL
+        SELECT us.username, COUNT(*), AVG(u.electricity_units), AVG(u.water_liters)
+        FROM user_rollup r JOIN users us ON r.user_id = us.id
+        JOIN usage u ON u.user_id = r.user_id AND u.date >= :start
+        WHERE r.first_date < :start AND r.last_date >= :start
+        GROUP BY r.user_id
+        ORDER BY 1
+    """, {"start": start_date or ""}).fetchall()
+
+def main(argv=None):
+    from ecosaver.storage import get_conn
+
+    parser = argparse.ArgumentParser(description="Rebuild the EcoSaver daily rollups from raw usage rows.")
+    parser.add_argument("--db", default=DB_FILE, help=f"SQLite file (default: {DB_FILE})")
+    args = parser.parse_args(argv)
+
+    conn = get_conn(args.db)
+    t0 = time.perf_counter()
+    try:
+        days = rebuild_rollups(conn)
+        users = conn.execute("SELECT COUNT(*) FROM user_rollup").fetchone()[0]
+    finally:
+        conn.close()
+    print(f"Rebuilt {days} daily and {users} user rollup rows in {args.db} in {time.perf_counter() - t0:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+# ecosaver/scoring.py
+"""
+EcoScore and the per-user leaderboard.
+"""
+
+
+def eco_score(latest, predicted):
+    if predicted is None or predicted == 0:
+        return 50
+    diff = predicted - latest
+    pct = diff / predicted
+    s = 50 + (pct * 50)
+    return int(round(max(0, min(100, s))))
+
+def compute_leaderboard(df, value_col="electricity_units"):
+    """
+    Rank users in `df` by EcoScore of their latest reading against their
+    next-day trend prediction. Users with too little history fall back to the
+    global trend of `df` (computed once), or to their own latest value.
+    """
+    import pandas as pd
+
+    from ecosaver.trends import batch_linear_trends, global_trend_predict
+
+    trends = batch_linear_trends(df, value_col)
+    if trends.empty:
+        return pd.DataFrame(columns=["username", "score", "latest_kWh", "pred"])
+
+    pred = trends["pred"]
+    if pred.isna().any():
+        fallback = global_trend_predict(df, value_col)
+        pred = pred.fillna(fallback) if fallback else pred.fillna(trends["latest"])
+
+    lb = pd.DataFrame({
+        "username": trends.index,
+        "score": [eco_score(l, p) for l, p in zip(trends["latest"], pred)],
+        "latest_kWh": trends["latest"].astype(float).to_numpy(),
+        "pred": pred.astype(float).round(2).to_numpy(),
+    })
+    return lb.sort_values("score", ascending=False).reset_index(drop=True)
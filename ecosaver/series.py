@@ -0,0 +1,145 @@
+# ecosaver/series.py
+"""
+Append-only per-user reading series, the store behind mainapp.py.
+
+Readings are only ever inserted, indexed by (user_id, ts). `series_heads`
+keeps each user's count and newest reading, so "latest N users" is an index
+walk over the heads and "last N readings" an index walk over one user's
+series; neither touches other users' data.
+
+`import_shelve` is the one-time migration from the old shelve file ("DB").
+
+Usage:  python -m ecosaver.series --shelve DB [--db data/techforge_eco.db]
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from ecosaver.config import DB_FILE
+from ecosaver.storage import get_conn, bump_data_version, write_user
+
+SHELVE_IMPORT_KEY = "shelve_import"
+
+
+def _now():
+    return datetime.utcnow().isoformat(timespec="seconds")
+
+def _append(conn, user_id, ts, value):
+    # Caller holds the transaction.
+    rid = conn.execute("INSERT INTO readings (user_id, ts, value) VALUES (?, ?, ?)",
+                       (user_id, ts, value)).lastrowid
+    conn.execute("""
+        INSERT INTO series_heads (user_id, n, last_ts, last_value, last_id) VALUES (?, 1, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            n = n + 1,
+            last_value = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last_value ELSE last_value END,
+            last_id = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last_id ELSE last_id END,
+            last_ts = MAX(last_ts, excluded.last_ts)
+    """, (user_id, ts, value, rid))
+    return rid
+
+# ---------------------------
+# Writes
+# ---------------------------
+def write_reading(conn, username: str, value: float, ts: str = None) -> int:
+    """append_reading in the caller's transaction, e.g. as a pool.Database write job."""
+    return _append(conn, write_user(conn, username), ts or _now(), float(value))
+
+def append_reading(conn, username: str, value: float, ts: str = None) -> int:
+    """Append one reading (default timestamp: now, UTC) and return its id."""
+    with conn:
+        return write_reading(conn, username, value, ts)
+
+def import_shelve(conn, path: str = "DB", force: bool = False) -> int:
+    """
+    Copy every series from a shelve file into `readings`, once.
+
+    Shelf values may be a list of numbers, (timestamp, value) pairs or dicts
+    with a "value" key; a bare value gets the import time, and list order is
+    kept through the reading id. Entries that are not numeric are skipped.
+    The import is recorded in meta and not repeated unless `force`.
+    Returns the number of readings imported.
+    """
+    import shelve
+
+    done = conn.execute("SELECT value FROM meta WHERE key = ?", (SHELVE_IMPORT_KEY,)).fetchone()
+    if done and not force:
+        return 0
+    with shelve.open(path, flag="r") as shelf:
+        series = {str(k).strip().lower(): v for k, v in shelf.items()}
+
+    now = _now()
+    count = 0
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO users (username, created_at) VALUES (?, ?)",
+                         [(name, now) for name in series])
+        ids = dict((name, uid) for uid, name in conn.execute("SELECT id, username FROM users"))
+        for name, values in series.items():
+            if not isinstance(values, (list, tuple)):
+                values = [values]
+            for item in values:
+                ts, value = now, item
+                if isinstance(item, dict):
+                    ts, value = str(item.get("ts") or item.get("date") or now), item.get("value")
+                elif isinstance(item, (list, tuple)) and len(item) == 2:
+                    ts, value = str(item[0]), item[1]
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    continue
+                _append(conn, ids[name], ts, value)
+                count += 1
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (SHELVE_IMPORT_KEY, count))
+        bump_data_version(conn)  # new users appear in the dashboard's user list
+    return count
+
+# ---------------------------
+# Reads
+# ---------------------------
+def last_readings(conn, username: str, n: int = 10):
+    """The user's newest `n` readings as [(ts, value)], oldest first."""
+    rows = conn.execute("""
+        SELECT r.ts, r.value FROM readings r JOIN users us ON r.user_id = us.id
+        WHERE us.username = ?
+        ORDER BY r.ts DESC, r.id DESC LIMIT ?
+    """, (username.strip().lower(), int(n))).fetchall()
+    return rows[::-1]
+
+def readings_between(conn, username: str, start: str, end: str):
+    """[(ts, value)] with start <= ts <= end, in time order."""
+    return conn.execute("""
+        SELECT r.ts, r.value FROM readings r JOIN users us ON r.user_id = us.id
+        WHERE us.username = ? AND r.ts BETWEEN ? AND ?
+        ORDER BY r.ts, r.id
+    """, (username.strip().lower(), start, end)).fetchall()
+
+def latest_users(conn, n: int = 4):
+    """The `n` users with the newest readings: [(username, last_ts, last_value, count)], newest first."""
+    return conn.execute("""
+        SELECT us.username, h.last_ts, h.last_value, h.n
+        FROM series_heads h JOIN users us ON h.user_id = us.id
+        ORDER BY h.last_ts DESC, h.last_id DESC LIMIT ?
+    """, (int(n),)).fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import the old mainapp.py shelve file into the readings store.")
+    parser.add_argument("--shelve", default="DB", help="Shelve file to import (default: DB)")
+    parser.add_argument("--db", default=DB_FILE, help=f"SQLite file (default: {DB_FILE})")
+    parser.add_argument("--force", action="store_true", help="Import again even if already imported")
+    args = parser.parse_args(argv)
+
+    conn = get_conn(args.db)
+    try:
+        n = import_shelve(conn, args.shelve, args.force)
+    except Exception as e:  # dbm raises its own error types per backend
+        print(f"error: cannot read {args.shelve}: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    print(f"Imported {n} readings from {args.shelve} into {args.db}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
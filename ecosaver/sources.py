@@ -0,0 +1,120 @@
+# ecosaver/sources.py
+"""
+Per-source storage: one SQLite file per data source (config.DATA_SOURCES).
+
+Each source file has the full schema, so load_usage_df, the rollups, the
+leaderboard and the predictions run unchanged against the connection of the
+selected source and never touch another source's rows. Cross-source queries
+ATTACH the other file to an existing connection on demand and join across
+schemas in place; nothing is copied.
+
+Usage:  python -m ecosaver.sources [--a home] [--b school] [--start YYYY-MM-DD]   (print the comparison)
+"""
+import argparse
+import sys
+from datetime import date, timedelta
+
+from ecosaver.config import DATA_SOURCES, DEFAULT_SOURCE, DEFAULT_HISTORY_DAYS
+from ecosaver.perf import timed
+from ecosaver.storage import ensure_db, get_conn, to_date_str
+
+COMPARE_COLUMNS = ["username", "records", "kwh", "water", "other_records", "other_kwh", "other_water"]
+
+
+def source_db_file(source: str = DEFAULT_SOURCE) -> str:
+    try:
+        return DATA_SOURCES[source.strip().lower()]
+    except KeyError:
+        raise ValueError(f"Unknown data source {source!r}; expected one of {list(DATA_SOURCES)}") from None
+
+def get_source_conn(source: str = DEFAULT_SOURCE, **kwargs):
+    """get_conn for the source's file (created with the full schema if missing)."""
+    return get_conn(source_db_file(source), **kwargs)
+
+def attach_source(conn, source: str) -> str:
+    """
+    ATTACH the source's file to `conn` as schema `source` (once per
+    connection) and return the schema name. Must run outside a transaction.
+    """
+    source = source.strip().lower()
+    path = source_db_file(source)
+    if source not in {row[1] for row in conn.execute("PRAGMA database_list")}:
+        ensure_db(path)
+        # The schema name is a DATA_SOURCES key, never user text.
+        conn.execute(f"ATTACH DATABASE ? AS {source}", (path,))
+    return source
+
+def detach_source(conn, source: str):
+    """DETACH schema `source` from `conn` if it is attached. Must run outside a transaction."""
+    source = source.strip().lower()
+    if source in {row[1] for row in conn.execute("PRAGMA database_list")}:
+        conn.execute(f"DETACH DATABASE {source}")
+
+_COMPARE_SQL = """
+    WITH a AS ({side_a}), b AS ({side_b})
+    SELECT a.username, a.n, a.kwh, a.water, b.n, b.kwh, b.water
+    FROM a LEFT JOIN b ON b.username = a.username
+    UNION ALL
+    SELECT b.username, NULL, NULL, NULL, b.n, b.kwh, b.water
+    FROM b WHERE b.username NOT IN (SELECT username FROM a)
+    ORDER BY 1
+"""
+
+_SIDE_SQL = """
+    SELECT us.username AS username, COUNT(*) AS n,
+           AVG(u.electricity_units) AS kwh, AVG(u.water_liters) AS water
+    FROM {schema}.usage u JOIN {schema}.users us ON u.user_id = us.id
+    WHERE u.date >= :start AND u.date <= :end
+    GROUP BY us.username
+"""
+
+@timed()
+def compare_sources(conn, other: str = "school", start_date=None, end_date=None):
+    """
+    Per-student averages in `conn`'s source next to those in source `other`,
+    from `start_date` to `end_date`. The default is load_usage_df's window:
+    DEFAULT_HISTORY_DAYS back from, and up to, the latest date stored in
+    either source.
+
+    `other` is attached to `conn`. Each side is aggregated over its own
+    idx_usage_date range and the two are joined by username. Returns rows in
+    COMPARE_COLUMNS order, with None for a side the student has no readings in.
+    """
+    other_schema = attach_source(conn, other)
+    latest = conn.execute(f"""
+        SELECT MAX(d) FROM (SELECT MAX(date) AS d FROM main.usage
+                            UNION ALL SELECT MAX(date) FROM {other_schema}.usage)
+    """).fetchone()[0]
+    latest = date.fromisoformat(latest) if latest else date.today()
+    start = to_date_str(start_date or latest - timedelta(days=DEFAULT_HISTORY_DAYS))
+    end = to_date_str(end_date or latest)
+    sql = _COMPARE_SQL.format(side_a=_SIDE_SQL.format(schema="main"),
+                              side_b=_SIDE_SQL.format(schema=other_schema))
+    return conn.execute(sql, {"start": start, "end": end}).fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare per-student usage between two EcoSaver data sources.")
+    parser.add_argument("--a", default="home", choices=list(DATA_SOURCES))
+    parser.add_argument("--b", default="school", choices=list(DATA_SOURCES))
+    parser.add_argument("--start", type=date.fromisoformat, help="First day (default: 30 days before the latest reading)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day (default: the latest reading)")
+    args = parser.parse_args(argv)
+
+    conn = get_source_conn(args.a)
+    try:
+        rows = compare_sources(conn, args.b, args.start, args.end)
+    finally:
+        conn.close()
+
+    def fmt(v, spec):
+        return format(v, spec) if v is not None else "-"
+
+    print(f"{'username':20} {args.a + ' kWh':>12} {args.b + ' kWh':>12} {args.a + ' L':>10} {args.b + ' L':>10}")
+    for user, _an, akwh, awater, _bn, bkwh, bwater in rows:
+        print(f"{user:20} {fmt(akwh, '.2f'):>12} {fmt(bkwh, '.2f'):>12} {fmt(awater, '.0f'):>10} {fmt(bwater, '.0f'):>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
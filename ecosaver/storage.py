@@ -0,0 +1,287 @@
+# ecosaver/storage.py
+"""
+SQLite storage helpers for users and daily usage rows.
+
+Writes only need the standard library; pandas and numpy are imported by the
+functions that return frames or generate demo data.
+"""
+import os
+import sqlite3
+from datetime import date, timedelta, datetime
+
+from ecosaver.config import DB_FILE, DATE_FMT, DEFAULT_HISTORY_DAYS
+from ecosaver.migrations import migrate
+from ecosaver import perf
+from ecosaver.perf import TracedConnection, timed
+from ecosaver.rollups import refresh_daily_rollup, refresh_user_rollup
+from ecosaver.trend_stats import apply_reading, refresh_user_stats
+
+
+# ---------------------------
+# Database helpers
+# ---------------------------
+@timed()
+def ensure_db(db_file: str = DB_FILE):
+    db_dir = os.path.dirname(db_file)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    conn = sqlite3.connect(db_file)
+    cur = conn.cursor()
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        created_at TEXT
+    )""")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS usage (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        electricity_units REAL NOT NULL,
+        water_liters INTEGER NOT NULL,
+        household_size INTEGER NOT NULL,
+        created_at TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )""")
+    conn.commit()
+    migrate(conn)
+    # WAL is a property of the file: readers no longer wait for a writer's commit.
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+
+# Per-connection settings. synchronous=NORMAL is durable across application
+# crashes in WAL mode; busy_timeout makes a locked write wait instead of
+# failing with "database is locked".
+CONNECTION_PRAGMAS = {
+    "busy_timeout": 5000,
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -16000,  # KiB
+}
+
+def configure_conn(conn):
+    for name, value in CONNECTION_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+@timed()
+def get_conn(db_file: str = DB_FILE, **kwargs):
+    """
+    A configured connection; extra keyword arguments go to sqlite3.connect.
+    Statements are timed through ecosaver.perf while a recorder is active.
+    """
+    ensure_db(db_file)
+    kwargs.setdefault("check_same_thread", False)
+    kwargs.setdefault("factory", TracedConnection)
+    perf.count("db.connect")
+    return configure_conn(sqlite3.connect(db_file, **kwargs))
+
+def to_date_str(value) -> str:
+    """Canonical 'YYYY-MM-DD' text, the form usage.date is stored and indexed in."""
+    if isinstance(value, date):  # also datetime and pandas.Timestamp
+        return value.strftime(DATE_FMT)
+    value = str(value).strip()
+    try:
+        return date.fromisoformat(value).strftime(DATE_FMT)  # fast path for 'YYYY-MM-DD'
+    except ValueError:
+        import pandas as pd
+
+        return pd.Timestamp(value).strftime(DATE_FMT)
+
+def get_data_version(conn) -> int:
+    """Counter bumped by every write; use it in cache keys for derived data."""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+    return row[0] if row else 0
+
+def bump_data_version(conn):
+    # Runs inside the caller's transaction so the bump commits with the write.
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_version'")
+
+def mark_users_changed(conn, user_ids):
+    """
+    Record that these users' readings changed at the current data_version
+    (before the bump), in the caller's transaction. ecosaver.forecast reuses
+    a user's stored fit only if it was fitted at a later version.
+    """
+    conn.executemany("""
+        INSERT INTO usage_changes (user_id, version)
+        VALUES (?, (SELECT value FROM meta WHERE key = 'data_version'))
+        ON CONFLICT (user_id) DO UPDATE SET version = excluded.version
+    """, [(int(u),) for u in set(user_ids)])
+
+def write_user(conn, username: str) -> int:
+    """The user's id, inserting the user first if new; runs in the caller's transaction."""
+    username = username.strip().lower()
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM users WHERE username = ?", (username,))
+    row = cur.fetchone()
+    if row:
+        return row[0]
+    cur.execute("INSERT INTO users (username, created_at) VALUES (?, ?)", (username, datetime.utcnow().isoformat()))
+    bump_data_version(conn)
+    return cur.lastrowid
+
+def add_user_if_not_exists(conn, username: str):
+    uid = write_user(conn, username)
+    conn.commit()
+    return uid
+
+# A second reading for the same user and day replaces the first.
+UPSERT_USAGE_SQL = """
+    INSERT INTO usage (user_id, date, electricity_units, water_liters, household_size, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, date) DO UPDATE SET
+        electricity_units = excluded.electricity_units,
+        water_liters = excluded.water_liters,
+        household_size = excluded.household_size
+"""
+
+def write_usage(conn, user_id: int, date_str: str, elec: float, water: int, hh_size: int):
+    """Upsert one reading with its rollups and the version bump, in the caller's transaction."""
+    day = to_date_str(date_str)
+    cur = conn.cursor()
+    old = cur.execute("SELECT electricity_units FROM usage WHERE user_id = ? AND date = ?",
+                      (user_id, day)).fetchone()
+    cur.execute(UPSERT_USAGE_SQL,
+                (user_id, day, elec, water, hh_size, datetime.utcnow().isoformat()))
+    refresh_daily_rollup(conn, [day])
+    refresh_user_rollup(conn, [user_id])
+    apply_reading(conn, user_id, day, float(elec), old[0] if old else None)
+    mark_users_changed(conn, [user_id])
+    bump_data_version(conn)
+
+def add_usage(conn, user_id: int, date_str: str, elec: float, water: int, hh_size: int):
+    """Store the day's reading; since schema v3 it replaces an earlier one for the same user and day."""
+    with conn:  # the reading, its rollups and the version bump commit together
+        write_usage(conn, user_id, date_str, elec, water, hh_size)
+
+def add_usage_bulk(conn, records, batch_size: int = 50_000) -> int:
+    """
+    Upsert many readings in a single transaction.
+
+    `records` is an iterable of (username, date, elec, water, hh_size).
+    Usernames are normalised and resolved to ids with one lookup (missing
+    users are created first); rows are then written with executemany in
+    batches of `batch_size`. The daily and per-user rollups and the trend
+    statistics are then recomputed once for the touched dates and users.
+    Returns the number of rows written.
+    """
+    rows = [(str(u).strip().lower(), to_date_str(d), float(e), int(w), int(h))
+            for u, d, e, w, h in records]
+    if not rows:
+        return 0
+    now = datetime.utcnow().isoformat()
+    with conn:  # commits on success, rolls back everything on error
+        cur = conn.cursor()
+        names = sorted({r[0] for r in rows})
+        cur.executemany("INSERT OR IGNORE INTO users (username, created_at) VALUES (?, ?)",
+                        [(n, now) for n in names])
+        ids = dict((name, uid) for uid, name in cur.execute("SELECT id, username FROM users"))
+        for i in range(0, len(rows), batch_size):
+            cur.executemany(UPSERT_USAGE_SQL, [(ids[u], d, e, w, h, now)
+                                               for u, d, e, w, h in rows[i:i + batch_size]])
+        refresh_daily_rollup(conn, {r[1] for r in rows})
+        refresh_user_rollup(conn, [ids[n] for n in names])
+        refresh_user_stats(conn, [ids[n] for n in names])
+        mark_users_changed(conn, [ids[n] for n in names])
+        bump_data_version(conn)
+    return len(rows)
+
+# Column name -> SQL expression for load_usage_df projections.
+USAGE_COLUMNS = {
+    "usage_id": "u.id",
+    "username": "us.username",
+    "user_id": "us.id",
+    "date": "u.date",
+    "electricity_units": "u.electricity_units",
+    "water_liters": "u.water_liters",
+    "household_size": "u.household_size",
+}
+
+@timed()
+def load_usage_df(conn, start_date=None, end_date=None, columns=None, username=None,
+                  after=None, limit=None):
+    """
+    Usage rows joined to their user, ordered by (date, usage_id), in
+    frames.compact_usage dtypes (categorical usernames, narrow integers).
+
+    With no dates, only the last DEFAULT_HISTORY_DAYS before the latest stored
+    date are read; the window is computed in SQL, so older history is never
+    fetched. `columns` selects a subset of USAGE_COLUMNS (default: all).
+    `username` restricts to one user, or to a list of users (up to a few
+    hundred, one bound parameter each), via idx_usage_user_date.
+    Keyset pagination: pass `limit`, then the (date, usage_id) of the last row
+    as `after` to fetch the next page.
+    """
+    columns = list(columns or USAGE_COLUMNS)
+    unknown = [c for c in columns if c not in USAGE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown usage columns {unknown}; expected some of {list(USAGE_COLUMNS)}")
+    select = ", ".join(f"{USAGE_COLUMNS[c]} AS {c}" for c in columns)
+    q = f"SELECT {select} FROM usage u JOIN users us ON u.user_id = us.id"
+    where, params = [], []
+
+    # Dates are stored canonically, so compare the bare column: this lets SQLite
+    # range-scan idx_usage_date and return rows already in date order.
+    if start_date or end_date:
+        if start_date:
+            where.append("u.date >= ?")
+            params.append(to_date_str(start_date))
+        if end_date:
+            where.append("u.date <= ?")
+            params.append(to_date_str(end_date))
+    else:
+        where.append("u.date >= (SELECT date(MAX(date), ?) FROM usage)")
+        params.append(f"-{DEFAULT_HISTORY_DAYS} days")
+    if isinstance(username, str):
+        where.append("us.username = ?")
+        params.append(username.strip().lower())
+    elif username is not None:
+        names = sorted({u.strip().lower() for u in username})
+        where.append(f"us.username IN ({','.join('?' * len(names)) or 'NULL'})")
+        params.extend(names)
+    if after is not None:
+        where.append("(u.date, u.id) > (?, ?)")
+        params.extend([to_date_str(after[0]), int(after[1])])
+
+    q += " WHERE " + " AND ".join(where) + " ORDER BY u.date, u.id"
+    if limit is not None:
+        q += " LIMIT ?"
+        params.append(int(limit))
+    from ecosaver.frames import frame_from_rows
+
+    df = frame_from_rows(conn.execute(q, params).fetchall(), columns)
+    perf.count("rows.load_usage_df", len(df))
+    return df
+
+@timed()
+def get_user_list(conn):
+    return [r[0] for r in conn.execute("SELECT username FROM users ORDER BY username")]
+
+# ---------------------------
+# Demo data on first run
+# ---------------------------
+def populate_demo_if_empty(conn, seed: int = 1):
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM users")
+    count = cur.fetchone()[0]
+    if count > 0:
+        return
+    import numpy as np
+
+    # create demo users and 10 days of data
+    demo_users = ["arya", "dev", "mira"]
+    start = date.today() - timedelta(days=9)
+    np.random.seed(seed)
+    rows = []
+    for u in demo_users:
+        hh = 3 if u != "mira" else 1
+        for i in range(10):
+            d = (start + timedelta(days=i)).strftime(DATE_FMT)
+            # sample values (vary per user)
+            base_elec = 2.5 if u=="mira" else 3.5 if u=="arya" else 5.0
+            elec = max(0.5, float(np.round(np.random.normal(base_elec, 0.8),2)))
+            water = int(max(40, np.random.normal(120 if u=="arya" else 180 if u=="dev" else 80, 25)))
+            rows.append((u, d, elec, water, hh))
+    add_usage_bulk(conn, rows)
@@ -0,0 +1,190 @@
+# ecosaver/stress.py
+"""
+Concurrency stress test: N parallel dashboard sessions against one database.
+
+Each session thread loops for `--seconds`, doing either a write (one reading
+for a random user) or a dashboard read (the user's frame plus the top-K
+leaderboard). The write probability is `--write-ratio`. Two access modes are
+compared on the same scratch file:
+
+    shared  one connection shared by every thread, rollback journal, one
+            commit per write (how app.py used to work)
+    pool    ecosaver.pool.Database: WAL, pooled readers, group-committing writer
+
+Reported per mode: reads/s, writes/s, p50/p95 latency of each, and errors
+(e.g. "database is locked").
+
+Usage:
+    python -m ecosaver.stress --db /tmp/eco_stress.db --users 500 --days 90 --sessions 16 --seconds 10
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+import numpy as np
+
+from ecosaver.dashboard import user_frame
+from ecosaver.leaderboard import top_k
+from ecosaver.pool import Database
+from ecosaver.storage import get_conn, add_user_if_not_exists, add_usage, get_user_list
+
+MODES = ("shared", "pool")
+
+
+# ---------------------------
+# Access modes
+# ---------------------------
+class _Shared:
+    """The old access pattern: one connection for all threads, rollback journal."""
+
+    def __init__(self, db_file):
+        self.conn = get_conn(db_file)
+        self.conn.execute("PRAGMA journal_mode = DELETE")
+
+    def read(self, username):
+        user_frame(self.conn, username)
+        top_k(self.conn)
+
+    def write(self, username, day, elec, water, hh):
+        uid = add_user_if_not_exists(self.conn, username)
+        add_usage(self.conn, uid, day, elec, water, hh)
+
+    def close(self):
+        self.conn.close()
+
+
+class _Pooled:
+    def __init__(self, db_file):
+        self.db = Database(db_file)
+
+    def read(self, username):
+        with self.db.reader() as conn:
+            user_frame(conn, username)
+            top_k(conn)
+
+    def write(self, username, day, elec, water, hh):
+        self.db.add_usage(username, day, elec, water, hh)
+
+    def close(self):
+        self.db.close()
+
+
+# ---------------------------
+# Runner
+# ---------------------------
+def _session(mode, users, seconds, write_ratio, seed, out):
+    rng = random.Random(seed)
+    reads, writes, errors = [], [], Counter()
+    today = date.today()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        user = rng.choice(users)
+        is_write = rng.random() < write_ratio
+        t0 = time.perf_counter()
+        try:
+            if is_write:
+                day = (today - timedelta(days=rng.randint(0, 6))).isoformat()
+                mode.write(user, day, round(rng.uniform(0.5, 12), 2), rng.randint(50, 400), rng.randint(1, 6))
+            else:
+                mode.read(user)
+        except Exception as e:
+            errors[f"{type(e).__name__}: {e}"] += 1
+            continue
+        (writes if is_write else reads).append(time.perf_counter() - t0)
+    out.append((reads, writes, errors))
+
+def run_mode(name, db_file, sessions, seconds, write_ratio, seed=0) -> dict:
+    conn = get_conn(db_file)
+    try:
+        users = get_user_list(conn)
+    finally:
+        conn.close()
+    if not users:
+        raise ValueError("Stress database has no users; pass --users/--days to generate a cohort.")
+    mode = _Shared(db_file) if name == "shared" else _Pooled(db_file)
+    out = []
+    threads = [threading.Thread(target=_session, args=(mode, users, seconds, write_ratio, seed + i, out))
+               for i in range(sessions)]
+    t0 = time.perf_counter()
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        elapsed = time.perf_counter() - t0
+        mode.close()
+
+    reads = np.array([x for r, _, _ in out for x in r]) * 1000
+    writes = np.array([x for _, w, _ in out for x in w]) * 1000
+    errors = sum((e for _, _, e in out), Counter())
+
+    def pct(ms, q):
+        return float(np.percentile(ms, q)) if len(ms) else None
+
+    return {
+        "sessions": sessions,
+        "seconds": elapsed,
+        "reads_per_s": len(reads) / elapsed,
+        "writes_per_s": len(writes) / elapsed,
+        "read_p50_ms": pct(reads, 50), "read_p95_ms": pct(reads, 95),
+        "write_p50_ms": pct(writes, 50), "write_p95_ms": pct(writes, 95),
+        "errors": sum(errors.values()),
+        "error_kinds": dict(errors.most_common(5)),
+    }
+
+def print_results(results):
+    def ms(v):
+        return f"{v:.1f}" if v is not None else "-"
+
+    print(f"{'mode':8} {'sessions':>8} {'reads/s':>9} {'writes/s':>9} {'read p50':>9} {'read p95':>9} "
+          f"{'write p50':>10} {'write p95':>10} {'errors':>7}")
+    for name, r in results.items():
+        print(f"{name:8} {r['sessions']:>8} {r['reads_per_s']:>9.1f} {r['writes_per_s']:>9.1f} "
+              f"{ms(r['read_p50_ms']):>9} {ms(r['read_p95_ms']):>9} "
+              f"{ms(r['write_p50_ms']):>10} {ms(r['write_p95_ms']):>10} {r['errors']:>7}")
+        for kind, n in r["error_kinds"].items():
+            print(f"{'':8} {n:>8} x {kind}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stress EcoSaver's database access with parallel sessions.")
+    parser.add_argument("--db", required=True, help="Scratch SQLite file")
+    parser.add_argument("--users", type=int, help="Generate this many synthetic users if the DB is empty")
+    parser.add_argument("--days", type=int, default=90, help="Days per generated user (default: 90)")
+    parser.add_argument("--sessions", type=int, default=16, help="Parallel sessions (default: 16)")
+    parser.add_argument("--seconds", type=float, default=10, help="Duration per mode (default: 10)")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="Share of operations that write (default: 0.2)")
+    parser.add_argument("--modes", nargs="*", choices=MODES, default=list(MODES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args(argv)
+
+    conn = get_conn(args.db)
+    try:
+        if conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 0 and args.users:
+            from ecosaver.synth import write_cohort
+            write_cohort(conn, args.users, args.days, args.seed)
+    finally:
+        conn.close()
+
+    try:
+        results = {m: run_mode(m, args.db, args.sessions, args.seconds, args.write_ratio, args.seed)
+                   for m in args.modes}
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
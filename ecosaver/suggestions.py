@@ -0,0 +1,36 @@
+# ecosaver/suggestions.py
+"""
+Pattern detection and plain-language saving tips for a single user.
+Cohort-wide detection lives in ecosaver.patterns.
+"""
+
+
+# ---------------------------
+# Patterns & Suggestions
+# ---------------------------
+def detect_patterns(df_user):
+    """[(message, severity)] for one user's frame, from the cohort pattern engine."""
+    from ecosaver.patterns import detect_alerts
+
+    alerts = detect_alerts(df_user)
+    return list(zip(alerts["message"], alerts["severity"]))
+
+def generate_suggestions(latest, predicted, df_user):
+    suggestions = []
+    if predicted is None:
+        suggestions.append("Insufficient history to predict — add more daily records.")
+    else:
+        if latest > predicted:
+            excess = latest - predicted
+            suggestions.append(f"You used {excess:.2f} kWh more than predicted. Try reducing AC/heavy loads by 30 min to save approx {excess*0.15:.2f} kWh.")
+        else:
+            suggestions.append(f"Good work — you're {(predicted-latest):.2f} kWh under prediction. Keep that habit!")
+    # Column-wise: building a whole row Series is slow with mixed dtypes.
+    hh = int(df_user["household_size"].iloc[-1] or 1) if "household_size" in df_user.columns else 1
+    per_person = df_user["water_liters"].iloc[-1] / hh
+    if per_person > 150:
+        suggestions.append("Shorten showers by 2-3 mins or install a low-flow head — saves 20-40 L/day per person.")
+    elif per_person > 100:
+        suggestions.append("Fix small leaks and try one short shower a day to cut water use.")
+    suggestions.append("Unplug chargers at night. Replace bulbs with LEDs. Use natural light where possible.")
+    return suggestions
@@ -0,0 +1,175 @@
+# ecosaver/trend_stats.py
+"""
+Per-user sufficient statistics for constant-time next-day predictions.
+
+`user_trend_stats` keeps, for every user, n, Σx, Σy, Σx², Σxy over all
+readings (x = days since the user's anchor date, y = kWh), the last x and
+the reading on that day. add_usage applies a single reading as a delta,
+subtracting the old value first when an upsert corrects an existing day;
+add_usage_bulk recomputes the touched users from raw rows. Readings that
+arrive out of order only change the sums, never the latest value.
+
+The dashboard and the API predict from these sums over the default history
+window: as stored while a user's readings all fall inside it, re-aggregated
+over the window otherwise.
+
+Usage:  python -m ecosaver.trend_stats [--db data/techforge_eco.db]   (rebuild from raw rows)
+"""
+import argparse
+import sys
+import time
+
+from ecosaver.config import DB_FILE
+from ecosaver.scoring import eco_score
+
+STATS_COLUMNS = ["n", "sx", "sy", "sxx", "sxy", "last_x", "latest"]
+
+# Stay well under SQLite's bound-parameter limit.
+_MAX_PARAMS = 500
+
+_RECOMPUTE_SQL = """
+    WITH pts AS (
+        SELECT user_id,
+               MIN(date) OVER w AS anchor,
+               julianday(date) - julianday(MIN(date) OVER w) AS x,
+               electricity_units AS y,
+               FIRST_VALUE(electricity_units) OVER (PARTITION BY user_id ORDER BY date DESC) AS latest
+        FROM usage {where}
+        WINDOW w AS (PARTITION BY user_id)
+    )
+    INSERT OR REPLACE INTO user_trend_stats (user_id, anchor, n, sx, sy, sxx, sxy, last_x, latest)
+    SELECT user_id, MIN(anchor), COUNT(*), SUM(x), SUM(y), SUM(x * x), SUM(x * y), MAX(x), MAX(latest)
+    FROM pts GROUP BY user_id
+"""
+
+
+# ---------------------------
+# Maintenance
+# ---------------------------
+def apply_reading(conn, user_id: int, date_str: str, elec: float, old_elec=None):
+    """
+    Fold one reading into the user's sums in O(1), in the caller's transaction.
+
+    `old_elec` is the value this reading replaced on the same day (None for a
+    new day). The first reading sets the user's anchor date.
+    """
+    conn.execute("INSERT OR IGNORE INTO user_trend_stats (user_id, anchor) VALUES (?, ?)",
+                 (user_id, date_str))
+    x = conn.execute("SELECT julianday(?) - julianday(anchor) FROM user_trend_stats WHERE user_id = ?",
+                     (date_str, user_id)).fetchone()[0]
+    if old_elec is None:
+        dn, dy = 1, elec
+    else:
+        dn, dy = 0, elec - old_elec
+    conn.execute("""
+        UPDATE user_trend_stats SET
+            n = n + ?, sx = sx + ? * ?, sy = sy + ?, sxx = sxx + ? * ? * ?, sxy = sxy + ? * ?,
+            latest = CASE WHEN last_x IS NULL OR ? >= last_x THEN ? ELSE latest END,
+            last_x = CASE WHEN last_x IS NULL OR ? > last_x THEN ? ELSE last_x END
+        WHERE user_id = ?
+    """, (dn, dn, x, dy, dn, x, x, x, dy, x, elec, x, x, user_id))
+
+def refresh_user_stats(conn, user_ids):
+    """Recompute the sums of `user_ids` from the usage table, in the caller's transaction."""
+    user_ids = sorted(set(user_ids))
+    for i in range(0, len(user_ids), _MAX_PARAMS):
+        chunk = user_ids[i:i + _MAX_PARAMS]
+        marks = ",".join("?" * len(chunk))
+        conn.execute(f"DELETE FROM user_trend_stats WHERE user_id IN ({marks})", chunk)
+        conn.execute(_RECOMPUTE_SQL.format(where=f"WHERE user_id IN ({marks})"), chunk)
+
+def rebuild_user_stats(conn) -> int:
+    """Repair: recompute every user's sums from raw usage. Returns users written."""
+    with conn:
+        conn.execute("DELETE FROM user_trend_stats")
+        conn.execute(_RECOMPUTE_SQL.format(where=""))
+    return conn.execute("SELECT COUNT(*) FROM user_trend_stats").fetchone()[0]
+
+# ---------------------------
+# Prediction API
+# ---------------------------
+def predict_from_sums(n, sx, sy, sxx, sxy, last_x):
+    """
+    Next-day OLS prediction (at last_x + 1) from n, Σx, Σy, Σx², Σxy.
+
+    The fitted line's value at a point does not depend on where x is
+    measured from, so any fixed day origin gives fit_linear_trend's answer.
+    Returns None for fewer than 3 readings, like fit_linear_trend.
+    """
+    if not n or n < 3:
+        return None
+    x_mean, y_mean = sx / n, sy / n
+    sxx_c = sxx - sx * x_mean
+    sxy_c = sxy - sx * y_mean
+    slope = sxy_c / sxx_c if sxx_c > 1e-12 * max(sxx, 1.0) else 0.0
+    return float(y_mean + slope * (last_x + 1 - x_mean))
+
+def _user_id(conn, username):
+    row = conn.execute("SELECT id FROM users WHERE username = ?", (username.strip().lower(),)).fetchone()
+    return row[0] if row else None
+
+def user_trend_stats(conn, username, since=None):
+    """
+    (n, Σx, Σy, Σx², Σxy, last_x, latest) for `username`, or None if unknown.
+
+    Without `since` this is one primary-key lookup of the stored sums. With
+    `since` (a 'YYYY-MM-DD' date) the sums cover only readings on or after it:
+    still the stored sums when the user's first reading is inside the window,
+    else aggregated over that idx_usage_user_date range.
+    """
+    uid = _user_id(conn, username)
+    if uid is None:
+        return None
+    stored = conn.execute(f"SELECT {', '.join(STATS_COLUMNS)} FROM user_trend_stats WHERE user_id = ?",
+                          (uid,)).fetchone()
+    if since is None:
+        return tuple(stored) if stored else None
+    first = conn.execute("SELECT MIN(date) FROM usage WHERE user_id = ?", (uid,)).fetchone()[0]
+    if first is None:
+        return None
+    if stored and first >= since:
+        return tuple(stored)
+    row = conn.execute("""
+        SELECT COUNT(*), SUM(x), SUM(y), SUM(x * x), SUM(x * y), MAX(x)
+        FROM (SELECT julianday(date) - julianday(?) AS x, electricity_units AS y
+              FROM usage WHERE user_id = ? AND date >= ?)
+    """, (since, uid, since)).fetchone()
+    if not row[0]:
+        return None
+    latest = conn.execute("SELECT electricity_units FROM usage WHERE user_id = ? AND date >= ? "
+                          "ORDER BY date DESC LIMIT 1", (uid, since)).fetchone()[0]
+    return tuple(row) + (latest,)
+
+def predict_next(conn, username, since=None):
+    """(next-day kWh prediction or None, latest kWh or None) from the stored sums."""
+    stats = user_trend_stats(conn, username, since)
+    if stats is None:
+        return None, None
+    n, sx, sy, sxx, sxy, last_x, latest = stats
+    return predict_from_sums(n, sx, sy, sxx, sxy, last_x), latest
+
+def predicted_eco_score(conn, username, since=None):
+    """EcoScore of the latest reading against its trend prediction (None if no readings)."""
+    pred, latest = predict_next(conn, username, since)
+    return None if latest is None else eco_score(latest, pred)
+
+
+def main(argv=None):
+    from ecosaver.storage import get_conn
+
+    parser = argparse.ArgumentParser(description="Rebuild the EcoSaver per-user trend statistics from raw usage rows.")
+    parser.add_argument("--db", default=DB_FILE, help=f"SQLite file (default: {DB_FILE})")
+    args = parser.parse_args(argv)
+
+    conn = get_conn(args.db)
+    t0 = time.perf_counter()
+    try:
+        users = rebuild_user_stats(conn)
+    finally:
+        conn.close()
+    print(f"Rebuilt trend statistics for {users} users in {args.db} in {time.perf_counter() - t0:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# ecosaver/trends.py
+"""
+Linear trend models for next-day usage prediction.
+
+`fit_linear_trend` / `global_trend_predict` fit a single OLS line through
+ecosaver.forecast, which also gives weekday terms, intervals and longer horizons.
+`batch_linear_trends` computes the same line for every user at once with the
+closed-form least-squares solution on grouped NumPy arrays.
+`global_trend_from_daily` fits the global line from per-day counts and sums.
+"""
+import numpy as np
+import pandas as pd
+
+from ecosaver.perf import timed
+
+
+# ---------------------------
+# Prediction (single line)
+# ---------------------------
+def _fit_line(df, value_col):
+    """ecosaver.forecast trend-only fit of all of `df`'s rows as one group."""
+    from ecosaver.forecast import fit_groups
+
+    days = df["date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    return fit_groups(np.zeros(len(days), dtype=np.int64), days, df[value_col].to_numpy(dtype=float), 1,
+                      seasonal=False)
+
+@timed()
+def fit_linear_trend(df_user, value_col="electricity_units"):
+    """
+    (next-day prediction, fit) from an OLS line through the user's readings,
+    or (None, None) with fewer than 3 rows. `fit` is the ecosaver.forecast
+    parameter dict; forecast.predict gives intervals and longer horizons.
+    """
+    from ecosaver.forecast import next_day
+
+    if df_user.shape[0] < 3:
+        return None, None
+    try:
+        fit = _fit_line(df_user, value_col)
+        return float(next_day(fit)[0]), fit
+    except np.linalg.LinAlgError:
+        return None, None
+
+@timed()
+def global_trend_predict(df_all, value_col="electricity_units"):
+    """Next-day value of one OLS line through every row of `df_all` (the mean below 3 rows)."""
+    from ecosaver.forecast import next_day
+
+    if df_all.shape[0] < 3:
+        return float(df_all[value_col].mean()) if df_all.shape[0] > 0 else None
+    try:
+        return float(next_day(_fit_line(df_all, value_col))[0])
+    except np.linalg.LinAlgError:
+        return float(df_all[value_col].mean())
+
+@timed()
+def global_trend_from_daily(daily, sum_col="elec_sum", count_col="n"):
+    """
+    global_trend_predict over the raw rows summarised by `daily` (one row per
+    date with the reading count and value sum, e.g. load_daily_rollup).
+
+    Every reading on a date shares that date's day_index, so the OLS sums are
+    count-weighted sums over days and the fit is identical to the row-level one.
+    """
+    n_rows = daily[count_col].sum() if not daily.empty else 0
+    if n_rows == 0:
+        return None
+    total = float(daily[sum_col].sum())
+    if n_rows < 3:
+        return total / n_rows
+    days = daily["date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    x = (days - days.min()).astype(float)
+    w = daily[count_col].to_numpy(dtype=float)
+    s = daily[sum_col].to_numpy(dtype=float)
+    x_mean = (w * x).sum() / n_rows
+    y_mean = total / n_rows
+    sxx = (w * (x - x_mean) ** 2).sum()
+    sxy = ((x - x_mean) * (s - w * y_mean)).sum()
+    slope = sxy / sxx if sxx > 0 else 0.0
+    return float(y_mean + slope * (x.max() + 1 - x_mean))
+
+# ---------------------------
+# Batch trends (closed-form, all users in one pass)
+# ---------------------------
+TREND_COLUMNS = ["n", "slope", "intercept", "next_index", "pred", "latest"]
+
+@timed()
+def batch_linear_trends(df, value_col="electricity_units", by="username"):
+    """
+    Fit y = intercept + slope * day_index for every group of `df` at once.
+
+    day_index counts days from each group's first date, exactly as in
+    fit_linear_trend, so `pred` (the value at last day_index + 1) matches it.
+    Groups with fewer than 3 rows get NaN slope/intercept/pred.
+    Returns a frame indexed by group (first-appearance order) with
+    n, slope, intercept, next_index, pred and latest (value on the last date).
+    """
+    if df.empty:
+        return pd.DataFrame(columns=TREND_COLUMNS, index=pd.Index([], name=by))
+
+    codes, groups = pd.factorize(df[by], sort=False)
+    days = df["date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    y = df[value_col].to_numpy(dtype=float)
+
+    # Sort once by (group, date); every group is then a contiguous slice.
+    order = np.lexsort((days, codes))
+    codes, days, y = codes[order], days[order], y[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)] - 1
+
+    n = np.diff(np.r_[starts, len(codes)])
+    first_day = days[starts]
+    x = (days - np.repeat(first_day, n)).astype(float)
+
+    # Centred sums keep the slope numerically stable for long histories.
+    x_mean = np.add.reduceat(x, starts) / n
+    y_mean = np.add.reduceat(y, starts) / n
+    dx = x - np.repeat(x_mean, n)
+    dy = y - np.repeat(y_mean, n)
+    sxx = np.add.reduceat(dx * dx, starts)
+    sxy = np.add.reduceat(dx * dy, starts)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # A single distinct date gives sxx == 0; OLS then predicts the mean.
+        slope = np.where(sxx > 0, sxy / sxx, 0.0)
+    intercept = y_mean - slope * x_mean
+    next_index = (days[ends] - first_day) + 1
+    pred = intercept + slope * next_index
+
+    too_short = n < 3
+    slope[too_short] = np.nan
+    intercept[too_short] = np.nan
+    pred[too_short] = np.nan
+
+    return pd.DataFrame({
+        "n": n,
+        "slope": slope,
+        "intercept": intercept,
+        "next_index": next_index,
+        "pred": pred,
+        "latest": y[ends],
+    }, index=pd.Index(groups, name=by))
@@ -1,5 +1,5 @@
+import glob
 import streamlit
-import shelve
 from matplotlib import pyplot
 #from langchain_google_genai import ChatGoogleGenerativeAI
 #from langchain.prompts import ChatPromptTemplate
@@ -62,29 +62,65 @@ Do NOT add any extra text AT ALL, ONLY return the JSON with datas. If there's mi
 #])
 #parser = JsonOutputParser()
 #chain = prompt | dataFetcher
-DB = shelve.open("DB") 
+from ecosaver.estimator import Estimator, GeminiBackend
+from ecosaver.pool import Database
+from ecosaver.storage import get_conn
+from ecosaver.series import import_shelve, latest_users, write_reading
+
+# Cached, retried Gemini calls; identical activity text is only sent once.
+@streamlit.cache_resource
+def get_estimator():
+    return Estimator(GeminiBackend(model, json_mode=False), prompt=returnPrompt, keys=None)
+
+# Per-user readings live in the indexed, append-only series store; the old
+# shelve file is imported into it once, on first run. Sessions share one
+# Database: pooled readers, and one writer thread that owns every transaction.
+@streamlit.cache_resource
+def get_db():
+    """(Database, shelve import error message or None)."""
+    error = None
+    if glob.glob("DB") or glob.glob("DB.*"):
+        conn = get_conn()
+        try:
+            import_shelve(conn, "DB")
+        except Exception as e:  # dbm backend for the old file may be missing
+            error = f"Skipping import of shelve file DB: {e}"
+        finally:
+            conn.close()
+    return Database(), error
+
+def monthly_kwh(info):
+    g = lambda k: info.get(k, 0)
+    daily = (g("num_of_acs") * g("duration_acs") * g("avg_ec_cons_AC")
+             + g("num_heaters") * g("duration_heaters") * g("avg_ec_cons_heaters")
+             + g("duration_MW") * g("avg_ec_cons_MW")
+             + g("duration_induction_stove") * g("avg_ec_cons_induction_stove")
+             + g("duration_water_pump_motors") * g("avg_ec_cons_water_pump_motors")
+             + (g("num_lights") * g("avg_ec_cons_light") + g("num_fans") * g("avg_ec_cons_fans")) * 24)
+    return daily * 30
+
+DB, IMPORT_ERROR = get_db()
 LOGGED_IN = False
-USABLE_DICT = {}
 streamlit.title("Eco Saver")
 streamlit.subheader("Monitor your electricity usage in your home and save MONEY!")
+if IMPORT_ERROR:
+    streamlit.warning(IMPORT_ERROR)
 if True:
     usrname = streamlit.text_input("Enter your username:")
     if streamlit.button("Login!"):
         if usrname != "": 
             LOGGED_IN = True
-            DB[usrname] = []
+            DB.add_user(usrname)
         textInput = streamlit.text_area("Enter your daily activities! Describe how much ACs you have, and for how much times you run it, and the same with Heaters. Also input the duration of usage of microwaves, induction stoves, and water pump motors.")
         if streamlit.button("Calculate ts"):
-            res = model.generate_content(returnPrompt(textInput))
-            info = eval(res.text)
+            info = get_estimator().estimate(textInput)
+            DB.write(write_reading, usrname, monthly_kwh(info))
             fig, axes = pyplot.subplots()
             axes.set_xlabel("Users")
             axes.set_ylabel("Electricity Usage")
-            for i in range(4):
-                USABLE_DICT[[dict(DB).keys()[len(dict(DB).keys())-i]]] = dict(DB).values()[len(dict(DB).values())-i]
-            #for i in dict(USABLE_DICT).keys():
-            axes.plot(USABLE_DICT.keys(), USABLE_DICT.values(), marker="*", linestyle="--")
-            axes.plot(USABLE_DICT.keys(), [info["avg_ec_cons_house"]] * len(USABLE_DICT), marker="o", linestyle="solid" )
-
-
-DB.close()
\ No newline at end of file
+            # Latest reading of the 4 most recently active users, from the series heads only
+            with DB.reader() as conn:
+                USABLE_DICT = {name: value for name, _, value, _ in latest_users(conn, 4)}
+            axes.plot(list(USABLE_DICT.keys()), list(USABLE_DICT.values()), marker="*", linestyle="--")
+            axes.plot(list(USABLE_DICT.keys()), [info["avg_ec_cons_house"]] * len(USABLE_DICT), marker="o", linestyle="solid" )
+            streamlit.pyplot(fig)
@@ -54,6 +54,14 @@ Fill in datas in SI Units only unless explicitly said otherwise in the query for
 Do NOT add any extra text AT ALL, ONLY return the JSON with datas. If there's missing data, fill in 0 and return it. 
 """
 
+from ecosaver.appliances import energy_kwh
+from ecosaver.estimator import Estimator, GeminiBackend
+
+# Cached, retried Gemini calls; identical activity text is only sent once.
+@st.cache_resource
+def get_estimator():
+    return Estimator(GeminiBackend(model, json_mode=False), prompt=returnPrompt, keys=None)
+
 # Initialize session state
 if "username" not in st.session_state:
     st.session_state.username = None
@@ -80,18 +88,18 @@ def data_entry_page():
     textInput = st.text_area("Enter your daily activities! Describe how much ACs you have, and for how much times you run it, and the same with Heaters. Also input the duration of usage of microwaves, induction stoves, and water pump motors.")
     
     if st.button("Add Entry"):
-        res = model.generate_content(returnPrompt(textInput))
-        info = dict(eval((res.text).strip("```").lstrip("json")))
+        info = get_estimator().estimate(textInput)
         #BaseEntry = pd.DataFrame([[date, info["avg_ec_cons_house"]]], columns=["Date", "Consumption"])
         #st.session_state.user_data = pd.concat([st.session_state.user_data, BaseEntry], ignore_index=True)
-        AC=(info["num_of_acs"] * info["duration_acs"] * info["avg_ec_cons_AC"]) * 30
-        Heaters=(info["num_heaters"] * info["duration_heaters"] * info["avg_ec_cons_heaters"]) * 30
-        indcStv = (info["duration_induction_stove"] * info["avg_ec_cons_induction_stove"]) * 30
-        MW = ((info["duration_MW"] * info["avg_ec_cons_MW"])) * 30
-        WP = (info["duration_water_pump_motors"] * info["avg_ec_cons_water_pump_motors"]) * 30
-        totalUnits = ((info["num_lights"] * info["avg_ec_cons_lights"]) + (info["num_fans"] * info["avg_ec_cons_fans"]) ) *24 * 30
-        print(AC, Heaters, indcStv, MW, WP, totalUnits)
-        new_entry = pd.DataFrame([[date, totalUnits+MW+WP+indcStv+Heaters+AC]], columns=["Date", "Consumption"])
+        # One term per appliance: count x hours/day x model-reported kWh rate, over 30 days.
+        counts = [info["num_of_acs"], info["num_heaters"], 1, 1, 1, info["num_lights"], info["num_fans"]]
+        hours = [info["duration_acs"], info["duration_heaters"], info["duration_induction_stove"],
+                 info["duration_MW"], info["duration_water_pump_motors"], 24, 24]
+        rates = [info["avg_ec_cons_AC"], info["avg_ec_cons_heaters"], info["avg_ec_cons_induction_stove"],
+                 info["avg_ec_cons_MW"], info["avg_ec_cons_water_pump_motors"],
+                 info["avg_ec_cons_lights"], info["avg_ec_cons_fans"]]
+        monthly_units = energy_kwh(counts, hours, rates) * 30
+        new_entry = pd.DataFrame([[date, monthly_units]], columns=["Date", "Consumption"])
         st.session_state.user_data = pd.concat([st.session_state.user_data, new_entry], ignore_index=True)
         st.success("Data added!")
 
@@ -6,55 +6,14 @@
 # GEMINI AI TOOL DEFINITIONS
 # ---------------------------
 
-# Estimated Consumption Rates (for conversion from durations, based on typical appliance power)
-# These are used when the user provides detailed activity text.
-AC_KWH = 1.5 
-HEATER_KWH = 2.0
-MICROWAVE_KWH = 0.8
-INDUCTION_STOVE_KWH = 2.0
-FAN_KWH = 0.05
-LIGHT_KWH = 0.01
-
-# Assuming Water Pump Motor runs to supply 300L/hr of water
-WATER_PUMP_LPH = 300
-
-def returnPrompt(INPUT):
-    # NOTE: Cleaned up the prompt slightly for clarity and structure, 
-    # but kept all keys and the core instruction for JSON output.
-    return f"""
-    You are an expert data extractor. From the user's input describing their daily activities, extract the following data.
-    
-    If the unit is not explicitly hours but duration is given (e.g., "30 minutes"), convert it to hours in the appropriate '... (In Hours)' key.
-    
-    If you can't obtain data for any of the keys, fill in 0 for that value.
-    
-    Keys to extract:
-    1. Number of ACs: `num_acs`
-    2. Duration running of each AC (In Hours): `duration_ac_hours`
-    3. Number of Heaters: `num_heaters`
-    4. Duration running of each heater (In Hours): `duration_heater_hours`
-    5. Duration of food cooked by Microwave (In Hours): `duration_microwave_hours`
-    6. Duration of food cooked by induction stoves (In hours): `duration_induction_stove_hours`
-    7. Duration of water pump motors running (motors) (In hours): `duration_water_pump_motors`
-    8. Number of Fans: `num_fans`
-    9. Number of Lights: `num_lights`
-    
-    Provide the output in a single JSON object (with no other text, commentary, or markdown blocks) using only the snake_case keys provided below:
-    
-    {{
-    "num_acs": <value>,
-    "duration_ac_hours": <value>,
-    "num_heaters": <value>,
-    "duration_heater_hours": <value>,
-    "duration_microwave_hours": <value>,
-    "duration_induction_stove_hours": <value>,
-    "duration_water_pump_motors": <value>,
-    "num_fans": <value>,
-    "num_lights": <value>
-    }}
-    
-    The user input is: "{INPUT}"
-    """
+# Prompt, JSON parsing, appliance rates and the kWh/litre maths live in
+# ecosaver.estimator. The estimator caches parsed replies per normalised
+# activity text and retries/times out backend calls off the script thread.
+from ecosaver.estimator import Estimator, GeminiBackend, EstimationError, usage_from_estimate
+
+@st.cache_resource
+def get_estimator():
+    return Estimator(GeminiBackend(model))
 
 def ai_estimate_and_add_data(text_input: str, user_id: int, current_date: date, hh_size: int, conn):
     """
@@ -64,67 +23,19 @@ def ai_estimate_and_add_data(text_input: str, user_id: int, current_date: date,
     
     if not text_input or text_input.strip() == "":
         st.error("Please provide a description of your activities for the AI to estimate.")
-        return False
+        return False, None, None
     
     try:
-        # 1. Generate Content (using the function defined by the user)
-        prompt = returnPrompt(text_input)
-        
-        # Use a model that supports function calling or direct JSON output well
-        response = model.generate_content(
-            prompt,
-            config=genai.types.GenerateContentConfig(
-                response_mime_type="application/json"
-            )
-        )
-        
-        # 2. Parse JSON response
-        data = json.loads(response.text.strip())
-        
-    except Exception as e:
-        st.error(f"AI estimation failed or response format was incorrect: {e}. Raw response: {response.text if 'response' in locals() else 'N/A'}")
-        return False
+        data = get_estimator().estimate(text_input)
+    except EstimationError as e:
+        st.error(f"AI estimation failed or response format was incorrect: {e}")
+        return False, None, None
 
     try:
-        # 3. Calculate Total Electricity (kWh)
-        total_elec_kWh = 0.0
-        
-        # AC (num_acs * duration * kwh_per_ac)
-        total_elec_kWh += data.get('num_acs', 0) * data.get('duration_ac_hours', 0) * AC_KWH
-        
-        # Heaters (num_heaters * duration * kwh_per_heater)
-        total_elec_kWh += data.get('num_heaters', 0) * data.get('duration_heater_hours', 0) * HEATER_KWH
-        
-        # Appliances
-        total_elec_kWh += data.get('duration_microwave_hours', 0) * MICROWAVE_KWH
-        total_elec_kWh += data.get('duration_induction_stove_hours', 0) * INDUCTION_STOVE_KWH
-        
-        # Motors (This is a major consumer, use it for base electricity)
-        motor_duration = data.get('duration_water_pump_motors', 0)
-        total_elec_kWh += motor_duration * WATER_PUMP_LPH / WATER_PUMP_LPH # assuming 1kW pump, which simplifies. Let's use 1kW for simplicity or WATER_PUMP_LPH * KWH_PER_LITER_WATER_PUMP 
-        
-        # Ambient usage (Fans and lights) - assume fans/lights are per person or per room, simplify here by taking fixed units.
-        # This part is highly variable, but for estimation:
-        total_elec_kWh += data.get('num_fans', 0) * FAN_KWH * 8 # 8 hours run time
-        total_elec_kWh += data.get('num_lights', 0) * LIGHT_KWH * 8 # 8 hours run time
-
-        # 4. Calculate Total Water (Liters)
-        # Assuming water use is primarily from the pump running time.
-        # If the pump ran for X hours, it delivered X * WATER_PUMP_LPH
-        # We add a base human usage estimate (50L per person for flushing, etc.)
-        total_water_L = int(motor_duration * WATER_PUMP_LPH) + (hh_size * 50) 
-        
-        if total_elec_kWh <= 0:
-            total_elec_kWh = 0.1 # Minimum usage to prevent 0
-        
-        # 5. Insert the estimated usage
-        saved = add_usage(conn, user_id, current_date.strftime(DATE_FMT), 
-                          total_elec_kWh, total_water_L, hh_size)
-        
-        if saved:
-            return True, total_elec_kWh, total_water_L
-        else:
-            return False, None, None
+        total_elec_kWh, total_water_L = usage_from_estimate(data, hh_size)
+        add_usage(conn, user_id, current_date.strftime(DATE_FMT),
+                  total_elec_kWh, total_water_L, hh_size)
+        return True, total_elec_kWh, total_water_L
 
     except Exception as e:
         st.error(f"Error during calculation or data insertion: {e}")
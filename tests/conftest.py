@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ecosaver.storage import get_conn  # noqa: E402
+
+# The schema before any migration: what ensure_db created at user_version 0.
+V0_SCHEMA = """
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        created_at TEXT
+    );
+    CREATE TABLE usage (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        electricity_units REAL NOT NULL,
+        water_liters INTEGER NOT NULL,
+        household_size INTEGER NOT NULL,
+        created_at TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    );
+"""
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    """Path of a fresh, fully migrated SQLite file."""
+    path = str(tmp_path / "eco.db")
+    get_conn(path).close()
+    return path
+
+@pytest.fixture
+def conn(db_file):
+    c = get_conn(db_file)
+    yield c
+    c.close()
+
+@pytest.fixture
+def v0_db(tmp_path):
+    """Factory: path of an unmigrated file with users asha (id 1) and ben (id 2) and the given usage rows."""
+    def make(usage_rows):
+        path = str(tmp_path / "v0.db")
+        c = sqlite3.connect(path)
+        c.executescript(V0_SCHEMA)
+        c.executemany("INSERT INTO users (username) VALUES (?)", [("asha",), ("ben",)])
+        c.executemany("INSERT INTO usage (user_id, date, electricity_units, water_liters, household_size) "
+                      "VALUES (?, ?, ?, ?, ?)", usage_rows)
+        c.commit()
+        c.close()
+        return path
+    return make
+
+@pytest.fixture
+def app_dir(tmp_path, monkeypatch):
+    """
+    Working directory for AppTest runs of the Streamlit pages: their relative
+    data/ paths land in tmp_path. Streamlit's caches are cleared around the
+    test and the leaderboard refresher threads the app starts are stopped.
+    """
+    import streamlit as st
+
+    from ecosaver import leaderboard
+
+    stops = []
+    start_refresher = leaderboard.start_refresher
+
+    def tracked_start_refresher(*args, **kwargs):
+        stops.append(start_refresher(*args, **kwargs))
+        return stops[-1]
+
+    monkeypatch.setattr(leaderboard, "start_refresher", tracked_start_refresher)
+    monkeypatch.chdir(tmp_path)
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    yield tmp_path
+    for stop in stops:
+        stop.set()
+    st.cache_data.clear()
+    st.cache_resource.clear()
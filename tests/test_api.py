@@ -0,0 +1,125 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from ecosaver import config
+from ecosaver.api import Api
+from ecosaver.leaderboard import refresh_leaderboard
+from ecosaver.storage import add_usage_bulk
+
+
+@pytest.fixture
+def api(db_file, conn, monkeypatch):
+    monkeypatch.setitem(config.DATA_SOURCES, "home", db_file)
+    today = date.today()
+    add_usage_bulk(conn, [(name, (today - timedelta(days=i)).isoformat(), 2.0 + i % 3 + k, 100, 2)
+                          for k, name in enumerate(("asha", "ben")) for i in range(10)])
+    refresh_leaderboard(conn)
+    api = Api(refresh=False)
+    yield api
+    api.close()
+
+def _get(api, path, etag=None, query=""):
+    status, headers, body = api.respond("GET", path, query, if_none_match=etag)
+    return int(status), headers, body
+
+def test_matching_etag_gets_304_until_a_write(api):
+    status, headers, body = _get(api, "/api/users/asha")
+    assert status == 200 and json.loads(body)["username"] == "asha"
+    etag = headers["ETag"]
+
+    status, headers, body = _get(api, "/api/users/asha", etag)
+    assert (status, headers["ETag"], body) == (304, etag, b"")
+
+    api.db("home").add_usage("asha", date.today().isoformat(), 9.5, 100, 2)
+    status, headers, body = _get(api, "/api/users/asha", etag)
+    assert status == 200 and headers["ETag"] != etag
+    assert _get(api, "/api/users/asha", headers["ETag"])[0] == 304
+
+def test_cached_reports_are_recomputed_after_a_write(api):
+    before = json.loads(_get(api, "/api/batch", query="users=asha,ben")[2])
+    assert _get(api, "/api/batch", query="users=asha,ben")[2] == json.dumps(before).encode()
+
+    api.db("home").add_usage("asha", date.today().isoformat(), 9.5, 100, 2)
+    after = json.loads(_get(api, "/api/batch", query="users=asha,ben")[2])
+    assert after["users"][1] == before["users"][1]
+    assert after["users"][0] != before["users"][0]
+    assert after["users"][0] == json.loads(_get(api, "/api/users/asha")[2])
+
+def test_leaderboard_etag_follows_refreshes_not_writes(api, conn):
+    _, headers, _ = _get(api, "/api/leaderboard")
+    etag = headers["ETag"]
+
+    api.db("home").add_usage("ben", date.today().isoformat(), 0.5, 100, 2)
+    assert _get(api, "/api/leaderboard", etag)[0] == 304  # not re-ranked yet
+
+    refresh_leaderboard(conn)
+    status, headers, body = _get(api, "/api/leaderboard", etag)
+    assert status == 200 and headers["ETag"] != etag
+    assert json.loads(body)["rows"][0]["username"] == "ben"
+
+@pytest.mark.parametrize("method, path, query, body, status", [
+    ("GET", "/nope", "", b"", 404),
+    ("GET", "/api/users/asha/extra", "", b"", 404),
+    ("DELETE", "/api/users", "", b"", 405),
+    ("POST", "/api/users", "", b"", 405),
+    ("GET", "/api/users", "source=office", b"", 400),
+    ("GET", "/api/leaderboard", "k=0", b"", 400),
+    ("GET", "/api/batch", "users=,", b"", 400),
+    ("POST", "/api/batch", "", b'{"users": "asha"}', 400),
+    ("POST", "/api/batch", "", b"not json", 400),
+    ("GET", "/api/users/nobody", "", b"", 404),
+])
+def test_bad_requests_get_json_errors(api, method, path, query, body, status):
+    got, headers, payload = api.respond(method, path, query, body)
+    assert int(got) == status and headers["Content-Type"] == "application/json"
+    assert "error" in json.loads(payload)
+
+def test_report_matches_the_dashboard(api, conn):
+    from ecosaver import dashboard
+    from ecosaver.scoring import eco_score
+
+    report = json.loads(_get(api, "/api/users/ Asha ")[2])
+    df = dashboard.user_frame(conn, "asha")
+    pred, used_global = dashboard.user_prediction(conn, "asha", lambda: None)
+    assert [h["electricity_units"] for h in report["history"]] == df["electricity_units"].tolist()
+    assert report["prediction"] == {"next_day_kwh": pytest.approx(pred), "used_global_trend": used_global}
+    assert report["eco_score"] == eco_score(df["electricity_units"].iloc[-1], pred)
+    assert report["rank"]["of"] == 2 and report["suggestions"]
+
+def test_post_batch_lists_missing_users(api):
+    status, _, body = api.respond("POST", "/api/batch", "", json.dumps({"users": ["ben", "nobody", "BEN"]}).encode())
+    data = json.loads(body)
+    assert int(status) == 200
+    assert [u["username"] for u in data["users"]] == ["ben"] and data["missing"] == ["nobody"]
+
+def test_weak_and_wildcard_etags_match(api):
+    etag = _get(api, "/api/users")[1]["ETag"]
+    assert _get(api, "/api/users", f'"other", W/{etag}')[0] == 304
+    assert _get(api, "/api/users", "*")[0] == 304
+    assert _get(api, "/api/users", '"other"')[0] == 200
+
+def test_http_server_serves_the_api(api):
+    import threading
+    import urllib.error
+    import urllib.request
+
+    from ecosaver.api import make_server
+
+    server, server_api = make_server(port=0, refresh=False, quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(base + "/api/leaderboard?k=1") as r:
+            etag = r.headers["ETag"]
+            assert [row["rank"] for row in json.load(r)["rows"]] == [1]
+        req = urllib.request.Request(base + "/api/leaderboard?k=1", headers={"If-None-Match": etag})
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(req)
+        assert e.value.code == 304
+    finally:
+        server.shutdown()
+        server.server_close()
+        server_api.close()
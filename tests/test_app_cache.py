@@ -0,0 +1,49 @@
+import json
+import os
+from datetime import date, timedelta
+
+from streamlit.testing.v1 import AppTest
+
+from ecosaver import perf
+from ecosaver.config import DB_FILE
+from ecosaver.storage import add_usage, add_user_if_not_exists, get_conn, get_data_version
+
+APP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def _last_rerun_sql():
+    with open(perf.METRICS_LOG, encoding="utf-8") as f:
+        runs = [json.loads(line) for line in f]
+    return [s["sql"] for s in [r for r in runs if r["label"] == "dashboard"][-1]["sql"]]
+
+def _records(at, username):
+    return next(m.value for m in at.markdown if m.value.startswith(f"**{username}**"))
+
+def test_every_write_bumps_the_data_version(conn):
+    v0 = get_data_version(conn)
+    uid = add_user_if_not_exists(conn, "asha")
+    add_usage(conn, uid, "2024-03-01", 3.0, 100, 2)
+    add_usage(conn, uid, "2024-03-01", 3.5, 100, 2)  # an overwrite is a write too
+    assert get_data_version(conn) == v0 + 3
+    assert add_user_if_not_exists(conn, "asha") == uid
+    assert get_data_version(conn) == v0 + 3
+
+def test_reruns_skip_usage_queries_until_another_connection_writes(app_dir, monkeypatch):
+    monkeypatch.setenv(perf.ENV_VAR, "1")
+    at = AppTest.from_file(APP_FILE, default_timeout=60).run()
+    assert not at.exception
+    assert "records: 10 " in _records(at, "arya")
+
+    at.run()
+    assert not [s for s in _last_rerun_sql() if " usage " in f" {s} " or "daily_rollup" in s]
+
+    # A write from outside the app (another process, say) changes the key.
+    conn = get_conn(DB_FILE)
+    try:
+        add_usage(conn, add_user_if_not_exists(conn, "arya"),
+                  (date.today() - timedelta(days=12)).isoformat(), 4.0, 100, 3)
+    finally:
+        conn.close()
+    at.run()
+    assert not at.exception
+    assert "records: 11 " in _records(at, "arya")
@@ -0,0 +1,70 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ecosaver import appliances
+from ecosaver.appliances import (
+    AMBIENT_HOURS, BASE_WATER_PER_PERSON, MIN_DAILY_KWH, WATER_PUMP_LPH, daily_usage, whatif_grid, whatif_lookup,
+)
+from ecosaver.carbon import co2_kg, whatif_savings
+
+RECORDS = [
+    {"num_acs": 2, "duration_ac_hours": 4, "num_fans": 3, "num_lights": 5},
+    {"duration_microwave_hours": 0.5, "duration_water_pump_motors": 0.25, "num_heaters": None},
+    {},
+]
+
+
+def _by_hand(r, hh):
+    g = lambda k: r.get(k) or 0
+    kwh = (g("num_acs") * g("duration_ac_hours") * appliances.AC_KWH
+           + g("num_heaters") * g("duration_heater_hours") * appliances.HEATER_KWH
+           + g("duration_microwave_hours") * appliances.MICROWAVE_KWH
+           + g("duration_induction_stove_hours") * appliances.INDUCTION_STOVE_KWH
+           + g("duration_water_pump_motors") * appliances.PUMP_KWH
+           + g("num_fans") * AMBIENT_HOURS * appliances.FAN_KWH
+           + g("num_lights") * AMBIENT_HOURS * appliances.LIGHT_KWH)
+    water = int(g("duration_water_pump_motors") * WATER_PUMP_LPH + hh * BASE_WATER_PER_PERSON)
+    return max(kwh, MIN_DAILY_KWH), water
+
+def test_daily_usage_matches_the_per_appliance_sum():
+    hh = [1, 3, 2]
+    elec, water, co2 = daily_usage(RECORDS, hh)
+    for i, r in enumerate(RECORDS):
+        want_kwh, want_water = _by_hand(r, hh[i])
+        assert elec[i] == pytest.approx(want_kwh) and water[i] == want_water
+    assert co2 == pytest.approx(co2_kg(elec, water))
+    assert elec[2] == MIN_DAILY_KWH
+
+def test_record_shapes_give_the_same_answer():
+    frame = pd.DataFrame(RECORDS)
+    columns = {k: frame[k].tolist() for k in frame.columns}
+    for records in (frame, columns):
+        elec, water, _ = daily_usage(records, 2)
+        want = daily_usage(RECORDS, 2)
+        assert np.allclose(elec, want[0]) and list(water) == list(want[1])
+    assert len(daily_usage([], 1)[0]) == 0
+
+def test_whatif_grid_cells_match_the_form_maths():
+    grid = whatif_grid(latest_kwh=8.0, latest_liters=300, hh_size=3)
+    shape = (len(appliances.WHATIF_AC_HOURS), len(appliances.WHATIF_SHOWER_MINS), len(appliances.WHATIF_LED))
+    assert all(v.shape == shape for v in grid.values())
+    for ac, shower, led in ((0, 0, False), (1.5, 4, True), (4, 10, True)):
+        kwh, liters, co2 = whatif_savings(ac, shower, led)
+        cell = whatif_lookup(grid, ac, shower, led)
+        assert (cell["kwh"], cell["liters"], cell["co2_kg"]) == pytest.approx((kwh, liters, co2))
+        assert cell["kwh_pct"] == pytest.approx(100 * kwh / 8.0)
+        assert cell["liters_pct"] == pytest.approx(100 * liters / 300)
+        assert cell["liters_per_person"] == pytest.approx(max(300 - liters, 0) / 3)
+
+def test_lookup_snaps_to_the_nearest_slider_position():
+    grid = whatif_grid(8.0, 300)
+    assert whatif_lookup(grid, 1.3, 4.4)["kwh"] == whatif_lookup(grid, 1.25, 4)["kwh"]
+    assert whatif_lookup(grid, 99, 99, True)["liters"] == whatif_lookup(grid, 4, 10, True)["liters"]
+
+def test_grid_without_a_latest_day_leaves_the_shares_undefined():
+    cell = whatif_lookup(whatif_grid(), 1, 2)
+    assert cell["kwh"] > 0 and cell["liters"] > 0
+    assert all(math.isnan(cell[k]) for k in ("kwh_pct", "liters_pct", "liters_per_person"))
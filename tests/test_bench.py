@@ -0,0 +1,64 @@
+import json
+from datetime import date
+
+from ecosaver import bench
+from ecosaver.synth import generate_cohort, write_cohort
+
+END = date(2024, 6, 30)
+
+
+def test_cohort_is_reproducible_and_chunked():
+    chunks = list(generate_cohort(5, 10, seed=3, end_date=END, users_per_chunk=2))
+    assert [len(c) for c in chunks] == [20, 20, 10]
+    records = [r for c in chunks for r in c]
+    assert records == [r for c in generate_cohort(5, 10, seed=3, end_date=END, users_per_chunk=2) for r in c]
+    assert records != [r for c in generate_cohort(5, 10, seed=4, end_date=END, users_per_chunk=2) for r in c]
+
+    assert sorted({r[0] for r in records}) == ["user0", "user1", "user2", "user3", "user4"]
+    assert min(r[1] for r in records) == "2024-06-21" and max(r[1] for r in records) == "2024-06-30"
+    for name, _, elec, water, hh in records:
+        assert elec >= 0.1 and water >= 10 and 1 <= hh <= 5
+    # Household size is fixed per user.
+    assert len({(r[0], r[4]) for r in records}) == 5
+
+def test_write_cohort_stores_one_row_per_user_and_day(conn):
+    assert write_cohort(conn, 4, 7, seed=1, end_date=END) == 28
+    assert conn.execute("SELECT COUNT(*), COUNT(DISTINCT user_id), MAX(date) FROM usage").fetchone() == (
+        28, 4, "2024-06-30")
+
+def test_measure_reports_latency_and_throughput():
+    calls = []
+    r = bench.measure(lambda: calls.append(1), items=50, repeat=4, warmup=2)
+    assert len(calls) == 2 + 4 + 1  # warmup, timed runs, one traced run for peak memory
+    assert r["items"] == 50 and r["repeat"] == 4
+    assert r["min_ms"] <= r["p50_ms"] <= r["p95_ms"] <= r["p99_ms"]
+    assert r["peak_mem_mb"] >= 0
+
+def test_compare_counts_cases_over_the_threshold(capsys):
+    results = {"a": {"p50_ms": 13.0}, "b": {"p50_ms": 9.0}, "unseen": {"p50_ms": 1.0}}
+    baseline = {"results": {"a": {"p50_ms": 10.0}, "b": {"p50_ms": 10.0}}}
+    assert bench.compare(results, baseline, threshold=1.2) == 1
+    assert bench.compare(results, baseline, threshold=1.5) == 0
+    out = capsys.readouterr().out
+    assert "REGRESSION" in out and "unseen" not in out
+
+def test_main_generates_a_cohort_and_writes_the_report(tmp_path, capsys):
+    db, report = str(tmp_path / "bench.db"), str(tmp_path / "report.json")
+    argv = ["--db", db, "--users", "6", "--days", "20", "--repeat", "2",
+            "--only", "load_usage_df", "leaderboard.", "--json", report]
+    assert bench.main(argv) == 0
+    assert "Generated 120 rows" in capsys.readouterr().out
+    with open(report, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["meta"]["users"] == 6 and data["meta"]["rows"] == 120
+    assert sorted(data["results"]) == ["leaderboard.top_k", "leaderboard.user_rank",
+                                       "load_usage_df.user", "load_usage_df.window"]
+
+    # A second run against the same file reuses the rows and compares to the first report.
+    assert bench.main(["--db", db, "--repeat", "2", "--only", "load_usage_df.user",
+                       "--compare", report, "--threshold", "1000"]) == 0
+    assert "Generated" not in capsys.readouterr().out
+
+def test_main_reports_an_empty_database(tmp_path, capsys):
+    assert bench.main(["--db", str(tmp_path / "empty.db"), "--repeat", "1"]) == 1
+    assert "no usage rows" in capsys.readouterr().err
@@ -0,0 +1,52 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ecosaver import charts
+
+
+def _series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"date": pd.date_range("2020-01-01", periods=n, freq="D"),
+                         "electricity_units": rng.normal(5, 1, n).round(2),
+                         "water_liters": rng.integers(50, 300, n)})
+
+def test_lttb_keeps_the_endpoints_and_the_peak():
+    df = _series(5000)
+    df.loc[2345, "electricity_units"] = 50.0
+    idx = charts.lttb_indices(df["date"].to_numpy(), df["electricity_units"].to_numpy(), 200)
+    assert len(idx) == 200 and idx[0] == 0 and idx[-1] == len(df) - 1
+    assert list(idx) == sorted(set(idx))
+    assert 2345 in idx
+
+def test_minmax_keeps_every_buckets_extremes():
+    y = np.tile([1.0, 9.0, 5.0, 5.0], 1000)
+    idx = charts.minmax_indices(y, 102)
+    assert len(idx) <= 102 and idx[0] == 0 and idx[-1] == len(y) - 1
+    kept = y[idx]
+    assert kept.min() == 1.0 and kept.max() == 9.0
+    assert list(idx) == sorted(idx)
+
+def test_small_series_are_not_decimated():
+    df = _series(50)
+    assert charts.downsample(df, "date", "electricity_units", budget=50) is df
+    assert list(charts.lttb_indices(df["date"], df["electricity_units"], 2)) == list(range(50))
+    with pytest.raises(ValueError, match="Unknown downsampling method"):
+        charts.downsample(_series(100), "date", "electricity_units", budget=10, method="mean")
+
+def test_figure_payloads_carry_at_most_the_budget():
+    big, small = _series(3000), _series(40)
+    line = json.loads(charts.line_json(big, "date", "electricity_units", "Electricity", budget=300))
+    trace = line["data"][0]
+    assert trace["type"] == "scattergl" and len(trace["x"]) == 300
+    assert "(300 of 3,000 points)" in line["layout"]["title"]["text"]
+
+    bar = json.loads(charts.bar_json(big, "date", "water_liters", "Water", budget=300))
+    assert len(bar["data"][0]["x"]) <= 300
+
+    elec, water = charts.user_charts(small)
+    fig = charts.from_json(elec)
+    assert len(fig.data[0].x) == 40 and fig.layout.title.text == "Electricity (kWh) over time"
+    assert len(charts.from_json(water).data[0].x) == 40
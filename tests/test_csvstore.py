@@ -0,0 +1,43 @@
+import os
+
+from ecosaver import csvstore
+
+
+def _append(log, rows):
+    for name, day, kwh in rows:
+        csvstore.append_entry({"name": name, "date": day, "electricity_units": kwh,
+                               "water_liters": 100, "household_size": 2}, log)
+
+def test_compact_keeps_superseded_partitions_for_old_readers(tmp_path):
+    log = str(tmp_path / "usage.csv")
+    _append(log, [("a", "2024-01-01", 1.0), ("b", "2024-01-02", 2.0)])
+    csvstore.compact(log)
+    parts = csvstore.parts_dir_for(log)
+    stale = csvstore._read_manifest(parts)
+    _append(log, [("a", "2024-01-03", 3.0)])
+    csvstore.compact(log)
+    # A reader that loaded the manifest before the second compaction can still open its partition.
+    old_dir = os.path.join(parts, stale["partitions"]["2024-01"])
+    assert len(csvstore._read_partition(old_dir)) == 2
+    assert len(csvstore.load_data(log)) == 3
+
+def test_expired_partitions_are_deleted_and_readers_retry(tmp_path, monkeypatch):
+    monkeypatch.setattr(csvstore, "RETIRE_GRACE_SECONDS", 0)
+    log = str(tmp_path / "usage.csv")
+    parts = csvstore.parts_dir_for(log)
+    _append(log, [("a", "2024-01-01", 1.0)])
+    csvstore.compact(log)
+    stale = csvstore._read_manifest(parts)
+    for day in ("2024-01-02", "2024-01-03"):
+        _append(log, [("a", day, 2.0)])
+        csvstore.compact(log)
+    assert not os.path.exists(os.path.join(parts, stale["partitions"]["2024-01"]))
+
+    # The first manifest read returns the stale layout, as if compaction ran mid-read.
+    real, calls = csvstore._read_manifest, []
+    def racing(parts_dir):
+        calls.append(parts_dir)
+        return stale if len(calls) == 1 else real(parts_dir)
+    monkeypatch.setattr(csvstore, "_read_manifest", racing)
+    df = csvstore.load_data(log)
+    assert len(df) == 3 and sorted(df["electricity_units"]) == [1.0, 2.0, 2.0]
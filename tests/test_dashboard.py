@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+from ecosaver import dashboard
+from ecosaver.carbon import AC_KWH_PER_HOUR, LED_SWAP_KWH, SHOWER_LITERS_PER_MIN, co2_kg, whatif_savings
+from ecosaver.leaderboard import refresh_leaderboard
+from ecosaver.storage import add_usage_bulk
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("pandas", "numpy", "scipy", "statsmodels", "plotly", "streamlit")
+
+
+@pytest.mark.parametrize("module", ["ecosaver.storage", "ecosaver.trend_stats", "ecosaver.dashboard",
+                                    "ecosaver.carbon", "ecosaver.leaderboard", "ecosaver.pool"])
+def test_headless_modules_import_without_heavy_dependencies(module):
+    probe = f"import sys, {module}; print(' '.join(m for m in {HEAVY!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True,
+                         cwd=ROOT).stdout
+    assert out.strip() == ""
+
+def test_dashboard_pass_computes_every_panel(conn):
+    today = date.today()
+    add_usage_bulk(conn, [(name, (today - timedelta(days=i)).isoformat(), base + i % 3, 100 + i, 2)
+                          for name, base in (("asha", 2.0), ("ben", 4.0)) for i in range(10)])
+    refresh_leaderboard(conn)
+    users, agg, score, tips, lb, stats = dashboard.dashboard_pass(conn, "asha")
+    assert users == ["asha", "ben"]
+    assert len(agg) == 10 and list(agg.columns) == ["date", "electricity_units", "water_liters"]
+    assert 0 <= score <= 100 and tips
+    assert list(lb.columns) == dashboard.LEADERBOARD_COLUMNS and len(lb) == 2
+    assert [s[:2] for s in stats] == [("asha", 10), ("ben", 10)]
+
+def test_whatif_savings():
+    elec, water, co2 = whatif_savings(2, 5, change_led=True)
+    assert elec == pytest.approx(2 * AC_KWH_PER_HOUR + LED_SWAP_KWH)
+    assert water == 5 * SHOWER_LITERS_PER_MIN
+    assert co2 == pytest.approx(co2_kg(elec, water))
+    assert whatif_savings(0, 0) == (0.0, 0, 0.0)
@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+import pytest
+
+from ecosaver.estimator import (
+    ESTIMATE_KEYS, EstimationError, Estimator, StubBackend, TTLCache, estimate_and_add_usage,
+    normalize_activity, parse_response, usage_from_estimate,
+)
+
+
+class FlakyBackend:
+    """Fails the first `failures` calls, then answers like the stub."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+        self.stub = StubBackend()
+
+    def generate(self, prompt):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("backend down")
+        return self.stub.generate(prompt)
+
+
+class SlowAsyncBackend:
+    """Async backend that records how many calls overlap."""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.active = self.peak = self.calls = 0
+        self.stub = StubBackend()
+
+    async def agenerate(self, prompt):
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return self.stub.generate(prompt)
+
+
+def test_parse_response_reads_fenced_json_and_fills_missing_keys():
+    raw = '```json\n{"num_acs": "2", "duration_ac_hours": 4, "num_fans": "many"}\n```'
+    data = parse_response(raw, ESTIMATE_KEYS)
+    assert list(data) == ESTIMATE_KEYS
+    assert data["num_acs"] == 2.0 and data["duration_ac_hours"] == 4.0
+    assert data["num_fans"] == 0.0 and data["num_lights"] == 0.0
+    assert parse_response('{"x": 1}') == {"x": 1.0}
+    with pytest.raises(ValueError):
+        parse_response("[1, 2]")
+    with pytest.raises(ValueError):
+        parse_response("__import__('os')")
+
+def test_stub_backend_extracts_counts_and_hours():
+    est = Estimator(StubBackend()).estimate("Two ACs for 4 hours, 3 fans and a microwave for 30 minutes")
+    assert est["num_acs"] == 2 and est["duration_ac_hours"] == 4
+    assert est["num_fans"] == 3
+    assert est["duration_microwave_hours"] == pytest.approx(0.5)
+    assert est["num_heaters"] == 0
+
+def test_ttl_cache_expires_and_evicts_least_recently_used():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # "b" was used least recently
+    assert cache.get("b") is None and cache.get("a") == 1
+    now[0] = 10
+    assert cache.get("a") is None and len(cache) == 1
+    assert (cache.hits, cache.misses) == (2, 2)
+
+def test_equivalent_texts_share_one_backend_call():
+    backend = StubBackend()
+    est = Estimator(backend)
+    texts = ["2 ACs for 4 hours", "  2 acs   for 4 HOURS.", "fan and 3 lights", "2 ACs for 4 hours"]
+    out = est.estimate_many(texts)
+    assert backend.calls == 2
+    assert out[0] == out[1] == out[3] and out[2]["num_lights"] == 3
+    out[0]["num_acs"] = 99  # results are copies, not the cached dicts
+    assert est.estimate("2 acs for 4 hours")["num_acs"] == 2 and backend.calls == 2
+    assert normalize_activity(" Fan  and 3 lights! ") == "fan and 3 lights"
+
+def test_calls_run_concurrently_under_the_limit():
+    backend = SlowAsyncBackend()
+    est = Estimator(backend, max_concurrency=3)
+    out = est.estimate_many([f"{i} fans" for i in range(1, 10)])
+    assert [o["num_fans"] for o in out] == list(range(1, 10))
+    assert backend.calls == 9 and backend.peak == 3
+
+def test_failures_are_retried_then_reported():
+    backend = FlakyBackend(failures=2)
+    assert Estimator(backend, retries=2, backoff=0).estimate("3 lights")["num_lights"] == 3
+    assert backend.calls == 3
+
+    est = Estimator(FlakyBackend(failures=100), retries=1, backoff=0)
+    with pytest.raises(EstimationError, match="after 2 attempts"):
+        est.estimate("3 lights")
+    out = est.estimate_many(["3 lights", "fan"], return_exceptions=True)
+    assert all(isinstance(o, EstimationError) for o in out)
+    assert len(est.cache) == 0  # failures are not cached
+
+def test_bad_replies_count_as_failures():
+    class Garbage:
+        def generate(self, prompt):
+            return "not json"
+
+    with pytest.raises(EstimationError):
+        Estimator(Garbage(), retries=0).estimate("fan")
+
+def test_batch_estimates_are_written_in_one_transaction(conn):
+    est = Estimator(StubBackend())
+    entries = [("asha", "2024-03-01", "2 ACs for 4 hours", 3), ("ben", "2024-03-01", "fan and 3 lights", 1)]
+    assert estimate_and_add_usage(conn, est, entries) == 2
+    rows = conn.execute("""
+        SELECT us.username, u.electricity_units, u.water_liters FROM usage u
+        JOIN users us ON u.user_id = us.id ORDER BY us.username""").fetchall()
+    for (name, _, text, hh), (got_name, elec, water) in zip(entries, rows):
+        assert got_name == name
+        assert (elec, water) == pytest.approx(usage_from_estimate(est.estimate(text), hh))
+
+    failing = Estimator(FlakyBackend(failures=100), retries=0)
+    with pytest.raises(EstimationError):
+        estimate_and_add_usage(conn, failing, [("chen", "2024-03-01", "fan", 1)])
+    assert conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 2
+
+def test_stub_replies_are_plain_json():
+    reply = StubBackend().generate('The user input is: "a heater for 2 hrs"')
+    assert json.loads(reply)["duration_heater_hours"] == 2
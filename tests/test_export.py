@@ -0,0 +1,105 @@
+import csv
+import io
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from ecosaver import config, csvstore, export
+from ecosaver.sources import get_source_conn
+from ecosaver.storage import add_usage_bulk
+
+START = date(2024, 1, 30)
+
+
+def _day(i):
+    return (START + timedelta(days=i)).isoformat()
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    for name in ("home", "school"):
+        monkeypatch.setitem(config.DATA_SOURCES, name, str(tmp_path / f"{name}.db"))
+    home, school = get_source_conn("home"), get_source_conn("school")
+    add_usage_bulk(home, [(name, _day(i), 1.0 + i, 100 + i, 2) for name in ("asha", "ben") for i in range(5)])
+    add_usage_bulk(school, [("asha", _day(i), 0.5, 20, 2) for i in range(3)])
+    home.close()
+    school.close()
+    return tmp_path
+
+def _rows(conn):
+    return [r for chunk in export.iter_usage_chunks(conn) for r in chunk]
+
+def test_chunks_are_bounded_and_filtered(sources):
+    conn = get_source_conn("home")
+    try:
+        chunks = list(export.iter_usage_chunks(conn, chunk_size=3))
+        assert [len(c) for c in chunks] == [3, 3, 3, 1]
+        rows = [r for c in chunks for r in c]
+        assert rows[0] == ("asha", _day(0), 1.0, 100, 2)
+        assert [r[1] for r in rows] == sorted(r[1] for r in rows)
+        some = [r for c in export.iter_usage_chunks(conn, _day(1), _day(2), " Ben ") for r in c]
+        assert some == [("ben", _day(1), 2.0, 101, 2), ("ben", _day(2), 3.0, 102, 2)]
+    finally:
+        conn.close()
+
+def test_formats_round_trip(sources):
+    conn = get_source_conn("home")
+    try:
+        want = _rows(conn)
+    finally:
+        conn.close()
+
+    out = sources / "usage.csv"
+    assert export.export_usage(str(out), "csv", chunk_size=4) == len(want)
+    with open(out, newline="", encoding="utf-8") as f:
+        got = list(csv.reader(f))
+    assert got[0] == export.EXPORT_COLUMNS
+    assert [(n, d, float(e), int(w), int(h)) for n, d, e, w, h in got[1:]] == want
+
+    buf = io.BytesIO()
+    assert export.export_usage(buf, "jsonl") == len(want)
+    lines = [json.loads(l) for l in buf.getvalue().decode("utf-8").splitlines()]
+    assert [tuple(l[c] for c in export.EXPORT_COLUMNS) for l in lines] == want
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    out = sources / "usage.parquet"
+    assert export.export_usage(str(out), "parquet", chunk_size=4) == len(want)
+    table = pq.read_table(out)
+    assert table.column_names == export.EXPORT_COLUMNS and len(table) == len(want)
+    assert pq.ParquetFile(out).metadata.num_row_groups == 3  # one per chunk
+
+def test_several_sources_are_tagged(sources):
+    buf = io.BytesIO()
+    assert export.export_usage(buf, "csv", sources=["home", "school"], username="asha") == 8
+    rows = list(csv.reader(io.StringIO(buf.getvalue().decode("utf-8"))))
+    assert rows[0] == ["source"] + export.EXPORT_COLUMNS
+    assert [r[0] for r in rows[1:]] == ["home"] * 5 + ["school"] * 3
+
+def test_format_names_and_errors(sources):
+    assert [export.format_for(p) for p in ("a.csv", "a.JSON", "a.ndjson", "a.pq", "a.parquet", "a.txt")] == [
+        "csv", "jsonl", "jsonl", "parquet", "parquet", "csv"]
+    with pytest.raises(ValueError, match="Unknown export format"):
+        export.write_chunks(["a"], [[(1,)]], io.BytesIO(), "xlsx")
+
+def test_cli_writes_the_requested_file(sources, capsys):
+    out = str(sources / "asha.jsonl")
+    assert export.main(["--out", out, "--source", "home", "--user", "asha", "--start", _day(3)]) == 0
+    assert "Exported 2 rows" in capsys.readouterr().out
+    with open(out, encoding="utf-8") as f:
+        assert [json.loads(l)["date"] for l in f] == [_day(3), _day(4)]
+
+def test_csv_log_chunks_match_load_data(tmp_path):
+    log = str(tmp_path / "usage.csv")
+    for i in range(4):
+        csvstore.append_entry({"name": " Asha", "date": _day(i), "electricity_units": 1.5 + i,
+                               "water_liters": 100, "household_size": 2}, log)
+    csvstore.compact(log)  # January and February partitions
+    csvstore.append_entry({"name": "ben", "date": _day(5), "electricity_units": 2.0,
+                           "water_liters": 90, "household_size": 1}, log)
+    chunks = list(csvstore.iter_chunks(log))
+    assert [len(c) for c in chunks] == [2, 2, 1]
+    rows = [r for c in chunks for r in c]
+    df = csvstore.load_data(log)
+    assert [r[1] for r in rows] == df["date"].dt.strftime("%Y-%m-%d").tolist()
+    assert rows[0] == ("asha", _day(0), 1.5, 100, 2) and rows[-1] == ("ben", _day(5), 2.0, 90, 1)
+    assert [len(c) for c in csvstore.iter_chunks(log, start_date=_day(2))] == [2, 1]
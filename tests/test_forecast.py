@@ -0,0 +1,93 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from ecosaver import forecast
+from ecosaver.storage import add_usage, add_usage_bulk, write_user
+
+START = date(2024, 1, 1)  # a Monday
+WEEKLY = [0.0, 0.3, 0.1, 0.2, 0.5, 1.5, 1.2]
+
+
+def _day(i):
+    return (START + timedelta(days=i)).isoformat()
+
+def _epoch_days(i):
+    return (START + timedelta(days=i) - date(1970, 1, 1)).days
+
+def _exact(i):
+    """Noise-free usage on day i: trend plus a weekday effect."""
+    return 2.0 + 0.05 * i + WEEKLY[i % 7]
+
+def test_batched_fit_matches_per_group_least_squares():
+    rng = np.random.default_rng(7)
+    groups = {0: 40, 1: 8, 2: 2}  # seasonal, trend only, too short
+    codes, days, y = [], [], []
+    for g, n in groups.items():
+        d = np.sort(rng.choice(60, n, replace=False))
+        codes += [g] * n
+        days += [_epoch_days(int(i)) for i in d]
+        y += list(rng.normal(3, 1, n) + 0.02 * d)
+    codes, days, y = np.array(codes), np.array(days), np.array(y)
+    order = rng.permutation(len(y))  # rows in any order
+    fit = forecast.fit_groups(codes[order], days[order], y[order], len(groups))
+
+    assert list(fit["n"]) == [40, 8, 2]
+    pred = forecast.next_day(fit)
+    for g, seasonal in ((0, True), (1, False)):
+        m = codes == g
+        x = (days[m] - days[m].max()).astype(float)
+        cols = [np.ones(m.sum()), x]
+        if seasonal:
+            wd = forecast._weekday(days[m])
+            cols += [(wd == k).astype(float) for k in range(1, 7)]
+        beta, *_ = np.linalg.lstsq(np.column_stack(cols), y[m], rcond=None)
+        nxt = forecast._weekday(days[m].max() + 1)
+        want = beta[0] + beta[1] + (beta[1 + nxt] if seasonal and nxt > 0 else 0.0)
+        assert pred[g] == pytest.approx(want, rel=1e-9)
+    assert np.isnan(pred[2]) and np.isnan(fit["sigma2"][2])
+
+def test_exact_weekly_pattern_is_recovered():
+    n = 56
+    fit = forecast.fit_groups(np.zeros(n, int), [_epoch_days(i) for i in range(n)],
+                              [_exact(i) for i in range(n)], 1)
+    out = forecast.predict(fit, horizons=(7, 1, 30))
+    for j, h in enumerate((1, 7, 30)):
+        assert out["pred"][0, j] == pytest.approx(_exact(n - 1 + h))
+        assert out["total"][0, j] == pytest.approx(sum(_exact(n - 1 + k) for k in range(1, h + 1)))
+        assert out["day"][0, j] == _epoch_days(n - 1 + h)
+        assert out["upper"][0, j] - out["lower"][0, j] == pytest.approx(0, abs=1e-6)
+
+def test_intervals_widen_with_the_horizon():
+    rng = np.random.default_rng(3)
+    n = 60
+    fit = forecast.fit_groups(np.zeros(n, int), [_epoch_days(i) for i in range(n)],
+                              [_exact(i) + rng.normal(0, 0.3) for i in range(n)], 1)
+    out = forecast.predict(fit)
+    width = (out["upper"] - out["lower"])[0]
+    assert np.all(out["lower"] < out["pred"]) and np.all(out["pred"] < out["upper"])
+    assert np.all(out["total_lower"] < out["total"]) and np.all(out["total"] < out["total_upper"])
+    assert width[0] < width[-1]
+
+def test_stored_fits_are_reused_until_the_user_changes(conn):
+    add_usage_bulk(conn, [(name, _day(i), _exact(i) + off, 100, 2)
+                          for name, off in (("asha", 0.0), ("ben", 1.0)) for i in range(30)]
+                   + [("chen", _day(0), 1.0, 100, 2)])
+    frame, pending = forecast.forecasts(conn)
+    assert list(frame.columns) == forecast.FORECAST_COLUMNS
+    assert frame.index.get_level_values("username").unique().tolist() == ["asha", "ben", "chen"]
+    assert frame.loc[("asha", 1), "pred"] == pytest.approx(_exact(30))
+    assert np.isnan(frame.loc[("chen", 1), "pred"])
+    assert pending is not None and len(pending[1]) == 3
+
+    assert forecast.refresh_forecasts(conn) == 3
+    stored, pending = forecast.forecasts(conn)
+    assert pending is None
+    assert np.allclose(stored["pred"], frame["pred"], equal_nan=True)
+
+    add_usage(conn, write_user(conn, "ben"), _day(30), 50.0, 100, 2)
+    _, pending = forecast.forecasts(conn)
+    assert pending[1] == [write_user(conn, "ben")]
+    assert forecast.refresh_forecasts(conn, ["ben"]) == 1
+    assert forecast.refresh_forecasts(conn) == 0
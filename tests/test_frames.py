@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from ecosaver import csvstore, frames
+from ecosaver.storage import add_usage_bulk, load_usage_df
+
+
+def _frame():
+    return pd.DataFrame({
+        "username": ["ben", "asha", "ben", "asha", "chen", "asha"],
+        "date": pd.to_datetime(["2024-03-02", "2024-03-03", "2024-03-01", "2024-03-01", "2024-03-05", "2024-03-02"]),
+        "electricity_units": [2.0, 3.0, 1.0, 1.5, 9.0, 2.5],
+        "water_liters": np.array([100, 110, 90, 95, 300, 105], dtype="int64"),
+        "household_size": np.array([2, 3, 2, 3, 1, 3], dtype="int64"),
+    })
+
+def test_compact_usage_narrows_without_changing_values():
+    df = _frame()
+    small = frames.compact_usage(df)
+    assert isinstance(small["username"].dtype, pd.CategoricalDtype)
+    assert (small["water_liters"].dtype, small["household_size"].dtype) == (np.int32, np.int16)
+    assert small["electricity_units"].dtype == np.float64
+    pd.testing.assert_frame_equal(small.astype(df.dtypes.to_dict()), df)
+    assert frames.compact_usage(small) is small
+
+    with_nan = df.assign(water_liters=df["water_liters"].astype(float).where(df.index > 0))
+    assert frames.compact_usage(with_nan)["water_liters"].dtype == np.float64
+
+def test_frame_from_rows_uses_the_compact_dtypes():
+    rows = [("asha", "2024-03-01", 1.5, 95, 3), ("ben", "2024-03-02", 2.0, 100, 2)]
+    cols = ["username", "date", "electricity_units", "water_liters", "household_size"]
+    df = frames.frame_from_rows(rows, cols)
+    assert isinstance(df["username"].dtype, pd.CategoricalDtype)
+    assert {c: str(df[c].dtype) for c in cols[1:]} == {c: frames.ROW_DTYPES[c] for c in cols[1:]}
+    assert df.values.tolist() == [["asha", pd.Timestamp("2024-03-01"), 1.5, 95, 3],
+                                  ["ben", pd.Timestamp("2024-03-02"), 2.0, 100, 2]]
+    empty = frames.frame_from_rows([], cols)
+    assert list(empty.columns) == cols and empty.empty
+
+def test_user_index_gives_each_users_rows_in_date_order():
+    df = frames.compact_usage(_frame())
+    ordered, ranges = frames.index_by_user(df)
+    assert list(ranges) == ["asha", "ben", "chen"]
+    for user in ranges:
+        du = frames.user_rows(ordered, ranges, user)
+        want = df[df["username"] == user].sort_values("date")
+        assert du["date"].tolist() == want["date"].tolist()
+        assert du["electricity_units"].tolist() == want["electricity_units"].tolist()
+    assert frames.user_rows(ordered, ranges, "nobody").empty
+
+    # Object-dtype names index the same way.
+    _, plain = frames.index_by_user(_frame())
+    assert plain == ranges
+    assert frames.index_by_user(df.iloc[:0])[1] == {}
+
+def test_loaders_return_compact_frames(conn, tmp_path):
+    add_usage_bulk(conn, [("asha", "2024-03-01", 1.5, 95, 3), ("ben", "2024-03-01", 2.0, 100, 2)])
+    df = load_usage_df(conn, "2024-03-01", "2024-03-01")
+    assert isinstance(df["username"].dtype, pd.CategoricalDtype) and df["water_liters"].dtype == np.int32
+
+    log = str(tmp_path / "usage.csv")
+    for name in (" Asha", "asha", "BEN"):
+        csvstore.append_entry({"name": name, "date": "2024-03-01", "electricity_units": 1.0,
+                               "water_liters": 100, "household_size": 2}, log)
+    data = csvstore.load_data(log)
+    assert isinstance(data["name"].dtype, pd.CategoricalDtype)
+    assert sorted(data["name"].astype(str)) == ["asha", "asha", "ben"]
@@ -0,0 +1,53 @@
+import json
+import sqlite3
+from datetime import date, timedelta
+
+from ecosaver import dashboard, leaderboard, migrations, perf
+from ecosaver.storage import add_usage, add_usage_bulk, write_user
+
+
+def _fill(conn, users=12):
+    today = date.today()
+    add_usage_bulk(conn, [(f"user{k:02}", (today - timedelta(days=i)).isoformat(), 2.0 + (i * k) % 5, 100, 2)
+                          for k in range(users) for i in range(6)])
+
+def test_refresh_recomputes_only_queued_users_until_the_day_changes(conn):
+    _fill(conn)
+    assert leaderboard.refresh_leaderboard(conn) == 12
+    assert leaderboard.stored_window(conn) == leaderboard.leaderboard_range()
+    assert leaderboard.refresh_leaderboard(conn) == 0
+
+    add_usage(conn, write_user(conn, "user03"), date.today().isoformat(), 0.5, 100, 2)
+    assert leaderboard.refresh_leaderboard(conn) == 1
+    assert leaderboard.refresh_leaderboard(conn, date.today() + timedelta(days=1)) == 12
+
+def test_dashboard_lists_every_ranked_user(conn):
+    _fill(conn)
+    leaderboard.refresh_leaderboard(conn)
+    lb = dashboard.leaderboard_view(conn)
+    assert len(lb) == 12 and list(lb["score"]) == sorted(lb["score"], reverse=True)
+    assert len(leaderboard.top_k(conn)) == leaderboard.LEADERBOARD_TOP_K
+
+def test_v10_moves_the_window_out_of_meta(db_file):
+    conn = sqlite3.connect(db_file)
+    conn.execute("DROP TABLE leaderboard_window")
+    conn.execute("INSERT INTO meta (key, value) VALUES ('leaderboard_window', '2024-01-01/2024-01-08')")
+    conn.execute("PRAGMA user_version = 9")
+    conn.commit()
+    assert migrations.migrate(conn) == migrations.LATEST_VERSION
+    assert leaderboard.stored_window(conn) == ("2024-01-01", "2024-01-08")
+    assert conn.execute("SELECT value FROM meta WHERE key = 'leaderboard_window'").fetchone() is None
+    conn.close()
+
+def test_failed_refresh_goes_to_the_metrics_log(conn, tmp_path, monkeypatch):
+    log = tmp_path / "metrics.jsonl"
+    monkeypatch.setattr(perf, "METRICS_LOG", str(log))
+    monkeypatch.delenv(perf.ENV_VAR, raising=False)
+    leaderboard._refresh_tick(conn)
+    assert not log.exists()  # a good tick is only recorded with ECOSAVER_PERF=1
+
+    conn.execute("DROP TABLE leaderboard_dirty")
+    leaderboard._refresh_tick(conn)
+    (record,) = [json.loads(line) for line in log.read_text().splitlines()]
+    assert record["label"] == "leaderboard.refresh"
+    assert record["counters"] == {"leaderboard.refresh_failed.OperationalError": 1}
@@ -0,0 +1,59 @@
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from ecosaver.config import DEFAULT_HISTORY_DAYS
+from ecosaver.storage import add_usage_bulk, load_usage_df
+
+LATEST = date(2024, 6, 30)
+
+
+def _day(back):
+    return (LATEST - timedelta(days=back)).isoformat()
+
+def pd_day(back):
+    return pd.Timestamp(_day(back))
+
+@pytest.fixture
+def history(conn):
+    add_usage_bulk(conn, [(name, _day(i), float(i), 100 + i, 2)
+                          for name, days in (("asha", range(0, 60)), ("ben", range(0, 60, 7)), ("chen", (45, 50)))
+                          for i in days])
+    return conn
+
+def test_default_window_is_anchored_to_the_latest_date(history):
+    df = load_usage_df(history)
+    assert df["date"].min() == pd_day(DEFAULT_HISTORY_DAYS) and df["date"].max() == pd_day(0)
+    assert "chen" not in set(df["username"])
+    assert list(df["date"]) == sorted(df["date"])
+    # asha's days 0..30 and ben's weekly readings: the window counts back from 2024-06-30, not today.
+    assert len(df) == (DEFAULT_HISTORY_DAYS + 1) + len(range(0, DEFAULT_HISTORY_DAYS + 1, 7))
+
+def test_one_sided_bounds_and_user_filters(history):
+    assert load_usage_df(history, start_date=_day(3))["date"].min() == pd_day(3)
+    older = load_usage_df(history, end_date=_day(50))
+    assert older["date"].max() == pd_day(50) and older["username"].astype(str).tolist().count("chen") == 1
+    one = load_usage_df(history, username=" Ben ")
+    assert set(one["username"]) == {"ben"}
+    two = load_usage_df(history, LATEST - timedelta(days=59), LATEST, username=["ben", "chen"])
+    assert sorted(set(two["username"].astype(str))) == ["ben", "chen"] and len(two) == 9 + 2
+    assert load_usage_df(history, username=[]).empty
+
+def test_projection_returns_only_the_requested_columns(history):
+    df = load_usage_df(history, columns=["date", "electricity_units"])
+    assert list(df.columns) == ["date", "electricity_units"]
+    with pytest.raises(ValueError, match="Unknown usage columns"):
+        load_usage_df(history, columns=["date", "password"])
+
+def test_keyset_pages_cover_every_row_once(history):
+    full = load_usage_df(history, LATEST - timedelta(days=59), LATEST)
+    pages, after = [], None
+    while True:
+        page = load_usage_df(history, LATEST - timedelta(days=59), LATEST, after=after, limit=16)
+        if page.empty:
+            break
+        pages.append(page)
+        after = (page["date"].iloc[-1], page["usage_id"].iloc[-1])
+    assert [len(p) for p in pages[:-1]] == [16] * (len(pages) - 1)
+    assert [i for p in pages for i in p["usage_id"]] == list(full["usage_id"])
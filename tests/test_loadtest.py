@@ -0,0 +1,60 @@
+import json
+import os
+
+import pytest
+
+from ecosaver import loadtest, perf
+from ecosaver.config import DB_FILE
+from ecosaver.storage import get_conn
+
+
+def test_parse_mix():
+    assert loadtest.parse_mix(loadtest.DEFAULT_MIX) == {"login": 1, "switch": 4, "whatif": 3, "insert": 2}
+    assert loadtest.parse_mix("switch, insert=0.5,") == {"switch": 1.0, "insert": 0.5}
+    for bad, match in (("browse=1", "Unknown action"), ("switch=-1", "Negative weight"),
+                       ("switch=0", "weight of 0"), ("", "weight of 0")):
+        with pytest.raises(ValueError, match=match):
+            loadtest.parse_mix(bad)
+
+def test_prepare_workdir_generates_or_copies_the_database(tmp_path, db_file):
+    generated = loadtest.prepare_workdir(str(tmp_path / "gen"), users=3, days=5)
+    assert generated == os.path.join(str(tmp_path / "gen"), DB_FILE)
+    conn = get_conn(generated)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 15
+    finally:
+        conn.close()
+
+    # An existing empty database is filled; a copied one with rows is left as it is.
+    assert loadtest.prepare_workdir(str(tmp_path / "copy"), 2, 4, db=db_file)
+    conn = get_conn(os.path.join(str(tmp_path / "copy"), DB_FILE))
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 8
+    finally:
+        conn.close()
+    assert loadtest.prepare_workdir(str(tmp_path / "gen"), users=50, days=50) == generated
+    conn = get_conn(generated)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 15
+    finally:
+        conn.close()
+
+def test_concurrent_sessions_run_without_errors(app_dir, monkeypatch, capsys):
+    monkeypatch.setenv(perf.ENV_VAR, "1")
+    monkeypatch.setattr(loadtest, "BASELINE_ROUNDS", 1)
+    out = str(app_dir / "load.json")
+    assert loadtest.main(["--users", "12", "--days", "20", "--sessions", "2", "--seconds", "2",
+                          "--workdir", str(app_dir), "--json", out]) == 0
+    assert os.getcwd() == str(app_dir)
+    with open(out, encoding="utf-8") as f:
+        r = json.load(f)
+    assert r["sessions"] == 2 and r["reruns"] > 0
+    assert r["errors"] == 0, r["error_kinds"]
+    assert r["latency"]["all"]["n"] == r["reruns"]
+    assert r["pool"]["reruns_logged"] > 0
+    assert set(r["baseline"]) == set(loadtest.ACTIONS) | {"all"}
+    assert "p50" in capsys.readouterr().out
+
+def test_main_rejects_a_bad_mix(capsys):
+    assert loadtest.main(["--mix", "browse=1"]) == 1
+    assert "Unknown action" in capsys.readouterr().err
@@ -0,0 +1,41 @@
+import random
+from collections import defaultdict
+
+from ecosaver import meters
+
+START = meters.to_epoch("2024-01-30T00:00:00")  # spans a month boundary
+
+
+def _expected(conn):
+    """{(grain, meter_id, start): (n, total, min, max)} grouped in Python from the raw readings."""
+    groups = defaultdict(list)
+    for mid, ts, value in conn.execute("SELECT meter_id, ts, value FROM meter_readings"):
+        for grain in meters.GRAINS:
+            groups[(grain, mid, meters._floor(ts, grain))].append(value)
+    return {k: (len(v), round(sum(v), 6), min(v), max(v)) for k, v in groups.items()}
+
+def _stored(conn):
+    return {(g, mid, start): (n, round(total, 6), lo, hi)
+            for g, mid, start, n, total, lo, hi in conn.execute("SELECT * FROM meter_rollup")}
+
+def test_rollups_match_raw_group_by_after_overwrites(conn):
+    rng = random.Random(0)
+    readings = [(user, kind, START + i * 900, round(rng.uniform(0, 2), 3))
+                for user in ("asha", "ben") for kind in meters.KINDS for i in range(4 * 24 * 4)]
+    assert meters.ingest_readings(conn, readings, batch_size=500) == len(readings)
+    assert _stored(conn) == _expected(conn)
+
+    # Overwrite a few readings and add new ones in the next month only.
+    later = [(u, k, ts, v + 5) for u, k, ts, v in rng.sample(readings, 40)]
+    later += [("asha", "water", START + 40 * 86400 + i * 3600, 1.0) for i in range(30)]
+    meters.ingest_readings(conn, later)
+    assert _stored(conn) == _expected(conn)
+    assert {g for g, _, _ in _stored(conn)} == set(meters.GRAINS)
+
+def test_daily_usage_rows_follow_day_buckets(conn):
+    meters.ingest_readings(conn, [("asha", "electricity", START + h * 3600, 0.5) for h in range(48)])
+    rows = conn.execute("""
+        SELECT u.date, u.electricity_units FROM usage u JOIN users us ON us.id = u.user_id
+        WHERE us.username = 'asha' ORDER BY u.date
+    """).fetchall()
+    assert rows == [("2024-01-30", 12.0), ("2024-01-31", 12.0)]
@@ -0,0 +1,57 @@
+import warnings
+from datetime import datetime
+
+from ecosaver import migrations
+from ecosaver.storage import add_usage, add_user_if_not_exists, get_conn, load_usage_df
+
+
+def _snapshot(conn):
+    """Every table's rows plus the schema objects, for before/after comparisons."""
+    tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+    rows = {t: sorted(conn.execute(f"SELECT * FROM {t}").fetchall(), key=repr) for t in tables}
+    return rows, conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+
+def test_v0_database_is_upgraded_once(v0_db):
+    path = v0_db([(1, "2024-01-01", 3.0, 120, 2),
+                  (1, "2024-01-02 00:00:00", 4.0, 130, 2),  # not yet canonical
+                  (2, "2024-01-01", 2.5, 90, 1)])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        conn = get_conn(path)
+    assert migrations.schema_version(conn) == migrations.LATEST_VERSION
+    assert conn.execute("SELECT user_id, date, electricity_units FROM usage ORDER BY user_id, date").fetchall() == [
+        (1, "2024-01-01", 3.0), (1, "2024-01-02", 4.0), (2, "2024-01-01", 2.5)]
+    indexes = {r[1]: r[2] for r in conn.execute("PRAGMA index_list(usage)")}
+    assert indexes["idx_usage_date"] == 0 and indexes["idx_usage_user_date"] == 1
+    assert conn.execute("SELECT date, n, elec_sum FROM daily_rollup ORDER BY date").fetchall() == [
+        ("2024-01-01", 2, 5.5), ("2024-01-02", 1, 4.0)]
+    before = _snapshot(conn)
+    conn.close()
+
+    # Opening again and migrating again change nothing.
+    conn = get_conn(path)
+    assert migrations.migrate(conn) == migrations.LATEST_VERSION
+    assert _snapshot(conn) == before
+    conn.close()
+
+def test_reapplying_every_migration_is_a_no_op(conn):
+    add_usage(conn, add_user_if_not_exists(conn, "asha"), "2024-01-01", 3.0, 120, 2)
+    before = _snapshot(conn)
+    conn.execute("PRAGMA user_version = 0")
+    assert migrations.migrate(conn) == migrations.LATEST_VERSION
+    assert _snapshot(conn) == before
+
+def test_date_filters_range_scan_the_date_index(conn):
+    uid = add_user_if_not_exists(conn, "asha")
+    for day in range(1, 10):
+        add_usage(conn, uid, f"2024-01-0{day}", float(day), 100, 2)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    df = load_usage_df(conn, datetime(2024, 1, 3, 18, 30), "2024-01-05 00:00:00", columns=["date"])
+    conn.set_trace_callback(None)
+    assert df["date"].dt.day.tolist() == [3, 4, 5]
+
+    (select,) = [s for s in statements if s.lstrip().startswith("SELECT")]
+    plan = " ".join(r[-1] for r in conn.execute("EXPLAIN QUERY PLAN " + select))
+    assert "USING INDEX idx_usage_date (date>? AND date<?)" in plan
+    assert "TEMP B-TREE" not in plan  # rows come back in date order without a sort
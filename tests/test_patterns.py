@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ecosaver.patterns import ALERT_COLUMNS, Rule, detect_alerts, user_features
+
+MONDAY = pd.Timestamp("2024-03-04")
+
+
+def _frame(rows):
+    """rows: (username, day offset from a Monday, kWh, water L, household size)."""
+    return pd.DataFrame([(u, MONDAY + pd.Timedelta(days=d), e, w, h) for u, d, e, w, h in rows],
+                        columns=["username", "date", "electricity_units", "water_liters", "household_size"])
+
+@pytest.fixture
+def cohort():
+    rows = [("asha", d, e, 400, 2) for d, e in enumerate([2.0, 3.0, 4.0, 10.0])]
+    rows += [("ben", d, 3.0 if d >= 5 else 2.0, 240, 2) for d in range(7)]
+    rows += [("chen", d, 1.0 + 20 * d, 900, 1) for d in range(2)]
+    rows += [("dev", d, 2.0, 100, 1) for d in range(3)]
+    # Shuffled: the engine sorts by user and date itself.
+    return _frame(rows).sample(frac=1, random_state=0).reset_index(drop=True)
+
+def test_features_are_computed_per_user(cohort):
+    f = user_features(cohort)
+    assert list(f.index) == list(pd.unique(cohort["username"]))
+    asha, ben = f.loc["asha"], f.loc["ben"]
+    assert (asha["n"], asha["latest_elec"], asha["mean_elec"]) == (4, 10.0, 4.75)
+    assert asha["rising3"] and not ben["rising3"]
+    assert (ben["weekend_avg"], ben["weekday_avg"]) == (3.0, 2.0)
+    assert np.isnan(f.loc["dev", "weekend_avg"])
+    assert ben["water_per_person"] == 120.0
+
+def test_rules_fire_for_the_matching_users_only(cohort):
+    alerts = detect_alerts(cohort)
+    assert list(alerts.columns) == ALERT_COLUMNS
+    assert [tuple(r) for r in alerts[["username", "rule", "severity"]].itertuples(index=False)] == [
+        ("asha", "spike", "alert"),
+        ("asha", "water_per_person", "alert"),
+        ("asha", "rising_trend", "warning"),
+        ("ben", "water_per_person", "info"),
+        ("ben", "weekend_usage", "info"),
+    ]  # chen has too little history; dev is within every threshold
+    messages = dict(zip(alerts["rule"] + ":" + alerts["username"], alerts["message"]))
+    assert messages["spike:asha"] == "Sudden electricity spike: 10 units (mean 4.75)"
+    assert messages["water_per_person:asha"] == "High water per-person: 200 L/person (threshold 150 L)"
+    assert messages["water_per_person:ben"] == "Moderate water per-person: 120 L/person"
+    assert alerts.set_index(["username", "rule"]).loc[("ben", "weekend_usage"), "value"] == 1.5
+
+def test_custom_rules_and_empty_input(cohort):
+    heavy = Rule("heavy", lambda f: (f["mean_elec"].to_numpy(),
+                                     np.where(f["mean_elec"] > 4, "warning", None)), "Mean {value:.1f}")
+    alerts = detect_alerts(cohort, rules=[heavy])
+    assert alerts[["username", "message"]].values.tolist() == [["asha", "Mean 4.8"]]
+
+    empty = cohort.iloc[:0]
+    assert detect_alerts(empty).empty and list(detect_alerts(empty).columns) == ALERT_COLUMNS
+    assert detect_alerts(cohort[cohort["username"] == "dev"]).empty
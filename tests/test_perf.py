@@ -0,0 +1,86 @@
+import json
+import threading
+
+import pytest
+
+from ecosaver import perf
+
+
+@pytest.fixture(autouse=True)
+def no_leftover_run():
+    yield
+    perf.end_run(None)
+
+def test_hooks_are_no_ops_without_a_recorder():
+    @perf.timed()
+    def double(x):
+        return 2 * x
+
+    assert perf.current() is None
+    with perf.span("ignored"):
+        perf.count("ignored")
+        perf.section("ignored")
+    assert double(2) == 4
+    assert perf.end_run() is None
+
+def test_spans_counters_and_sections_are_recorded(tmp_path):
+    @perf.timed("work")
+    def work():
+        with perf.span("inner"):
+            perf.count("items", 3)
+
+    log = str(tmp_path / "logs" / "metrics.jsonl")
+    perf.start_run("rerun")
+    perf.section("load")
+    work()
+    perf.count("items")
+    perf.section("render")
+    rec = perf.end_run(log)
+
+    assert rec.counters == {"items": 4} and rec.total_ms >= 0
+    spans = {n: (d, depth) for n, _, d, depth in rec.spans}
+    assert [n for n, *_ in rec.spans] == ["inner", "work", "section.load", "section.render"]
+    assert spans["inner"][1] == 2 and spans["work"][1] == 1 and spans["section.load"][1] == 0
+    assert spans["inner"][0] <= spans["work"][0] <= spans["section.load"][0]
+
+    with open(log, encoding="utf-8") as f:
+        line = json.loads(f.read())
+    assert line["label"] == "rerun" and line["counters"] == {"items": 4}
+    assert [s["name"] for s in line["spans"]] == [n for n, *_ in rec.spans]
+
+def test_recorders_are_per_thread():
+    perf.start_run("main")
+    seen = []
+    t = threading.Thread(target=lambda: (perf.count("other"), seen.append(perf.current())))
+    t.start()
+    t.join()
+    perf.count("mine")
+    assert seen == [None] and perf.end_run(None).counters == {"mine": 1}
+
+def test_sql_statements_are_timed_and_their_rows_counted(conn):
+    conn.executemany("INSERT INTO users (username) VALUES (?)", [("asha",), ("ben",), ("chen",)])
+    perf.start_run("sql")
+    for _ in range(2):
+        conn.execute("SELECT   username FROM users").fetchall()
+    conn.execute("UPDATE users SET created_at = 'x'")
+    rec = perf.end_run(None)
+    assert rec.sql["SELECT username FROM users"][0] == 2  # whitespace is normalised in the key
+    assert rec.sql["SELECT username FROM users"][2] == 6
+    assert rec.sql["UPDATE users SET created_at = 'x'"][::2] == [1, 3]
+
+def test_metrics_log_is_rotated(tmp_path, monkeypatch):
+    log = str(tmp_path / "metrics.jsonl")
+    monkeypatch.setattr(perf, "MAX_LOG_BYTES", 400)
+    for i in range(6):
+        perf.start_run(f"run{i}")
+        perf.end_run(log)
+    with open(log, encoding="utf-8") as f:
+        current = [json.loads(l)["label"] for l in f]
+    with open(log + ".1", encoding="utf-8") as f:
+        rotated = [json.loads(l)["label"] for l in f]
+    assert current[-1] == "run5" and rotated and rotated[-1] == f"run{5 - len(current)}"
+
+def test_env_switch(monkeypatch):
+    for value, on in (("", False), ("0", False), ("1", True), ("yes", True)):
+        monkeypatch.setenv(perf.ENV_VAR, value)
+        assert perf.enabled_by_env() is on
@@ -0,0 +1,115 @@
+import sqlite3
+import threading
+
+import pytest
+
+from ecosaver import storage
+from ecosaver.pool import Database
+
+
+def test_write_commits_and_is_readable(db_file):
+    db = Database(db_file)
+    try:
+        db.add_usage("alice", "2024-01-01", 3.5, 120, 2)
+        with db.reader() as conn:
+            assert conn.execute("SELECT electricity_units FROM usage").fetchall() == [(3.5,)]
+    finally:
+        db.close()
+
+def test_failing_job_does_not_fail_the_batch(db_file):
+    db = Database(db_file)
+    try:
+        def boom(conn):
+            raise ValueError("bad job")
+        bad = db.submit(boom)
+        good = db.submit(storage.write_user, "bob")
+        with pytest.raises(ValueError):
+            bad.result(5)
+        assert good.result(5) > 0
+    finally:
+        db.close()
+
+def test_write_raises_instead_of_hanging_when_locked(db_file, monkeypatch):
+    monkeypatch.setitem(storage.CONNECTION_PRAGMAS, "busy_timeout", 200)
+    db = Database(db_file)
+    holder = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        holder.execute("BEGIN IMMEDIATE")  # another process holding the write lock
+        # A hang would surface as TimeoutError from result(); the lock error must come back instead.
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            db.write(storage.write_user, "carol", timeout=10)
+        holder.execute("ROLLBACK")
+        assert db.add_user("carol") > 0  # the writer survives the failed batch
+    finally:
+        holder.close()
+        db.close()
+
+def test_unexpected_batch_error_fails_the_batch_not_the_writer(db_file):
+    db = Database(db_file)
+    try:
+        gate = threading.Event()
+        blocker = db.submit(lambda conn: gate.wait(5))
+        fut = db.submit(storage.write_user, "dave")
+        fut.set_running_or_notify_cancel()  # the writer's own call now raises RuntimeError
+        gate.set()
+        blocker.exception(5)  # fails with it if both landed in one batch
+        assert isinstance(fut.exception(5), RuntimeError)
+        assert db.write(storage.write_user, "erin", timeout=5) > 0
+    finally:
+        db.close()
+
+def test_close_waits_for_checked_out_readers(db_file):
+    db = Database(db_file)
+    checked_out, release = threading.Event(), threading.Event()
+    seen = []
+
+    def session():
+        with db.reader() as conn:
+            checked_out.set()
+            release.wait(5)
+            seen.append(conn.execute("SELECT COUNT(*) FROM users").fetchone()[0])
+
+    t = threading.Thread(target=session)
+    t.start()
+    checked_out.wait(5)
+    closer = threading.Thread(target=db.close)
+    closer.start()
+    closer.join(0.3)
+    assert closer.is_alive()  # still waiting for the session's reader
+    with pytest.raises(RuntimeError, match="closed"):
+        with db.reader():
+            pass
+    release.set()
+    t.join(5)
+    closer.join(5)
+    assert not closer.is_alive() and seen == [0]
+
+def test_drained_holds_back_new_readers(db_file):
+    db = Database(db_file, max_readers=2)
+    try:
+        with db.reader() as conn:
+            pass
+        with db.drained() as readers:
+            assert readers == [conn]
+            with pytest.raises(TimeoutError):
+                with db.reader(timeout=0.1):
+                    pass
+        with db.reader(timeout=1) as again:
+            assert again is conn
+    finally:
+        db.close()
+
+def test_pooled_sessions_read_and_write_without_errors(db_file):
+    from ecosaver import stress
+    from ecosaver.synth import write_cohort
+
+    conn = storage.get_conn(db_file)
+    try:
+        write_cohort(conn, 10, 14)
+    finally:
+        conn.close()
+    r = stress.run_mode("pool", db_file, sessions=4, seconds=0.5, write_ratio=0.3)
+    assert r["errors"] == 0, r["error_kinds"]
+    assert r["reads_per_s"] > 0 and r["writes_per_s"] > 0
+    with pytest.raises(ValueError, match="no users"):
+        stress.run_mode("pool", str(db_file) + ".empty", 1, 0.1, 0.5)
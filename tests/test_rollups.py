@@ -0,0 +1,98 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from ecosaver.config import DEFAULT_HISTORY_DAYS
+from ecosaver.dashboard import aggregate_view
+from ecosaver.rollups import load_daily_rollup, load_user_summary, rebuild_rollups
+from ecosaver.storage import add_usage, add_usage_bulk, add_user_if_not_exists, load_usage_df
+from ecosaver.trends import global_trend_predict
+
+START = date(2024, 3, 1)
+
+
+def _day(i):
+    return (START + timedelta(days=i)).isoformat()
+
+def _check_daily_rollup(conn):
+    expected = conn.execute("""
+        SELECT date, COUNT(*), SUM(electricity_units), MIN(electricity_units), MAX(electricity_units),
+               SUM(water_liters), MIN(water_liters), MAX(water_liters)
+        FROM usage GROUP BY date ORDER BY date""").fetchall()
+    stored = conn.execute("SELECT * FROM daily_rollup ORDER BY date").fetchall()
+    assert [r[:2] for r in stored] == [r[:2] for r in expected]
+    for got, want in zip(stored, expected):
+        assert got[2:] == pytest.approx(want[2:])
+
+def _check_user_rollup(conn):
+    expected = conn.execute("""
+        SELECT user_id, COUNT(*), MIN(date), MAX(date),
+               SUM(electricity_units), MIN(electricity_units), MAX(electricity_units),
+               SUM(water_liters), MIN(water_liters), MAX(water_liters)
+        FROM usage GROUP BY user_id ORDER BY user_id""").fetchall()
+    stored = conn.execute("SELECT * FROM user_rollup ORDER BY user_id").fetchall()
+    assert [r[:4] for r in stored] == [r[:4] for r in expected]
+    for got, want in zip(stored, expected):
+        assert got[4:] == pytest.approx(want[4:])
+
+def _raw_summary(conn, start):
+    return conn.execute("""
+        SELECT us.username, COUNT(*), AVG(u.electricity_units), AVG(u.water_liters)
+        FROM usage u JOIN users us ON u.user_id = us.id
+        WHERE u.date >= ? GROUP BY us.username ORDER BY us.username""", (start,)).fetchall()
+
+def test_rollups_follow_single_and_bulk_writes(conn):
+    rng = random.Random(1)
+    ids = [add_user_if_not_exists(conn, name) for name in ("asha", "ben", "chen")]
+    for uid in ids:
+        for i in rng.sample(range(20), 12):  # out of date order
+            add_usage(conn, uid, _day(i), round(rng.uniform(1, 9), 2), rng.randint(50, 300), 3)
+    _check_daily_rollup(conn)
+    _check_user_rollup(conn)
+
+    # Overwrites (the replaced value may have been a day's min or max) and new days.
+    for uid in ids:
+        days = [d for (d,) in conn.execute("SELECT date FROM usage WHERE user_id = ? ORDER BY date", (uid,))]
+        for d in rng.sample(days, 4):
+            add_usage(conn, uid, d, round(rng.uniform(1, 9), 2), rng.randint(50, 300), 3)
+        add_usage(conn, uid, _day(-2), 0.5, 20, 3)
+    add_usage_bulk(conn, [("ben", _day(3), 12.0, 400, 2), ("dev", _day(1), 3.0, 90, 1)]
+                   + [("asha", _day(i), 2.0, 60, 2) for i in range(25, 30)])
+    _check_daily_rollup(conn)
+    _check_user_rollup(conn)
+
+    conn.execute("DELETE FROM daily_rollup")
+    conn.execute("DELETE FROM user_rollup")
+    conn.commit()
+    rebuild_rollups(conn)
+    _check_daily_rollup(conn)
+    _check_user_rollup(conn)
+
+def test_aggregate_view_matches_the_raw_rows(conn):
+    rng = random.Random(2)
+    add_usage_bulk(conn, [(name, _day(i), round(rng.uniform(1, 9), 2), rng.randint(50, 300), 2)
+                          for name, days in (("asha", range(40)), ("ben", range(10, 40, 3)))
+                          for i in days])
+    df = load_usage_df(conn)
+    agg, pred = aggregate_view(conn)
+    means = df.groupby("date")[["electricity_units", "water_liters"]].mean().reset_index()
+    assert list(agg["date"]) == list(means["date"])
+    assert agg["electricity_units"].tolist() == pytest.approx(means["electricity_units"].tolist())
+    assert agg["water_liters"].tolist() == pytest.approx(means["water_liters"].tolist())
+    assert pred == pytest.approx(global_trend_predict(df))
+    assert load_daily_rollup(conn, _day(37))["n"].tolist() == [2, 1, 1]
+
+def test_quick_stats_match_the_raw_rows_in_the_window(conn):
+    rng = random.Random(4)
+    # asha's history starts before the window, ben's and chen's inside it.
+    add_usage_bulk(conn, [(name, _day(i), round(rng.uniform(1, 9), 2), rng.randint(50, 300), 2)
+                          for name, first in (("asha", 0), ("ben", 20), ("chen", 40))
+                          for i in range(first, DEFAULT_HISTORY_DAYS + 20)])
+    start = (START + timedelta(days=19)).isoformat()
+    for got, want in ((load_user_summary(conn), _raw_summary(conn, start)),
+                      (load_user_summary(conn, _day(45)), _raw_summary(conn, _day(45)))):
+        assert [r[:2] for r in got] == [r[:2] for r in want]
+        for g, w in zip(got, want):
+            assert g[2:] == pytest.approx(w[2:])
+    assert [r[:2] for r in load_user_summary(conn)] == [("asha", 31), ("ben", 30), ("chen", 10)]
@@ -0,0 +1,37 @@
+import shelve
+import threading
+
+from ecosaver.pool import Database
+from ecosaver.series import append_reading, import_shelve, last_readings, latest_users, write_reading
+
+
+def test_concurrent_sessions_append_through_one_database(db_file):
+    db = Database(db_file)
+    try:
+        def session(name):
+            for i in range(20):
+                db.write(write_reading, name, float(i), f"2024-01-01T00:00:{i:02}")
+
+        threads = [threading.Thread(target=session, args=(f"user{k}",)) for k in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        with db.reader() as conn:
+            heads = latest_users(conn, 10)
+            assert sorted(heads) == [(f"user{k}", "2024-01-01T00:00:19", 19.0, 20) for k in range(4)]
+            assert last_readings(conn, "user2", 3) == [(f"2024-01-01T00:00:{i}", float(i)) for i in (17, 18, 19)]
+    finally:
+        db.close()
+
+def test_shelve_is_imported_once(conn, tmp_path):
+    path = str(tmp_path / "DB")
+    with shelve.open(path) as shelf:
+        shelf["Asha"] = [1.5, ("2024-01-02T08:00:00", 2.5), {"ts": "2024-01-03T08:00:00", "value": 3.5}, "n/a"]
+        shelf["ben"] = 4.0
+    assert import_shelve(conn, path) == 4
+    assert import_shelve(conn, path) == 0
+    append_reading(conn, "asha", 9.0, "2024-01-04T08:00:00")
+    # The bare value was stamped with the import time, so it sorts last.
+    assert [v for _, v in last_readings(conn, "asha")] == [2.5, 3.5, 9.0, 1.5]
+    assert {name: n for name, _, _, n in latest_users(conn)} == {"asha": 4, "ben": 1}
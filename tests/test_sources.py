@@ -0,0 +1,43 @@
+from datetime import date, timedelta
+
+import pytest
+
+from ecosaver import config
+from ecosaver.config import DEFAULT_HISTORY_DAYS
+from ecosaver.sources import compare_sources, detach_source, get_source_conn
+from ecosaver.storage import add_usage_bulk
+
+LATEST = date(2024, 5, 31)
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    for name in ("home", "school"):
+        monkeypatch.setitem(config.DATA_SOURCES, name, str(tmp_path / f"{name}.db"))
+    home, school = get_source_conn("home"), get_source_conn("school")
+    yield home, school
+    home.close()
+    school.close()
+
+def _days(*offsets):
+    return [(LATEST - timedelta(days=i)).isoformat() for i in offsets]
+
+def test_default_window_ends_at_the_latest_reading(sources):
+    home, school = sources
+    add_usage_bulk(home, [("asha", d, 2.0, 100, 2) for d in _days(0, 1)]
+                   + [("asha", d, 50.0, 900, 2) for d in _days(DEFAULT_HISTORY_DAYS + 1)]
+                   + [("ben", d, 4.0, 120, 2) for d in _days(3)])
+    add_usage_bulk(school, [("asha", d, 6.0, 30, 2) for d in _days(2, 5)]
+                   + [("chen", d, 1.0, 10, 2) for d in _days(DEFAULT_HISTORY_DAYS)])
+
+    assert compare_sources(home, "school") == [
+        ("asha", 2, 2.0, 100.0, 2, 6.0, 30.0),
+        ("ben", 1, 4.0, 120.0, None, None, None),
+        ("chen", None, None, None, 1, 1.0, 10.0),
+    ]
+    # Explicit dates still win over the default window.
+    assert compare_sources(home, "school", LATEST - timedelta(days=2), LATEST) == [
+        ("asha", 2, 2.0, 100.0, 1, 6.0, 30.0),
+    ]
+    detach_source(home, "school")
+    assert "school" not in {row[1] for row in home.execute("PRAGMA database_list")}
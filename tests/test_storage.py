@@ -0,0 +1,82 @@
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+from ecosaver.storage import add_usage, add_usage_bulk, add_user_if_not_exists, get_conn, get_data_version
+
+START = date(2024, 3, 1)
+
+
+def _day(i):
+    return (START + timedelta(days=i)).isoformat()
+
+def test_bulk_ingest_upserts_one_row_per_user_and_day(conn):
+    v0 = get_data_version(conn)
+    records = [("Asha ", "2024-03-01", 3.0, 100, 2), ("asha", date(2024, 3, 2), 4.0, 110, 2),
+               ("ben", "2024-03-01", 2.0, 90, 1), ("asha", "2024-03-01 00:00:00", 3.5, 105, 2)]
+    assert add_usage_bulk(conn, records, batch_size=2) == 4
+    assert get_data_version(conn) == v0 + 1  # one bump per bulk call
+    rows = conn.execute("""
+        SELECT us.username, u.date, u.electricity_units, u.water_liters FROM usage u
+        JOIN users us ON u.user_id = us.id ORDER BY us.username, u.date""").fetchall()
+    # The later reading of asha's 2024-03-01 replaced the earlier one, across batches.
+    assert rows == [("asha", "2024-03-01", 3.5, 105), ("asha", "2024-03-02", 4.0, 110),
+                    ("ben", "2024-03-01", 2.0, 90)]
+
+    add_usage(conn, add_user_if_not_exists(conn, "ben"), "2024-03-01", 2.5, 95, 1)
+    assert conn.execute("SELECT COUNT(*), SUM(electricity_units) FROM usage").fetchone() == (3, 10.0)
+    assert add_usage_bulk(conn, []) == 0
+
+def test_failed_bulk_ingest_writes_nothing(conn):
+    add_usage_bulk(conn, [("asha", "2024-03-01", 3.0, 100, 2)])
+    before = conn.execute("SELECT * FROM usage").fetchall(), get_data_version(conn)
+    records = [("ben", _day(i), 2.0, 90, 1) for i in range(5)] + [("ben", _day(9), float("nan"), 90, 1)]
+    with pytest.raises(sqlite3.IntegrityError):  # NaN is stored as NULL
+        add_usage_bulk(conn, records, batch_size=2)
+    assert (conn.execute("SELECT * FROM usage").fetchall(), get_data_version(conn)) == before
+    assert conn.execute("SELECT COUNT(*) FROM users WHERE username = 'ben'").fetchone()[0] == 0
+
+def test_upgrade_keeps_same_day_duplicates_in_a_backup_table(v0_db):
+    path = v0_db([(1, "2024-01-01", 3.0, 120, 2),
+                  (1, "2024-01-02 00:00:00", 4.0, 130, 2),
+                  (1, "2024-01-02", 5.0, 140, 2),  # later duplicate of the same day wins
+                  (2, "2024-01-01", 2.5, 90, 1)])
+    with pytest.warns(UserWarning, match="moved 1 older same-day"):
+        conn = get_conn(path)
+    assert conn.execute("SELECT user_id, date, electricity_units FROM usage ORDER BY user_id, date").fetchall() == [
+        (1, "2024-01-01", 3.0), (1, "2024-01-02", 5.0), (2, "2024-01-01", 2.5)]
+    assert conn.execute("SELECT id, user_id, date, electricity_units FROM usage_duplicates").fetchall() == [
+        (2, 1, "2024-01-02", 4.0)]
+    conn.close()
+
+def test_files_are_ingested_in_one_transaction(tmp_path, db_file, capsys):
+    from ecosaver import ingest
+
+    csv_file, jsonl_file = tmp_path / "usage.csv", tmp_path / "more.jsonl"
+    csv_file.write_text("name,date,electricity_units,water_liters,household_size\n"
+                        "Asha,2024-03-01,3.5,120,2\n"
+                        "ben,2024-03-01,2.0,90.0,\n", encoding="utf-8")
+    jsonl_file.write_text('{"username": "asha", "date": "2024-03-01", "electricity_units": 4, "water_liters": 130}\n'
+                          "\n"
+                          '{"username": "asha", "date": "2024-03-02", "electricity_units": "1.5", "water_liters": 80}\n',
+                          encoding="utf-8")
+    assert list(ingest.read_records(str(csv_file))) == [("Asha", "2024-03-01", 3.5, 120, 2),
+                                                        ("ben", "2024-03-01", 2.0, 90, 1)]
+    assert ingest.main([str(csv_file), str(jsonl_file), "--db", db_file]) == 0
+    assert "Loaded 4 rows" in capsys.readouterr().out
+
+    bad = tmp_path / "bad.csv"
+    bad.write_text("username,date,electricity_units\nchen,2024-03-03,1.0\n", encoding="utf-8")
+    assert ingest.main([str(csv_file), str(bad), "--db", db_file]) == 1
+    assert f"{bad}:2: bad record" in capsys.readouterr().err
+
+    conn = get_conn(db_file)
+    try:
+        # The later asha 2024-03-01 reading from the JSON file wins; the bad file wrote nothing.
+        assert conn.execute("""
+            SELECT us.username, u.date, u.electricity_units, u.household_size FROM usage u
+            JOIN users us ON u.user_id = us.id ORDER BY us.username, u.date""").fetchall() == [
+            ("asha", "2024-03-01", 4.0, 1), ("asha", "2024-03-02", 1.5, 1), ("ben", "2024-03-01", 2.0, 1)]
+    finally:
+        conn.close()
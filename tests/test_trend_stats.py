@@ -0,0 +1,107 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from ecosaver import dashboard
+from ecosaver.config import DEFAULT_HISTORY_DAYS
+from ecosaver.scoring import eco_score
+from ecosaver.storage import add_usage, add_usage_bulk, add_user_if_not_exists, load_usage_df, write_user
+from ecosaver.trend_stats import predict_next, predicted_eco_score, rebuild_user_stats
+from ecosaver.trends import batch_linear_trends, fit_linear_trend
+
+START = date(2024, 3, 1)
+
+
+def _day(i):
+    return (START + timedelta(days=i)).isoformat()
+
+def _check_user_stats(conn):
+    """user_trend_stats against sums over each user's raw rows, x counted from the stored anchor."""
+    stats = {r[0]: r[1:] for r in conn.execute(
+        "SELECT user_id, anchor, n, sx, sy, sxx, sxy, last_x, latest FROM user_trend_stats")}
+    users = [r[0] for r in conn.execute("SELECT DISTINCT user_id FROM usage")]
+    assert sorted(stats) == sorted(users)
+    for uid in users:
+        anchor = date.fromisoformat(stats[uid][0])
+        pts = [((date.fromisoformat(d) - anchor).days, y) for d, y in conn.execute(
+            "SELECT date, electricity_units FROM usage WHERE user_id = ? ORDER BY date", (uid,))]
+        xs, ys = [x for x, _ in pts], [y for _, y in pts]
+        want = (len(pts), sum(xs), sum(ys), sum(x * x for x in xs), sum(x * y for x, y in pts), max(xs), ys[-1])
+        assert stats[uid][1] == want[0]
+        assert stats[uid][2:] == pytest.approx(want[1:])
+
+def test_single_writes_and_overwrites_keep_the_sums_exact(conn):
+    rng = random.Random(1)
+    ids = [add_user_if_not_exists(conn, name) for name in ("asha", "ben", "chen")]
+    for uid in ids:
+        for i in rng.sample(range(20), 12):  # out of date order
+            add_usage(conn, uid, _day(i), round(rng.uniform(1, 9), 2), rng.randint(50, 300), 3)
+    _check_user_stats(conn)
+
+    # Overwrite existing days, including each user's latest, and add a day before the anchor.
+    for uid in ids:
+        days = [d for (d,) in conn.execute("SELECT date FROM usage WHERE user_id = ? ORDER BY date", (uid,))]
+        for d in rng.sample(days, 4) + [days[-1]]:
+            add_usage(conn, uid, d, round(rng.uniform(1, 9), 2), rng.randint(50, 300), 3)
+        add_usage(conn, uid, (date.fromisoformat(days[0]) - timedelta(days=3)).isoformat(), 4.2, 100, 3)
+    assert conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 3 * 13
+    _check_user_stats(conn)
+
+def test_bulk_writes_and_overwrites_keep_the_sums_exact(conn):
+    rng = random.Random(2)
+    records = [(name, _day(i), round(rng.uniform(1, 9), 2), rng.randint(50, 300), 2)
+               for name in ("asha", "ben") for i in range(15)]
+    assert add_usage_bulk(conn, records) == len(records)
+    _check_user_stats(conn)
+
+    add_usage(conn, add_user_if_not_exists(conn, "asha"), _day(20), 6.0, 200, 2)
+    overwrites = [(name, d, e + 1, w, h) for name, d, e, w, h in rng.sample(records, 10)]
+    add_usage_bulk(conn, overwrites + [("Chen ", _day(3), 2.0, 80, 1)])
+    assert conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 32
+    _check_user_stats(conn)
+
+def test_predictions_match_the_full_history_fit(conn):
+    rng = random.Random(3)
+    records = [(name, _day(i), round(rng.uniform(1, 9), 2), 100, 2)
+               for name, days in (("asha", range(0, 90, 2)), ("ben", (5, 1, 9)), ("chen", (4, 2)))
+               for i in days]
+    add_usage_bulk(conn, records)
+    add_usage(conn, add_user_if_not_exists(conn, "asha"), _day(200), 7.5, 100, 2)
+    df = load_usage_df(conn, START, _day(365))
+    for name in ("asha", "ben"):
+        du = df[df["username"] == name]
+        want, _ = fit_linear_trend(du)
+        pred, latest = predict_next(conn, name)
+        assert pred == pytest.approx(want, rel=1e-9)
+        assert latest == du["electricity_units"].iloc[-1]
+        assert predicted_eco_score(conn, name) == eco_score(latest, pred)
+    assert predict_next(conn, "chen")[0] is None
+    assert predict_next(conn, "nobody") == (None, None)
+    assert predicted_eco_score(conn, "nobody") is None
+
+    conn.execute("UPDATE user_trend_stats SET sy = 0, latest = NULL")
+    conn.commit()
+    assert rebuild_user_stats(conn) == 3
+    _check_user_stats(conn)
+
+def _window_fit(conn, username):
+    return float(batch_linear_trends(dashboard.user_frame(conn, username))["pred"].iloc[0])
+
+def test_dashboard_prediction_matches_a_fit_over_the_window(conn):
+    today = date.today()
+    add_usage_bulk(conn, [("asha", (today - timedelta(days=i)).isoformat(), 2.0 + i % 4, 100, 2)
+                          for i in range(12)])
+    # Whole history inside the window: the stored sums answer as they are.
+    pred, used_global = dashboard.user_prediction(conn, "asha", lambda: pytest.fail("no fallback"))
+    assert not used_global and pred == pytest.approx(_window_fit(conn, "asha"))
+
+    # A reading older than the window is left out, as in the frame.
+    uid = write_user(conn, "asha")
+    add_usage(conn, uid, (today - timedelta(days=DEFAULT_HISTORY_DAYS + 5)).isoformat(), 50.0, 100, 2)
+    pred, _ = dashboard.user_prediction(conn, "asha", lambda: None)
+    assert pred == pytest.approx(_window_fit(conn, "asha"))
+
+def test_short_history_uses_the_global_fallback(conn):
+    add_usage_bulk(conn, [("ben", date.today().isoformat(), 3.0, 100, 2)])
+    assert dashboard.user_prediction(conn, "ben", lambda: 4.5) == (4.5, True)
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ecosaver.scoring import compute_leaderboard, eco_score
+from ecosaver.trends import batch_linear_trends, fit_linear_trend, global_trend_predict
+
+
+def _cohort(seed=5):
+    """Shuffled rows for users with long, short (< 3 rows) and gappy histories."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for user, n_days in (("asha", 400), ("ben", 12), ("chen", 2), ("dev", 1), ("eli", 30)):
+        days = np.sort(rng.choice(500, size=n_days, replace=False))
+        for d in days:
+            rows.append((user, pd.Timestamp("2023-01-01") + pd.Timedelta(days=int(d)),
+                         float(rng.uniform(1, 9)) + 0.01 * d))
+    df = pd.DataFrame(rows, columns=["username", "date", "electricity_units"])
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+def test_batch_trends_match_the_per_user_fit():
+    df = _cohort()
+    trends = batch_linear_trends(df)
+    assert list(trends.index) == list(pd.unique(df["username"]))
+    for user, du in df.groupby("username"):
+        pred, _ = fit_linear_trend(du.sort_values("date"))
+        row = trends.loc[user]
+        assert row["n"] == len(du)
+        assert row["latest"] == du.sort_values("date")["electricity_units"].iloc[-1]
+        if pred is None:
+            assert np.isnan(row["pred"])
+        else:
+            assert row["pred"] == pytest.approx(pred, rel=1e-9)
+
+def test_leaderboard_matches_the_per_user_loop():
+    df = _cohort(6)
+    fallback = global_trend_predict(df)
+    expected = {}
+    for user, du in df.groupby("username"):
+        du = du.sort_values("date")
+        latest = du["electricity_units"].iloc[-1]
+        pred, _ = fit_linear_trend(du)
+        expected[user] = eco_score(latest, fallback if pred is None else pred)
+
+    lb = compute_leaderboard(df)
+    assert dict(zip(lb["username"], lb["score"])) == expected
+    assert list(lb["score"]) == sorted(lb["score"], reverse=True)
+
+def test_empty_frame_gives_an_empty_leaderboard():
+    empty = pd.DataFrame(columns=["username", "date", "electricity_units"])
+    assert compute_leaderboard(empty).empty
+    assert batch_linear_trends(empty).empty